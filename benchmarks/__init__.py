@@ -0,0 +1,6 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks offline de los backends de búsqueda.
+Ejecutar desde la raíz del repo, por ejemplo: python -m benchmarks.bench_parsers
+Los de punta a punta (bench_backends) usan los servidores locales de servidores.py.
+"""
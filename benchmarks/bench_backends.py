@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+"""
+Mide nosis, nosis2 y nosis3 de punta a punta contra los servidores locales de
+benchmarks/servidores.py (sin salir a internet).
+
+Cada backend corre en un subproceso propio, así el pico de memoria (RSS) es solo suyo,
+con la cache de identidades apagada. Por backend se informa latencia p50/p95/p99,
+búsquedas por segundo, errores (y cuántas fallas inyectaron los servidores) y pico de
+RSS. Con --salida cada corrida se agrega como una línea JSON (fecha, commit,
+parámetros, resultados) para seguir regresiones.
+
+nosis necesita Playwright con Chromium instalado; si no está, se saltea.
+
+Uso: python -m benchmarks.bench_backends [--backends nosis2,nosis3] [--busquedas N]
+        [--concurrencia C] [--latencia S] [--errores F] [--captcha F] [--salida archivo.jsonl]
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKENDS = ("nosis2", "nosis3", "nosis")
+
+RAIZ_REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentil(valores: list, p: float) -> float:
+    """Percentil por interpolación lineal (valores ya ordenados)"""
+    if not valores:
+        return 0.0
+    k = (len(valores) - 1) * p / 100
+    i = int(k)
+    j = min(i + 1, len(valores) - 1)
+    return valores[i] + (valores[j] - valores[i]) * (k - i)
+
+
+def pico_rss_mb() -> float:
+    """Pico de memoria residente del proceso (ru_maxrss: KB en Linux, bytes en macOS)"""
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return pico / (1024 * 1024) if sys.platform == "darwin" else pico / 1024
+
+
+# --- Subproceso: un backend -----------------------------------------------------------------
+
+async def _correr_backend(backend: str, busquedas: int, concurrencia: int, semilla: int) -> dict:
+    if backend == "nosis2":
+        import nosis2
+        buscar, iniciar, cerrar = nosis2.nosis2_buscar, nosis2.iniciar_cliente, nosis2.cerrar_cliente
+    elif backend == "nosis3":
+        import nosis3
+        buscar, iniciar, cerrar = nosis3.nosis3_buscar, None, None
+    else:
+        import nosis
+        buscar, iniciar, cerrar = nosis.nosis_buscar, nosis.iniciar_pool, nosis.cerrar_pool
+
+    rng = random.Random(semilla)
+    dnis = [str(rng.randint(10_000_000, 45_000_000)) for _ in range(busquedas)]
+
+    if iniciar:
+        await iniciar()
+    # Calentamiento: WSDL, ticket de acceso, conexiones, navegador
+    await buscar(dnis[0], usar_cache=False)
+
+    latencias, estados = [], {}
+    semaforo = asyncio.Semaphore(concurrencia)
+
+    async def una(dni):
+        async with semaforo:
+            inicio = time.perf_counter()
+            try:
+                estado = (await buscar(dni, usar_cache=False)).estado
+            except Exception as e:
+                estado = f"EXCEPCION:{type(e).__name__}"
+            latencias.append(time.perf_counter() - inicio)
+            estados[estado] = estados.get(estado, 0) + 1
+
+    inicio = time.perf_counter()
+    try:
+        await asyncio.gather(*(una(dni) for dni in dnis))
+    finally:
+        total = time.perf_counter() - inicio
+        if cerrar:
+            await cerrar()
+
+    latencias.sort()
+    return {
+        "backend": backend,
+        "busquedas": len(latencias),
+        "segundos": round(total, 3),
+        "por_segundo": round(len(latencias) / total, 2) if total else 0.0,
+        "p50_ms": round(percentil(latencias, 50) * 1000, 1),
+        "p95_ms": round(percentil(latencias, 95) * 1000, 1),
+        "p99_ms": round(percentil(latencias, 99) * 1000, 1),
+        "errores": sum(n for e, n in estados.items() if e == "ERROR" or e.startswith("EXCEPCION")),
+        "estados": estados,
+        "pico_rss_mb": round(pico_rss_mb(), 1),
+    }
+
+
+def _solo(args):
+    resultado = asyncio.run(_correr_backend(args.solo, args.busquedas, args.concurrencia, args.semilla))
+    with open(args.resultado, "w", encoding="utf-8") as f:
+        json.dump(resultado, f)
+
+
+# --- Proceso principal ----------------------------------------------------------------------
+
+def _generar_certificado(directorio: str):
+    """Certificado autofirmado para que nosis3 firme el pedido al WSAA local"""
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    from cryptography.x509.oid import NameOID
+
+    clave = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    nombre = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "bench-local")])
+    ahora = datetime.datetime.now(datetime.timezone.utc)
+    cert = (x509.CertificateBuilder()
+            .subject_name(nombre).issuer_name(nombre)
+            .public_key(clave.public_key())
+            .serial_number(x509.random_serial_number())
+            .not_valid_before(ahora - datetime.timedelta(days=1))
+            .not_valid_after(ahora + datetime.timedelta(days=30))
+            .sign(clave, hashes.SHA256()))
+
+    ruta_cert = os.path.join(directorio, "bench.crt")
+    ruta_key = os.path.join(directorio, "bench.key")
+    with open(ruta_cert, "wb") as f:
+        f.write(cert.public_bytes(serialization.Encoding.PEM))
+    with open(ruta_key, "wb") as f:
+        f.write(clave.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.TraditionalOpenSSL,
+                                    serialization.NoEncryption()))
+    return ruta_cert, ruta_key
+
+
+def _chromium_disponible() -> bool:
+    try:
+        from playwright.sync_api import sync_playwright
+        with sync_playwright() as p:
+            return os.path.exists(p.chromium.executable_path)
+    except Exception:
+        return False
+
+
+def _revision_git() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ_REPO,
+                              capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def _errores_inyectados(servidores: dict) -> int:
+    """Respuestas con error que dieron los servidores locales hasta ahora"""
+    return sum(s.contadores.get("errores", 0) for s in servidores.values())
+
+
+def _entorno(servidores: dict, directorio: str) -> dict:
+    from benchmarks.servidores import variables_entorno
+
+    cert, key = _generar_certificado(directorio)
+    entorno = dict(os.environ)
+    entorno.update(variables_entorno(servidores))
+    entorno.update({
+        "CACHE_IDENTIDAD": "0",
+        "LOG_NIVEL": os.getenv("LOG_NIVEL", "WARNING"),
+        "METRICAS": os.getenv("METRICAS", "1"),
+        "AFIP_CERT": cert,
+        "AFIP_KEY": key,
+        "AFIP_TA_PATH": os.path.join(directorio, "ta_a13.json"),
+        "AFIP_WSDL_CACHE": os.path.join(directorio, "afip_wsdl_cache.db"),
+        "NOSIS_SESION_PATH": os.path.join(directorio, "nosis_sesion.json"),
+    })
+    return entorno
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--backends", default="nosis2,nosis3,nosis")
+    ap.add_argument("--busquedas", type=int, default=200)
+    ap.add_argument("--concurrencia", type=int, default=8)
+    ap.add_argument("--latencia", type=float, default=0.05, help="Segundos por respuesta de los servidores")
+    ap.add_argument("--jitter", type=float, default=0.02)
+    ap.add_argument("--errores", type=float, default=0.0, help="Fracción de respuestas con error")
+    ap.add_argument("--captcha", type=float, default=0.0, help="Fracción de páginas de Nosis con captcha")
+    ap.add_argument("--semilla", type=int, default=1)
+    ap.add_argument("--salida", help="Agrega los resultados a este archivo JSONL")
+    ap.add_argument("--solo", choices=BACKENDS, help=argparse.SUPPRESS)
+    ap.add_argument("--resultado", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.solo:
+        _solo(args)
+        return
+
+    from benchmarks.servidores import Comportamiento, iniciar_servidores
+
+    backends = [b.strip() for b in args.backends.split(",") if b.strip()]
+    desconocidos = set(backends) - set(BACKENDS)
+    if desconocidos:
+        ap.error(f"backends desconocidos: {', '.join(sorted(desconocidos))}")
+
+    servidores = iniciar_servidores(Comportamiento(
+        args.latencia, args.jitter, args.errores, args.captcha, semilla=args.semilla
+    ))
+    resultados, salteados = [], []
+    try:
+        with tempfile.TemporaryDirectory(prefix="bench_backends_") as directorio:
+            entorno = _entorno(servidores, directorio)
+            for backend in backends:
+                if backend == "nosis" and not _chromium_disponible():
+                    salteados.append(backend)
+                    continue
+
+                archivo = os.path.join(directorio, f"{backend}.json")
+                inyectados = _errores_inyectados(servidores)
+                proceso = subprocess.run(
+                    [sys.executable, "-m", "benchmarks.bench_backends", "--solo", backend,
+                     "--resultado", archivo, "--busquedas", str(args.busquedas),
+                     "--concurrencia", str(args.concurrencia), "--semilla", str(args.semilla)],
+                    cwd=RAIZ_REPO, env=entorno,
+                )
+                if proceso.returncode != 0 or not os.path.exists(archivo):
+                    resultados.append({"backend": backend, "fallo": proceso.returncode})
+                    continue
+                with open(archivo, "r", encoding="utf-8") as f:
+                    resultado = json.load(f)
+                resultado["errores_inyectados"] = _errores_inyectados(servidores) - inyectados
+                resultados.append(resultado)
+    finally:
+        for servidor in servidores.values():
+            servidor.cerrar()
+
+    print(f"{args.busquedas} búsquedas por backend, concurrencia {args.concurrencia}, "
+          f"latencia {args.latencia * 1000:.0f}±{args.jitter * 1000:.0f} ms, errores {args.errores:.0%}\n")
+    print(f"{'backend':<9}{'p50':>10}{'p95':>10}{'p99':>10}{'busq/s':>9}{'errores':>9}{'inyect.':>9}{'pico RSS':>11}")
+    for r in resultados:
+        if "fallo" in r:
+            print(f"{r['backend']:<9}  ❌ el subproceso terminó con código {r['fallo']}")
+            continue
+        print(f"{r['backend']:<9}{r['p50_ms']:>7.1f} ms{r['p95_ms']:>7.1f} ms{r['p99_ms']:>7.1f} ms"
+              f"{r['por_segundo']:>9.1f}{r['errores']:>9}{r['errores_inyectados']:>9}{r['pico_rss_mb']:>8.1f} MB")
+    for backend in salteados:
+        print(f"{backend:<9}  (salteado: Playwright sin Chromium instalado)")
+
+    if args.salida:
+        registro = {
+            "fecha": datetime.datetime.now().isoformat(timespec="seconds"),
+            "commit": _revision_git(),
+            "parametros": {k: getattr(args, k) for k in
+                           ("busquedas", "concurrencia", "latencia", "jitter", "errores", "captcha", "semilla")},
+            "resultados": resultados,
+        }
+        with open(args.salida, "a", encoding="utf-8") as f:
+            f.write(json.dumps(registro, ensure_ascii=False) + "\n")
+        print(f"\nResultados agregados a {args.salida}")
+
+    print()
+    if any("fallo" in r for r in resultados):
+        print("❌ algún backend no pudo completar la corrida")
+        raise SystemExit(1)
+    print("✅ corrida completa")
+
+
+if __name__ == "__main__":
+    main()
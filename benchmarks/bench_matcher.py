@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+Compara matcher.coincide_flexible con la implementación anterior (Levenshtein de matriz
+completa, dos veces por palabra) sobre listas de nombres argentinos generadas.
+
+Verifica que ambas tomen exactamente las mismas decisiones y mide el tiempo por
+comparación (filtro, nombre).
+
+Uso: python -m benchmarks.bench_matcher [--nombres N] [--semilla S]
+"""
+
+import argparse
+import random
+import time
+
+from matcher import coincide_flexible, compilar
+
+APELLIDOS = [
+    "gonzalez", "rodriguez", "gomez", "fernandez", "lopez", "diaz", "martinez", "perez",
+    "garcia", "sanchez", "romero", "sosa", "alvarez", "torres", "ruiz", "ramirez", "flores",
+    "acosta", "benitez", "medina", "suarez", "herrera", "aguirre", "gimenez", "gutierrez",
+    "pereyra", "rojas", "molina", "castro", "ortiz", "silva", "nuñez", "luna", "juarez",
+    "cabrera", "rios", "ferreyra", "godoy", "morales", "dominguez", "carrizo", "villalba",
+]
+NOMBRES = [
+    "juan", "maria", "jose", "carlos", "jorge", "luis", "miguel", "ana", "marta", "laura",
+    "jonathan", "sebastian", "matias", "florencia", "camila", "valentina", "agustin",
+    "nicolas", "lucia", "martina", "gabriel", "alejandro", "rocio", "daniela", "esteban",
+    "soledad", "cristian", "noelia", "facundo", "micaela", "ezequiel", "romina", "walter",
+]
+
+
+def _variar(palabra: str, rng: random.Random) -> str:
+    """Filtros como los escribe un usuario: enteros, cortados o con un par de errores"""
+    modo = rng.random()
+    if modo < 0.3:
+        return palabra
+    if modo < 0.5:
+        return palabra[:rng.randint(2, len(palabra))]
+    letras = list(palabra)
+    for _ in range(rng.randint(1, 3)):
+        i = rng.randrange(len(letras))
+        op = rng.random()
+        if op < 0.4:
+            letras[i] = rng.choice("abcdefghijlmnoprstuvyz")
+        elif op < 0.7 and len(letras) > 2:
+            del letras[i]
+        else:
+            letras.insert(i, rng.choice("aehilnrsz"))
+    return "".join(letras)
+
+
+def generar_casos(cantidad: int, semilla: int):
+    rng = random.Random(semilla)
+    nombres = [
+        " ".join(rng.sample(APELLIDOS, rng.randint(1, 2)) + rng.sample(NOMBRES, rng.randint(1, 2)))
+        for _ in range(cantidad)
+    ]
+    filtros = [_variar(rng.choice(APELLIDOS + NOMBRES), rng) for _ in range(cantidad)]
+    return list(zip(filtros, nombres))
+
+
+# --- Implementación anterior (nosis2/nosis3), como referencia ---
+
+def _distancia_levenshtein(s1: str, s2: str) -> int:
+    if len(s1) < len(s2):
+        return _distancia_levenshtein(s2, s1)
+    if len(s2) == 0:
+        return len(s1)
+
+    fila_anterior = range(len(s2) + 1)
+    for i, c1 in enumerate(s1):
+        fila_actual = [i + 1]
+        for j, c2 in enumerate(s2):
+            inserciones = fila_anterior[j + 1] + 1
+            eliminaciones = fila_actual[j] + 1
+            sustituciones = fila_anterior[j] + (c1 != c2)
+            fila_actual.append(min(inserciones, eliminaciones, sustituciones))
+        fila_anterior = fila_actual
+
+    return fila_anterior[-1]
+
+
+def coincide_flexible_anterior(filtro: str, nombre: str) -> bool:
+    if not filtro or not nombre:
+        return False
+
+    filtro = filtro.lower()
+    nombre = nombre.lower()
+
+    if filtro in nombre:
+        return True
+
+    for palabra in nombre.split():
+        if len(filtro) <= 3:
+            if filtro == palabra[:len(filtro)] or filtro in palabra:
+                return True
+            continue
+
+        if filtro in palabra or palabra in filtro:
+            return True
+
+        max_errores = 1 if len(filtro) <= 6 else 2
+        if _distancia_levenshtein(filtro, palabra) <= max_errores:
+            return True
+
+        if len(palabra) >= len(filtro):
+            inicio = palabra[:len(filtro)]
+            if _distancia_levenshtein(filtro, inicio) <= max_errores:
+                return True
+
+    return False
+
+
+def medir(funcion, casos) -> float:
+    """Microsegundos promedio por comparación"""
+    inicio = time.perf_counter()
+    for filtro, nombre in casos:
+        funcion(filtro, nombre)
+    return (time.perf_counter() - inicio) * 1e6 / len(casos)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--nombres", type=int, default=50000)
+    ap.add_argument("--semilla", type=int, default=1)
+    args = ap.parse_args()
+
+    casos = generar_casos(args.nombres, args.semilla)
+
+    diferencias = [(f, n) for f, n in casos if coincide_flexible(f, n) != coincide_flexible_anterior(f, n)]
+    coincidencias = sum(coincide_flexible_anterior(f, n) for f, n in casos)
+
+    # Un filtro contra muchos nombres (un lote o una lista de homónimos)
+    filtro_fijo = casos[0][0]
+    contra_lista = [(filtro_fijo, n) for _, n in casos]
+    precompilado = compilar(filtro_fijo)
+
+    t_anterior = medir(coincide_flexible_anterior, casos)
+    t_nuevo = medir(coincide_flexible, casos)
+    t_lista_anterior = medir(coincide_flexible_anterior, contra_lista)
+    t_lista_nuevo = medir(lambda f, n: precompilado.coincide(n), contra_lista)
+
+    print(f"{len(casos)} comparaciones, {coincidencias} coincidencias\n")
+    print(f"{'caso':<28}{'anterior':>12}{'matcher':>12}{'mejora':>9}")
+    print(f"{'filtros variados':<28}{t_anterior:>9.2f} us{t_nuevo:>9.2f} us{t_anterior / t_nuevo:>8.1f}x")
+    print(f"{'un filtro, lista de nombres':<28}{t_lista_anterior:>9.2f} us{t_lista_nuevo:>9.2f} us"
+          f"{t_lista_anterior / t_lista_nuevo:>8.1f}x")
+
+    print()
+    if diferencias:
+        print(f"❌ {len(diferencias)} decisión(es) distintas, p. ej. {diferencias[:3]}")
+        raise SystemExit(1)
+    print("✅ matcher toma las mismas decisiones que la implementación anterior")
+
+
+if __name__ == "__main__":
+    main()
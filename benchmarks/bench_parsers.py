@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""
+Compara los backends de nosis2_parsers sobre las páginas guardadas en benchmarks/fixtures.
+
+Verifica que cada backend devuelva exactamente los mismos campos que bs4 y mide el tiempo
+medio por página.
+
+Uso: python -m benchmarks.bench_parsers [--repeticiones N]
+"""
+
+import argparse
+import os
+import time
+
+import nosis2_parsers
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+# (archivo, método del parser)
+CASOS = [
+    ("cuitonline_search.html", "cuitonline"),
+    ("sistemas360_form.html", "token_sistemas360"),
+    ("sistemas360_resultado.html", "sistemas360"),
+    ("dateas_persona.html", "dateas"),
+]
+
+
+def leer_fixture(nombre: str) -> str:
+    with open(os.path.join(FIXTURES_DIR, nombre), "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def medir(funcion, html: str, repeticiones: int) -> float:
+    """Milisegundos promedio por llamada"""
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        funcion(html)
+    return (time.perf_counter() - inicio) * 1000 / repeticiones
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--repeticiones", type=int, default=200)
+    args = ap.parse_args()
+
+    backends = list(nosis2_parsers.BACKENDS)
+    print(f"Backends disponibles: {', '.join(backends)}\n")
+    print(f"{'fixture':<30}" + "".join(f"{b:>14}" for b in backends))
+
+    diferencias = 0
+    for archivo, metodo in CASOS:
+        html = leer_fixture(archivo)
+        referencia = getattr(nosis2_parsers.obtener_parser("bs4"), metodo)(html)
+
+        fila = f"{archivo:<30}"
+        for backend in backends:
+            funcion = getattr(nosis2_parsers.obtener_parser(backend), metodo)
+            if funcion(html) != referencia:
+                diferencias += 1
+                fila += f"{'DIFIERE':>14}"
+                continue
+            fila += f"{medir(funcion, html, args.repeticiones):>11.3f} ms"
+        print(fila)
+
+    print()
+    if diferencias:
+        print(f"❌ {diferencias} resultado(s) distintos a bs4")
+        raise SystemExit(1)
+    print("✅ Todos los backends devuelven los mismos campos que bs4")
+
+
+if __name__ == "__main__":
+    main()
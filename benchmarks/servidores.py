@@ -0,0 +1,366 @@
+# -*- coding: utf-8 -*-
+"""
+Servidores locales que reemplazan a las fuentes reales en los benchmarks.
+
+- nosis2: CuitOnline, Sistemas360 y Dateas sirviendo las páginas de benchmarks/fixtures
+- nosis: página de búsqueda estilo Nosis (campo #Busqueda_Texto, filas div.result.row)
+  con captcha activable que se oculta solo al cabo de unos segundos (como con Buster)
+- nosis3: WSAA (loginCms) y ws_sr_padron_a13 (getPersona) en SOAP, con los WSDL de
+  benchmarks/fixtures; para cada DNI existe exactamente uno de sus CUIL candidatos
+
+Cada servidor acepta latencia (fija + jitter) y una tasa de errores (HTTP 503 o SOAP Fault).
+`variables_entorno()` da las variables que apuntan nosis/nosis2/nosis3 a estos servidores.
+
+Uso: python -m benchmarks.servidores [--latencia 0.05] [--errores 0.01] [--captcha 0.1]
+"""
+
+import argparse
+import html
+import json
+import os
+import random
+import threading
+import time
+import xml.etree.ElementTree as ET
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import cuil
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+APELLIDOS = ["GONZALEZ", "RODRIGUEZ", "GOMEZ", "FERNANDEZ", "LOPEZ", "DIAZ", "MARTINEZ", "PEREZ"]
+NOMBRES = ["JUAN CARLOS", "MARIA", "JOSE LUIS", "ANA", "JONATHAN", "FLORENCIA", "MATIAS", "LUCIA"]
+
+
+def leer_fixture(nombre: str) -> str:
+    with open(os.path.join(FIXTURES_DIR, nombre), "r", encoding="utf-8") as f:
+        return f.read()
+
+
+class Comportamiento:
+    """Latencia y fallas simuladas de un servidor (se puede cambiar en caliente)"""
+
+    def __init__(self, latencia: float = 0.0, jitter: float = 0.0, errores: float = 0.0,
+                 captcha: float = 0.0, captcha_segundos: float = 2.0, semilla: int = None):
+        self.latencia = latencia
+        self.jitter = jitter
+        self.errores = errores
+        self.captcha = captcha
+        self.captcha_segundos = captcha_segundos
+        self._rng = random.Random(semilla)
+        self._lock = threading.Lock()
+
+    def esperar(self):
+        if self.latencia or self.jitter:
+            with self._lock:
+                extra = self._rng.uniform(-self.jitter, self.jitter)
+            time.sleep(max(0.0, self.latencia + extra))
+
+    def falla(self) -> bool:
+        with self._lock:
+            return self._rng.random() < self.errores
+
+    def con_captcha(self) -> bool:
+        with self._lock:
+            return self._rng.random() < self.captcha
+
+
+class _Manejador(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, como los servidores reales
+    comportamiento: Comportamiento = None
+    contadores: dict = None
+
+    def log_message(self, *args):
+        pass
+
+    def _responder(self, cuerpo, tipo="text/html; charset=utf-8", estado=200):
+        datos = cuerpo.encode("utf-8") if isinstance(cuerpo, str) else cuerpo
+        self.send_response(estado)
+        self.send_header("Content-Type", tipo)
+        self.send_header("Content-Length", str(len(datos)))
+        self.end_headers()
+        self.wfile.write(datos)
+
+    def _cuerpo(self) -> bytes:
+        largo = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(largo) if largo else b""
+
+    def _contar(self, clave):
+        with _lock_contadores:
+            self.contadores[clave] = self.contadores.get(clave, 0) + 1
+
+    def _atender(self, metodo):
+        ruta = urlparse(self.path)
+        self._contar(f"{metodo} {ruta.path}")
+        self.comportamiento.esperar()
+        if self.comportamiento.falla():
+            self._contar("errores")
+            self._fallar()
+            return
+        self.atender(metodo, ruta, self._cuerpo() if metodo == "POST" else b"")
+
+    def _fallar(self):
+        self._responder("Servicio no disponible", "text/plain; charset=utf-8", 503)
+
+    def do_GET(self):
+        self._atender("GET")
+
+    def do_POST(self):
+        self._atender("POST")
+
+    def atender(self, metodo, ruta, cuerpo):
+        raise NotImplementedError
+
+
+_lock_contadores = threading.Lock()
+
+
+# --- nosis2: CuitOnline, Sistemas360, Dateas -----------------------------------------------
+
+class _ManejadorNosis2(_Manejador):
+    paginas = {}
+
+    def atender(self, metodo, ruta, cuerpo):
+        if ruta.path == "/search.php":
+            self._responder(self.paginas["cuitonline"])
+        elif ruta.path == "/cuitonline" and metodo == "GET":
+            self._responder(self.paginas["s360_form"])
+        elif ruta.path == "/cuitonline":
+            self._responder(self.paginas["s360_resultado"])
+        elif ruta.path.startswith("/es/persona/cuit-"):
+            self._responder(self.paginas["dateas"])
+        else:
+            self._responder("No encontrado", "text/plain; charset=utf-8", 404)
+
+
+# --- nosis: página de búsqueda con captcha ---------------------------------------------------
+
+_PAGINA_NOSIS = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Nosis (local)</title></head>
+<body>
+<div id="contenedorCaptcha" style="display: @DISPLAY@">Verificá que no sos un robot</div>
+<form onsubmit="return false"><input id="Busqueda_Texto" type="text"></form>
+<div id="resultados">
+  <div class="result row" style="display: none"><span class="cuit">@cuit@</span><span class="rz">@razonsocial@</span></div>
+</div>
+<script>
+const captchaMs = @CAPTCHA_MS@;
+if (captchaMs > 0) {
+  setTimeout(() => { document.getElementById('contenedorCaptcha').style.display = 'none'; }, captchaMs);
+}
+document.getElementById('Busqueda_Texto').addEventListener('keydown', async (ev) => {
+  if (ev.key !== 'Enter') return;
+  const r = await fetch('/api/buscar?q=' + encodeURIComponent(ev.target.value));
+  const filas = await r.json();
+  const cont = document.getElementById('resultados');
+  for (const f of filas) {
+    const div = document.createElement('div');
+    div.className = 'result row';
+    div.innerHTML = '<span class="cuit"></span><span class="rz"></span>';
+    div.querySelector('.cuit').textContent = f.cuit;
+    div.querySelector('.rz').textContent = f.razon_social;
+    cont.appendChild(div);
+  }
+});
+</script>
+</body></html>"""
+
+
+def personas_nosis(dni: int) -> list:
+    """Homónimos que devuelve el Nosis local para un DNI (1 a 3, deterministas)"""
+    filas = []
+    for i, numero in enumerate(cuil.candidatos(dni)[:1 + dni % 3]):
+        nombre = f"{APELLIDOS[(dni + i) % len(APELLIDOS)]} {NOMBRES[(dni // 7 + i) % len(NOMBRES)]}"
+        filas.append({"cuit": cuil.formatear(numero), "razon_social": nombre})
+    return filas
+
+
+class _ManejadorNosis(_Manejador):
+    def atender(self, metodo, ruta, cuerpo):
+        if ruta.path == "/api/buscar":
+            q = parse_qs(ruta.query).get("q", [""])[0]
+            dni = int(q[2:10] if len(q) == 11 else q) if q.isdigit() else 0
+            self._responder(json.dumps(personas_nosis(dni) if dni else []), "application/json")
+            return
+        captcha = self.comportamiento.con_captcha()
+        if captcha:
+            self._contar("captchas")
+        pagina = (_PAGINA_NOSIS
+                  .replace("@DISPLAY@", "block" if captcha else "none")
+                  .replace("@CAPTCHA_MS@", str(int(self.comportamiento.captcha_segundos * 1000) if captcha else 0)))
+        self._responder(pagina)
+
+
+# --- nosis3: WSAA y padrón A13 ---------------------------------------------------------------
+
+_SOAP_ENV = "http://schemas.xmlsoap.org/soap/envelope/"
+
+
+def _sobre(cuerpo: str) -> str:
+    return (f'<?xml version="1.0" encoding="UTF-8"?>'
+            f'<soap:Envelope xmlns:soap="{_SOAP_ENV}"><soap:Body>{cuerpo}</soap:Body></soap:Envelope>')
+
+
+def _fault(mensaje: str) -> str:
+    return _sobre(f"<soap:Fault><faultcode>soap:Server</faultcode>"
+                  f"<faultstring>{html.escape(mensaje)}</faultstring></soap:Fault>")
+
+
+def _campo(xml: bytes, nombre: str) -> str:
+    """Texto del primer elemento con ese nombre local (sin importar el namespace)"""
+    for nodo in ET.fromstring(xml).iter():
+        if nodo.tag.rsplit("}", 1)[-1] == nombre:
+            return (nodo.text or "").strip()
+    return ""
+
+
+def persona_a13(id_persona: int):
+    """
+    (apellido, nombre, fecha) si el CUIL existe en el A13 local, o None.
+    De los CUIL candidatos de cada DNI existe uno solo, elegido por el DNI.
+    """
+    dni = (id_persona // 10) % 10 ** 8
+    candidatos = cuil.candidatos(dni)
+    if not candidatos or str(id_persona) != candidatos[dni % len(candidatos)]:
+        return None
+    apellido = APELLIDOS[dni % len(APELLIDOS)]
+    nombre = NOMBRES[(dni // 7) % len(NOMBRES)]
+    fecha = f"{1950 + dni % 60}-{1 + dni % 12:02d}-{1 + dni % 28:02d}T12:00:00-03:00"
+    return apellido, nombre, fecha
+
+
+class _ManejadorAfip(_Manejador):
+    wsdl = {}
+
+    def _fallar(self):
+        self._responder(_fault("Servicio no disponible"), "text/xml; charset=utf-8", 500)
+
+    def atender(self, metodo, ruta, cuerpo):
+        servicio = "wsaa" if ruta.path.startswith("/wsaa") else "a13"
+        if metodo == "GET":
+            self._responder(self.wsdl[servicio], "text/xml; charset=utf-8")
+        elif servicio == "wsaa":
+            self._login(cuerpo)
+        else:
+            self._get_persona(cuerpo)
+
+    def _login(self, cuerpo):
+        if not _campo(cuerpo, "in0"):
+            self._responder(_fault("CMS vacío"), "text/xml; charset=utf-8", 500)
+            return
+        ahora = time.time()
+        formato = "%Y-%m-%dT%H:%M:%S-03:00"
+        generacion = time.strftime(formato, time.localtime(ahora))
+        vencimiento = time.strftime(formato, time.localtime(ahora + 12 * 3600))
+        ta = (f'<?xml version="1.0" encoding="UTF-8"?><loginTicketResponse version="1.0"><header>'
+              f'<generationTime>{generacion}</generationTime><expirationTime>{vencimiento}</expirationTime>'
+              f'</header><credentials><token>token-local</token><sign>sign-local</sign></credentials>'
+              f'</loginTicketResponse>')
+        self._responder(_sobre(
+            f'<loginCmsResponse xmlns="http://wsaa.view.sua.dvadac.desein.afip.gov">'
+            f'<loginCmsReturn>{html.escape(ta)}</loginCmsReturn></loginCmsResponse>'
+        ), "text/xml; charset=utf-8")
+
+    def _get_persona(self, cuerpo):
+        try:
+            id_persona = int(_campo(cuerpo, "idPersona"))
+        except ValueError:
+            self._responder(_fault("idPersona inválido"), "text/xml; charset=utf-8", 500)
+            return
+        datos = persona_a13(id_persona)
+        if datos is None:
+            self._responder(_fault("No existe persona con ese Id"), "text/xml; charset=utf-8", 500)
+            return
+        apellido, nombre, fecha = datos
+        self._responder(_sobre(
+            f'<ns2:getPersonaResponse xmlns:ns2="http://a13.soap.ws.server.puc.sr/"><personaReturn>'
+            f'<persona><apellido>{apellido}</apellido><estadoClave>ACTIVO</estadoClave>'
+            f'<fechaNacimiento>{fecha}</fechaNacimiento><idPersona>{id_persona}</idPersona>'
+            f'<nombre>{nombre}</nombre><tipoClave>CUIL</tipoClave><tipoPersona>FISICA</tipoPersona>'
+            f'</persona></personaReturn></ns2:getPersonaResponse>'
+        ), "text/xml; charset=utf-8")
+
+
+# --- Arranque ---------------------------------------------------------------------------------
+
+class ServidorLocal:
+    """Un ThreadingHTTPServer en 127.0.0.1 (puerto libre) corriendo en un thread daemon"""
+
+    def __init__(self, nombre: str, manejador, comportamiento: Comportamiento, puerto: int = 0, **atributos):
+        self.nombre = nombre
+        self.contadores = {}
+        clase = type(f"{manejador.__name__}_{nombre}", (manejador,), {
+            "comportamiento": comportamiento, "contadores": self.contadores, **atributos
+        })
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", puerto), clase)
+        self.httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name=f"servidor-{nombre}", daemon=True)
+
+    def iniciar(self) -> "ServidorLocal":
+        self._thread.start()
+        return self
+
+    def cerrar(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def iniciar_servidores(comportamiento: Comportamiento) -> dict:
+    """Levanta los tres servidores; devuelve {"nosis2", "nosis", "afip"} -> ServidorLocal"""
+    nosis2 = ServidorLocal("nosis2", _ManejadorNosis2, comportamiento, paginas={
+        "cuitonline": leer_fixture("cuitonline_search.html"),
+        "s360_form": leer_fixture("sistemas360_form.html"),
+        "s360_resultado": leer_fixture("sistemas360_resultado.html"),
+        "dateas": leer_fixture("dateas_persona.html"),
+    })
+    nosis = ServidorLocal("nosis", _ManejadorNosis, comportamiento)
+
+    afip = ServidorLocal("afip", _ManejadorAfip, comportamiento, wsdl={})
+    afip.httpd.RequestHandlerClass.wsdl.update({
+        "wsaa": leer_fixture("wsaa.wsdl").replace("@URL@", f"{afip.url}/wsaa/LoginCms"),
+        "a13": leer_fixture("a13.wsdl").replace("@URL@", f"{afip.url}/a13/personaServiceA13"),
+    })
+    return {s.nombre: s.iniciar() for s in (nosis2, nosis, afip)}
+
+
+def variables_entorno(servidores: dict) -> dict:
+    """Variables que apuntan nosis, nosis2 y nosis3 a los servidores locales"""
+    nosis2 = servidores["nosis2"].url
+    afip = servidores["afip"].url
+    return {
+        "NOSIS2_CUITONLINE_URL": nosis2,
+        "NOSIS2_S360_URL": f"{nosis2}/cuitonline",
+        "NOSIS2_DATEAS_URL": nosis2,
+        "NOSIS_URL": f"{servidores['nosis'].url}/?source=SitioNosis&q=&UrlReferer=",
+        "AFIP_WSDL_WSAA": f"{afip}/wsaa/LoginCms?wsdl",
+        "AFIP_WSDL_A13": f"{afip}/a13/personaServiceA13?WSDL",
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--latencia", type=float, default=0.05, help="Segundos por respuesta")
+    ap.add_argument("--jitter", type=float, default=0.0, help="Variación de la latencia (+/- segundos)")
+    ap.add_argument("--errores", type=float, default=0.0, help="Fracción de respuestas con error")
+    ap.add_argument("--captcha", type=float, default=0.0, help="Fracción de páginas de Nosis con captcha")
+    ap.add_argument("--captcha-segundos", type=float, default=2.0, help="Segundos hasta que el captcha se oculta")
+    args = ap.parse_args()
+
+    servidores = iniciar_servidores(Comportamiento(
+        args.latencia, args.jitter, args.errores, args.captcha, args.captcha_segundos
+    ))
+    print("Servidores locales listos. Para apuntar los backends a ellos:\n")
+    for clave, valor in variables_entorno(servidores).items():
+        print(f"export {clave}='{valor}'")
+    print("\nCtrl+C para terminar")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
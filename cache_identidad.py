@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+"""
+cache_identidad.py - Cache local persistente DNI/CUIL -> identidad, compartida por
+nosis, nosis2 y nosis3.
+
+Cada fila guarda CUIL, nombre completo, fecha de nacimiento (si la fuente la da), la
+fuente y el momento en que se obtuvo. Se indexa por DNI y por CUIL normalizados, así
+una búsqueda repetida por cualquiera de los dos sale de disco en microsegundos.
+
+- TTL: las identidades vencen a los CACHE_IDENTIDAD_TTL segundos.
+- Negativos: los "no encontrado" se recuerdan por fuente con un TTL más corto.
+- LRU: al superar CACHE_IDENTIDAD_MAX filas se borran las menos usadas.
+"""
+
+import os
+import time
+import sqlite3
+import threading
+from typing import Optional
+
+DIR_ACTUAL = os.path.dirname(os.path.abspath(__file__))
+
+CACHE_IDENTIDAD_HABILITADA = os.getenv("CACHE_IDENTIDAD", "1") != "0"
+CACHE_IDENTIDAD_PATH = os.getenv("CACHE_IDENTIDAD_PATH", os.path.join(DIR_ACTUAL, "identidad_cache.db"))
+CACHE_IDENTIDAD_TTL = float(os.getenv("CACHE_IDENTIDAD_TTL", str(30 * 24 * 3600)))  # Segundos
+CACHE_IDENTIDAD_TTL_NEGATIVO = float(os.getenv("CACHE_IDENTIDAD_TTL_NEGATIVO", "3600"))  # Segundos
+CACHE_IDENTIDAD_MAX = int(os.getenv("CACHE_IDENTIDAD_MAX", "50000"))  # Filas antes de desalojar
+
+
+def normalizar_clave(dni_o_cuil) -> Optional[str]:
+    """
+    Clave de cache para un DNI (7-9 dígitos) o CUIL (11), sin guiones ni espacios.
+    Los DNI se completan a 8 dígitos como en armar_cuit. None si no es ninguno de los dos.
+    """
+    clave = "".join(ch for ch in str(dni_o_cuil or "") if ch.isdigit())
+    if len(clave) == 11:
+        return clave
+    if 7 <= len(clave) <= 9:
+        return clave.lstrip("0").zfill(8)
+    return None
+
+
+class CacheIdentidad:
+    """Cache SQLite thread-safe de identidades (positivas y negativas) con TTL y LRU"""
+
+    def __init__(self, ruta: str = CACHE_IDENTIDAD_PATH, ttl: float = CACHE_IDENTIDAD_TTL,
+                 ttl_negativo: float = CACHE_IDENTIDAD_TTL_NEGATIVO,
+                 max_entradas: int = CACHE_IDENTIDAD_MAX):
+        self.ruta = ruta
+        self.ttl = ttl
+        self.ttl_negativo = ttl_negativo
+        self.max_entradas = max_entradas
+        self.aciertos = 0
+        self.fallos = 0
+        self.aciertos_negativos = 0
+        self.desalojos = 0
+        self.lock = threading.Lock()
+        self._db = sqlite3.connect(ruta, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS identidades (
+                clave TEXT NOT NULL,
+                fuente TEXT NOT NULL,
+                cuil TEXT,
+                nombre TEXT,
+                fecha TEXT,
+                guardado REAL NOT NULL,
+                usado REAL NOT NULL,
+                PRIMARY KEY (clave, fuente)
+            )
+        """)
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_identidades_usado ON identidades (usado)")
+        self._filas = self._contar()
+
+    def _contar(self) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM identidades").fetchone()[0]
+
+    def buscar(self, dni_o_cuil, fuentes=None, requiere_fecha: bool = False) -> Optional[dict]:
+        """
+        Identidad vigente más reciente para el DNI/CUIL.
+
+        Args:
+            fuentes: Limitar a estas fuentes (None = cualquiera)
+            requiere_fecha: Ignorar entradas sin fecha de nacimiento
+
+        Returns:
+            dict con cuil, nombre, fecha, fuente y guardado, o None
+        """
+        clave = normalizar_clave(dni_o_cuil)
+        if clave is None:
+            return None
+
+        sql = "SELECT cuil, nombre, fecha, fuente, guardado FROM identidades WHERE clave = ? AND cuil IS NOT NULL AND guardado > ?"
+        params = [clave, time.time() - self.ttl]
+        if fuentes:
+            sql += f" AND fuente IN ({','.join('?' * len(fuentes))})"
+            params.extend(fuentes)
+        if requiere_fecha:
+            sql += " AND fecha IS NOT NULL"
+        sql += " ORDER BY guardado DESC LIMIT 1"
+
+        with self.lock:
+            fila = self._db.execute(sql, params).fetchone()
+            if fila is None:
+                self.fallos += 1
+                return None
+            self._db.execute(
+                "UPDATE identidades SET usado = ? WHERE clave = ? AND fuente = ?",
+                (time.time(), clave, fila[3])
+            )
+            self.aciertos += 1
+
+        return {"cuil": fila[0], "nombre": fila[1], "fecha": fila[2], "fuente": fila[3], "guardado": fila[4]}
+
+    def es_negativo(self, dni_o_cuil, fuente: str) -> bool:
+        """True si `fuente` no encontró a nadie con este DNI/CUIL hace menos de ttl_negativo"""
+        clave = normalizar_clave(dni_o_cuil)
+        if clave is None:
+            return False
+        with self.lock:
+            fila = self._db.execute(
+                "SELECT 1 FROM identidades WHERE clave = ? AND fuente = ? AND cuil IS NULL AND guardado > ?",
+                (clave, fuente, time.time() - self.ttl_negativo)
+            ).fetchone()
+            if fila:
+                self.aciertos_negativos += 1
+        return fila is not None
+
+    def guardar(self, cuil, nombre: str, fuente: str, fecha: Optional[str] = None):
+        """Guarda la identidad bajo su CUIL y bajo el DNI que contiene"""
+        cuil = normalizar_clave(cuil)
+        if cuil is None or len(cuil) != 11 or not nombre:
+            return
+        ahora = time.time()
+        with self.lock:
+            for clave in (cuil, normalizar_clave(cuil[2:10])):
+                self._db.execute(
+                    "INSERT OR REPLACE INTO identidades (clave, fuente, cuil, nombre, fecha, guardado, usado) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (clave, fuente, cuil, nombre, fecha, ahora, ahora)
+                )
+            self._filas += 2
+            self._desalojar()
+
+    def guardar_negativo(self, dni_o_cuil, fuente: str):
+        """Recuerda que `fuente` no encontró a nadie con este DNI/CUIL"""
+        clave = normalizar_clave(dni_o_cuil)
+        if clave is None:
+            return
+        ahora = time.time()
+        with self.lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO identidades (clave, fuente, cuil, nombre, fecha, guardado, usado) VALUES (?, ?, NULL, NULL, NULL, ?, ?)",
+                (clave, fuente, ahora, ahora)
+            )
+            self._filas += 1
+            self._desalojar()
+
+    def _desalojar(self):
+        """Borra las filas menos usadas si se superó el máximo. Llamar con `self.lock` tomado."""
+        if self._filas <= self.max_entradas:
+            return
+        # _filas es una estimación (los REPLACE no agregan filas): recontar antes de borrar
+        self._filas = self._contar()
+        exceso = self._filas - int(self.max_entradas * 0.9)
+        if self._filas <= self.max_entradas or exceso <= 0:
+            return
+        self._db.execute(
+            "DELETE FROM identidades WHERE rowid IN (SELECT rowid FROM identidades ORDER BY usado LIMIT ?)",
+            (exceso,)
+        )
+        self._filas -= exceso
+        self.desalojos += exceso
+
+    def invalidar(self, dni_o_cuil):
+        """Olvida todo lo guardado para este DNI/CUIL (cualquier fuente)"""
+        clave = normalizar_clave(dni_o_cuil)
+        if clave is None:
+            return
+        with self.lock:
+            self._db.execute("DELETE FROM identidades WHERE clave = ?", (clave,))
+            self._filas = self._contar()
+
+    def purgar(self) -> int:
+        """Borra las entradas vencidas; devuelve cuántas"""
+        ahora = time.time()
+        with self.lock:
+            cur = self._db.execute(
+                "DELETE FROM identidades WHERE (cuil IS NOT NULL AND guardado <= ?) OR (cuil IS NULL AND guardado <= ?)",
+                (ahora - self.ttl, ahora - self.ttl_negativo)
+            )
+            self._filas = self._contar()
+        return cur.rowcount
+
+    def cerrar(self):
+        with self.lock:
+            self._db.close()
+
+    def info(self) -> dict:
+        return {
+            "filas": self._filas,
+            "aciertos": self.aciertos,
+            "fallos": self.fallos,
+            "aciertos_negativos": self.aciertos_negativos,
+            "desalojos": self.desalojos,
+        }
+
+
+_cache: Optional[CacheIdentidad] = None
+_lock_cache = threading.Lock()
+
+
+def obtener_cache() -> Optional[CacheIdentidad]:
+    """Cache compartida del proceso (se crea perezosamente); None si está deshabilitada"""
+    global _cache
+    if not CACHE_IDENTIDAD_HABILITADA:
+        return None
+    if _cache is None:
+        with _lock_cache:
+            if _cache is None:
+                _cache = CacheIdentidad()
+    return _cache
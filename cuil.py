@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""
+cuil.py - Dígito verificador y candidatos de CUIL/CUIT a partir de un DNI.
+
+Regla (módulo 11, factores 5432765432 sobre prefijo + DNI de 8 dígitos):
+- resto 0 -> dígito 0; resto 1 -> no hay dígito válido; si no, 11 - resto.
+- Si con 20 (hombre) o 27 (mujer) el resto da 1, AFIP asigna prefijo 23 (dígito 9 u 4),
+  que es justamente el CUIL que se obtiene calculando con 23.
+- Si con 23 el resto da 1 no existe CUIL válido con ese prefijo.
+
+Las funciones escalares son Python puro (las usan las búsquedas); las `*_array` procesan
+millones de DNIs de una vez con NumPy (pre-filtrado de lotes, precalentado de caches).
+"""
+
+from typing import List, Optional
+
+try:
+    import numpy as np
+    NUMPY_DISPONIBLE = True
+except ImportError:
+    np = None
+    NUMPY_DISPONIBLE = False
+
+PREFIJOS = (20, 27, 23)  # Orden de probabilidad: hombre, mujer, ambos
+FACTORES = (5, 4, 3, 2, 7, 6, 5, 4, 3, 2)
+_FACTORES_DNI = FACTORES[2:]  # Los 8 dígitos del DNI, de izquierda a derecha
+
+
+def _resto(prefijo: int, dni: int) -> int:
+    suma = (prefijo // 10) * FACTORES[0] + (prefijo % 10) * FACTORES[1]
+    for i, digito in enumerate(f"{dni:08d}"):
+        suma += int(digito) * _FACTORES_DNI[i]
+    return suma % 11
+
+
+def digito_verificador(prefijo: int, dni) -> Optional[int]:
+    """Dígito verificador para prefijo + DNI, o None si el resto es 1 (no hay dígito válido)"""
+    resto = _resto(int(prefijo), int(dni))
+    if resto == 0:
+        return 0
+    if resto == 1:
+        return None
+    return 11 - resto
+
+
+def armar(prefijo: int, dni) -> Optional[str]:
+    """
+    CUIL de 11 dígitos para el prefijo y DNI dados, aplicando la regla 20/27 -> 23.
+    None si no existe (DNI de más de 8 dígitos, o prefijo 23 con resto 1).
+    """
+    dni = int(dni)
+    if not 0 < dni < 10 ** 8:
+        return None
+    dv = digito_verificador(prefijo, dni)
+    if dv is None:
+        if prefijo in (20, 27):
+            return armar(23, dni)
+        return None
+    return f"{prefijo}{dni:08d}{dv}"
+
+
+def candidatos(dni, prefijos=PREFIJOS) -> List[str]:
+    """CUILs posibles para un DNI, en el orden de `prefijos` y sin repetidos"""
+    vistos = []
+    for prefijo in prefijos:
+        cuil = armar(prefijo, dni)
+        if cuil and cuil not in vistos:
+            vistos.append(cuil)
+    return vistos
+
+
+def es_valido(cuil) -> bool:
+    """True si el CUIL/CUIT (con o sin guiones) tiene 11 dígitos y dígito verificador correcto"""
+    cuil = str(cuil).replace("-", "").strip()
+    if len(cuil) != 11 or not cuil.isdigit():
+        return False
+    return digito_verificador(int(cuil[:2]), int(cuil[2:10])) == int(cuil[10])
+
+
+def formatear(cuil) -> str:
+    """20123456789 -> 20-12345678-9"""
+    cuil = str(cuil)
+    return f"{cuil[:2]}-{cuil[2:10]}-{cuil[10]}" if len(cuil) == 11 else cuil
+
+
+# --- Versión vectorizada (NumPy) -------------------------------------------------------
+
+def _requiere_numpy():
+    if not NUMPY_DISPONIBLE:
+        raise RuntimeError("Las funciones *_array de cuil.py necesitan numpy (pip install numpy)")
+
+
+def _suma_dni_array(dnis):
+    """Suma ponderada de los 8 dígitos de cada DNI (array int64)"""
+    suma = np.zeros(dnis.shape, dtype=np.int64)
+    resto = dnis.copy()
+    # De derecha a izquierda: el último dígito del DNI lleva el último factor
+    for factor in reversed(_FACTORES_DNI):
+        suma += (resto % 10) * factor
+        resto //= 10
+    return suma
+
+
+def digitos_verificadores_array(prefijo: int, dnis):
+    """Dígito verificador de prefijo + cada DNI; -1 donde no hay dígito válido (resto 1)"""
+    _requiere_numpy()
+    dnis = np.asarray(dnis, dtype=np.int64)
+    resto = (_suma_dni_array(dnis) + (prefijo // 10) * FACTORES[0] + (prefijo % 10) * FACTORES[1]) % 11
+    dv = np.where(resto == 0, 0, 11 - resto)
+    return np.where(resto == 1, -1, dv)
+
+
+def candidatos_array(dnis, prefijos=PREFIJOS):
+    """
+    CUILs posibles para cada DNI como matriz int64 (len(dnis), len(prefijos)).
+
+    Misma regla y orden que `candidatos`: las columnas de 20/27 con resto 1 pasan a 23, y
+    los repetidos o inexistentes quedan en 0.
+    """
+    _requiere_numpy()
+    dnis = np.asarray(dnis, dtype=np.int64)
+    validos = (dnis > 0) & (dnis < 10 ** 8)
+
+    dv23 = digitos_verificadores_array(23, dnis)
+    cuil23 = np.where(dv23 >= 0, (23 * 10 ** 8 + dnis) * 10 + dv23, 0)
+
+    columnas = []
+    for prefijo in prefijos:
+        if prefijo == 23:
+            col = cuil23
+        else:
+            dv = digitos_verificadores_array(prefijo, dnis)
+            col = np.where(dv >= 0, (prefijo * 10 ** 8 + dnis) * 10 + dv, cuil23 if prefijo in (20, 27) else 0)
+        # Sin repetidos: se conserva la primera aparición, como en `candidatos`
+        for anterior in columnas:
+            col = np.where(col == anterior, 0, col)
+        columnas.append(col)
+
+    salida = np.stack(columnas, axis=1) if columnas else np.zeros((len(dnis), 0), dtype=np.int64)
+    salida[~validos] = 0
+    return salida
+
+
+def validar_array(cuils):
+    """Array booleano: True donde el CUIL (int de 11 dígitos) tiene dígito verificador correcto"""
+    _requiere_numpy()
+    cuils = np.asarray(cuils, dtype=np.int64)
+    prefijos = cuils // 10 ** 9
+    dnis = (cuils // 10) % 10 ** 8
+    dv = cuils % 10
+    resto = (_suma_dni_array(dnis) + (prefijos // 10) * FACTORES[0] + (prefijos % 10) * FACTORES[1]) % 11
+    esperado = np.where(resto == 0, 0, 11 - resto)
+    return (cuils >= 10 ** 10) & (cuils < 10 ** 11) & (resto != 1) & (esperado == dv)
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+formato.py - Convierte un Resultado en las tuplas/mensajes que espera el bot.
+
+Cada backend conserva su contrato histórico:
+- nosis:  (cuil, nombre) | (mensaje, NO_MATCH_SHOWING_ALL | FILTERED_SINGLE |
+          FILTERED_MULTIPLE | MULTIPLE_RESULTS) | (None, None), con el CUIL tal como
+          lo muestra la página de Nosis
+- nosis2: (cuil, nombre) | (mensaje, NO_MATCH | ERROR)
+- nosis3: (cuil, nombre, fecha) | (mensaje, NO_MATCH | ERROR, None)
+"""
+
+from resultado import Resultado, MULTIPLE, NO_MATCH, NO_ENCONTRADO, ERROR
+
+NO_IDENTIFICADO = "NO IDENTIFICADO"
+
+# Segundo elemento de las tuplas que no son una identidad
+TIPOS_RESPUESTA = ("NO_MATCH_SHOWING_ALL", "FILTERED_SINGLE", "FILTERED_MULTIPLE", "MULTIPLE_RESULTS",
+                   "NO_MATCH", "ERROR")
+
+
+def _o_no_identificado(valor):
+    return NO_IDENTIFICADO if valor is None else valor
+
+
+def _lista_numerada(candidatos, cuil=lambda c: c.cuil) -> str:
+    return "\n\n".join(
+        f"CUIL {i}: {cuil(c)}\nNOMBRE {i}: {c.nombre}"
+        for i, c in enumerate(candidatos, 1)
+    )
+
+
+def _sin_coincidencia(r: Resultado) -> str:
+    return f"⚠️ No se encontró coincidencia con '{r.filtro}'\n\n"
+
+
+def tupla_nosis(r: Resultado):
+    if r.estado in (ERROR, NO_ENCONTRADO) or not r.candidatos:
+        return (None, None)
+
+    if r.estado == NO_MATCH:
+        mensaje = (
+            f"❌ No se encontraron coincidencias con '{r.filtro}'\n\n"
+            f"📋 Todos los resultados para DNI {r.consulta}:\n\n"
+            + _lista_numerada(r.candidatos, lambda c: c.cuil_texto)
+        )
+        return (mensaje, "NO_MATCH_SHOWING_ALL")
+
+    if r.filtro:
+        if len(r.candidatos) == 1:
+            c = r.primero
+            mensaje = f"✅ SE ENCONTRÓ 1 CUIL CON '{r.filtro}':\n\nCUIL: {c.cuil_texto}\nNOMBRE: {c.nombre}"
+            return (mensaje, "FILTERED_SINGLE")
+        mensaje = (
+            f"✅ SE ENCONTRARON {len(r.candidatos)} CUILS CON '{r.filtro}':\n\n"
+            + _lista_numerada(r.candidatos, lambda c: c.cuil_texto)
+        )
+        return (mensaje, "FILTERED_MULTIPLE")
+
+    if r.estado == MULTIPLE:
+        n = len(r.candidatos)
+        mensaje = (
+            f"SE ENCONTRARON {n} CUIL{'S' if n > 1 else ''}:\n\n"
+            + _lista_numerada(r.candidatos, lambda c: c.cuil_texto)
+        )
+        return (mensaje, "MULTIPLE_RESULTS")
+
+    return (r.primero.cuil_texto, r.primero.nombre)
+
+
+def tupla_nosis2(r: Resultado):
+    if r.estado == ERROR:
+        return (r.mensaje, "ERROR")
+
+    if r.estado == NO_MATCH:
+        c = r.primero
+        mensaje = _sin_coincidencia(r)
+        if r.consulta:
+            mensaje += f"Resultado encontrado con DNI {r.consulta}:\n"
+        mensaje += f"CUIL: {_o_no_identificado(c.cuil)}\nNOMBRE: {_o_no_identificado(c.nombre)}"
+        return (mensaje, "NO_MATCH")
+
+    c = r.primero
+    if c is None:
+        return (NO_IDENTIFICADO, NO_IDENTIFICADO)
+    return (_o_no_identificado(c.cuil), _o_no_identificado(c.nombre))
+
+
+def tupla_nosis3(r: Resultado):
+    if r.estado == ERROR:
+        return (r.mensaje, "ERROR", None)
+
+    if r.estado == NO_ENCONTRADO:
+        return (f"No se encontró ninguna persona activa con DNI {r.consulta}", "ERROR", None)
+
+    c = r.primero
+    if r.estado == NO_MATCH:
+        encabezado = f"Resultado encontrado con DNI {r.consulta}:" if r.consulta else "Resultado encontrado:"
+        mensaje = (
+            _sin_coincidencia(r)
+            + f"{encabezado}\nCUIL: {c.cuil}\nNOMBRE: {c.nombre}\nNACIMIENTO: {c.fecha}"
+        )
+        return (mensaje, "NO_MATCH", None)
+
+    return (c.cuil, c.nombre, c.fecha)
+
+
+def tipo_respuesta(tupla) -> str:
+    """Tipo de una tupla del bot (para métricas): OK, VACIO o uno de TIPOS_RESPUESTA"""
+    if tupla[0] is None:
+        return "VACIO"
+    if len(tupla) > 1 and tupla[1] in TIPOS_RESPUESTA:
+        return tupla[1]
+    return "OK"
@@ -0,0 +1,291 @@
+# -*- coding: utf-8 -*-
+"""
+lote.py - Búsqueda por lotes de DNIs/CUILs (planillas de cientos de personas).
+
+Lee las entradas de un iterable o de un archivo CSV / JSONL / texto (un documento por
+línea), las resuelve con concurrencia acotada por backend y va escribiendo cada resultado
+en un JSONL apenas termina. El propio JSONL de salida es el checkpoint: al relanzar el
+mismo lote se saltean los `id` que ya tienen resultado; los que terminaron en ERROR se
+vuelven a buscar (su línea nueva queda al final y es la que vale).
+
+Uso:
+    python lote.py personas.csv -o resultados.jsonl [--backend resolver] [--concurrencia 8]
+"""
+
+import os
+import sys
+import csv
+import json
+import time
+import asyncio
+import argparse
+from typing import Iterable, Optional
+
+from resultado import error, ERROR
+from registro import contexto_consulta
+from metricas import iniciar_servidor
+
+LOTE_CONCURRENCIA = int(os.getenv("LOTE_CONCURRENCIA", "8"))  # Búsquedas simultáneas del lote
+
+# Búsquedas simultáneas como máximo contra cada backend
+LOTE_LIMITES = {
+    "nosis3": int(os.getenv("LOTE_LIMITE_NOSIS3", "4")),
+    "nosis2": int(os.getenv("LOTE_LIMITE_NOSIS2", "4")),
+    "nosis": int(os.getenv("LOTE_LIMITE_NOSIS", "2")),
+}
+
+_COLUMNAS_DOCUMENTO = ("dni", "cuil", "cuit", "documento", "dni_o_cuil")
+
+
+def _entrada(id_, documento, nombre=None) -> dict:
+    return {
+        "id": str(id_),
+        "dni": str(documento or "").strip(),
+        "nombre": (str(nombre).strip() or None) if nombre else None,
+    }
+
+
+def leer_entradas(ruta: str):
+    """
+    Entradas de un archivo, como dicts {id, dni, nombre}.
+
+    - .jsonl: un objeto por línea con "dni" (o "cuil"), y opcionalmente "nombre" e "id"
+    - .csv: con encabezado (columnas dni/cuil/documento, nombre, id) o sin él
+      (documento en la primera columna y nombre en la segunda)
+    - otro: un documento por línea, opcionalmente seguido del nombre
+    El id por defecto es el número de fila, así un lote relanzado saltea lo mismo.
+    """
+    ext = os.path.splitext(ruta)[1].lower()
+
+    with open(ruta, "r", encoding="utf-8-sig", newline="") as f:
+        if ext == ".jsonl":
+            for i, linea in enumerate(f, 1):
+                if not linea.strip():
+                    continue
+                datos = json.loads(linea)
+                documento = next((datos[c] for c in _COLUMNAS_DOCUMENTO if datos.get(c)), "")
+                yield _entrada(datos.get("id", i), documento, datos.get("nombre"))
+            return
+
+        if ext == ".csv":
+            muestra = f.read(4096)
+            f.seek(0)
+            try:
+                dialecto = csv.Sniffer().sniff(muestra, delimiters=",;\t")
+            except csv.Error:
+                dialecto = csv.excel
+            filas = csv.reader(f, dialecto)
+            encabezado = next(filas, None)
+            if encabezado is None:
+                return
+            columnas = [c.strip().lower() for c in encabezado]
+            if any(c in _COLUMNAS_DOCUMENTO for c in columnas):
+                i_doc = next(i for i, c in enumerate(columnas) if c in _COLUMNAS_DOCUMENTO)
+                i_nombre = columnas.index("nombre") if "nombre" in columnas else None
+                i_id = columnas.index("id") if "id" in columnas else None
+            else:
+                # Sin encabezado: la primera fila también es un dato
+                i_doc, i_nombre, i_id = 0, 1, None
+                filas = _con_primera(encabezado, filas)
+            for n, fila in enumerate(filas, 1):
+                if not fila or not fila[i_doc].strip():
+                    continue
+                nombre = fila[i_nombre] if i_nombre is not None and i_nombre < len(fila) else None
+                yield _entrada(fila[i_id] if i_id is not None else n, fila[i_doc], nombre)
+            return
+
+        for i, linea in enumerate(f, 1):
+            partes = linea.strip().split(None, 1)
+            if partes:
+                yield _entrada(i, partes[0], partes[1] if len(partes) > 1 else None)
+
+
+def _con_primera(primera, resto):
+    yield primera
+    yield from resto
+
+
+def _normalizar_entradas(entradas: Iterable):
+    """Acepta strings, tuplas (dni, nombre) o dicts; el id por defecto es la posición"""
+    for i, e in enumerate(entradas, 1):
+        if isinstance(e, dict):
+            yield _entrada(e.get("id", i), e.get("dni") or e.get("cuil"), e.get("nombre"))
+        elif isinstance(e, (tuple, list)):
+            yield _entrada(i, e[0], e[1] if len(e) > 1 else None)
+        else:
+            yield _entrada(i, e)
+
+
+def _ids_procesados(ruta_salida: str) -> set:
+    """ids que ya tienen resultado (no ERROR) en el JSONL de salida; descarta una última línea cortada"""
+    hechos = set()
+    if not os.path.exists(ruta_salida):
+        return hechos
+
+    with open(ruta_salida, "rb+") as f:
+        contenido = f.read()
+        completo = contenido.rfind(b"\n") + 1
+        if completo < len(contenido):
+            # El proceso murió a mitad de una línea: se trunca y esa fila se rehace
+            f.truncate(completo)
+
+    for linea in contenido[:completo].splitlines():
+        try:
+            datos = json.loads(linea)
+            if datos.get("estado") != ERROR:
+                hechos.add(str(datos["id"]))
+        except (ValueError, KeyError, AttributeError):
+            continue
+    return hechos
+
+
+def _limitado(buscar, semaforo: asyncio.Semaphore):
+    async def envoltura(*args, **kwargs):
+        async with semaforo:
+            return await buscar(*args, **kwargs)
+    return envoltura
+
+
+def _buscador(backend: str, limites: dict):
+    """Función async (dni, nombre) -> dict para el backend pedido, con su límite de concurrencia"""
+    semaforos = {nombre: asyncio.Semaphore(n) for nombre, n in limites.items()}
+
+    if backend == "resolver":
+        from resolver import Resolver, Estrategia, obtener_resolver
+
+        # Resolver propio del lote: mismas estrategias con límite por backend y estadísticas
+        # propias (arrancan de las del proceso), así el lote no mueve el orden de la API
+        resolver = Resolver([
+            Estrategia(nombre, e.buscar, e.stats.latencia, e.stats.exito, e.timeout, limite=semaforos[nombre])
+            for nombre, e in obtener_resolver().estrategias.items()
+        ])
+
+        async def buscar(dni, nombre):
+            return await resolver.resolver(dni, nombre)
+        return buscar
+
+    if backend == "nosis3":
+        from nosis3 import nosis3_buscar as buscar_backend
+    elif backend == "nosis2":
+        from nosis2 import nosis2_buscar as buscar_backend
+    elif backend == "nosis":
+        from nosis import nosis_buscar_planificado as buscar_backend
+    else:
+        raise ValueError(f"Backend desconocido: {backend}")
+
+    limitado = _limitado(buscar_backend, semaforos[backend])
+
+    async def buscar(dni, nombre):
+        return (await limitado(dni, nombre)).a_dict()
+    return buscar
+
+
+async def procesar_lote(entradas, ruta_salida: str, backend: str = "resolver",
+                        concurrencia: int = LOTE_CONCURRENCIA, limites: Optional[dict] = None,
+                        reanudar: bool = True) -> dict:
+    """
+    Resuelve un lote y escribe un JSONL con una línea por entrada, en orden de finalización.
+
+    Args:
+        entradas: Ruta a CSV/JSONL/texto, o iterable de strings, tuplas (dni, nombre) o dicts
+        ruta_salida: JSONL de resultados (y checkpoint para reanudar)
+        backend: "resolver" (los tres, en orden por costo), "nosis3", "nosis2" o "nosis"
+        concurrencia: Búsquedas del lote en curso a la vez
+        limites: Máximo simultáneo por backend (por defecto LOTE_LIMITES)
+        reanudar: Saltear los id que ya tienen resultado sin ERROR en ruta_salida (si no, se sobrescribe)
+
+    Returns:
+        dict con procesadas, salteadas, errores y segundos
+    """
+    inicio = time.monotonic()
+    if isinstance(entradas, str):
+        entradas = leer_entradas(entradas)
+    else:
+        entradas = _normalizar_entradas(entradas)
+
+    hechos = _ids_procesados(ruta_salida) if reanudar else set()
+    buscar = _buscador(backend, {**LOTE_LIMITES, **(limites or {})})
+    stats = {"procesadas": 0, "salteadas": 0, "errores": 0}
+
+    pendientes = iter(entradas)
+
+    def siguiente():
+        for e in pendientes:
+            if e["id"] in hechos:
+                stats["salteadas"] += 1
+                continue
+            return e
+        return None
+
+    with open(ruta_salida, "a" if reanudar else "w", encoding="utf-8") as salida:
+
+        async def worker():
+            while True:
+                e = siguiente()
+                if e is None:
+                    return
+                t0 = time.monotonic()
+                # Un id de consulta por entrada: va en el JSONL y en cada línea de log de su búsqueda
+                with contexto_consulta() as id_consulta:
+                    try:
+                        res = await buscar(e["dni"], e["nombre"])
+                    except Exception as ex:
+                        res = error(f"{type(ex).__name__}: {ex}").a_dict()
+                if res.get("estado") == ERROR:
+                    stats["errores"] += 1
+                stats["procesadas"] += 1
+
+                linea = {"id": e["id"], "id_consulta": id_consulta, "entrada": e["dni"],
+                         "nombre_filtro": e["nombre"], **res,
+                         "segundos_lote": round(time.monotonic() - t0, 3)}
+                salida.write(json.dumps(linea, ensure_ascii=False) + "\n")
+                salida.flush()
+
+        await asyncio.gather(*(worker() for _ in range(max(1, concurrencia))))
+        os.fsync(salida.fileno())
+
+    stats["segundos"] = round(time.monotonic() - inicio, 3)
+    return stats
+
+
+async def _cerrar_backends(backend: str):
+    """Cierra lo que levantó el lote: navegadores y planificador de Nosis, cliente HTTP de nosis2, threads de AFIP"""
+    fuentes = ("nosis3", "nosis2", "nosis") if backend == "resolver" else (backend,)
+    if "nosis" in fuentes:
+        from nosis import cerrar_pool
+        await cerrar_pool()
+    if "nosis2" in fuentes:
+        from nosis2 import cerrar_cliente
+        await cerrar_cliente()
+    if "nosis3" in fuentes:
+        from nosis3 import cerrar_afip
+        cerrar_afip()
+
+
+async def _correr(args) -> dict:
+    try:
+        return await procesar_lote(
+            args.entradas, args.salida, backend=args.backend,
+            concurrencia=args.concurrencia, reanudar=not args.desde_cero
+        )
+    finally:
+        await _cerrar_backends(args.backend)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Búsqueda por lotes de DNIs/CUILs")
+    parser.add_argument("entradas", help="CSV, JSONL o texto con un documento por línea")
+    parser.add_argument("-o", "--salida", required=True, help="JSONL de resultados (se reanuda si existe)")
+    parser.add_argument("--backend", default="resolver", choices=["resolver", "nosis3", "nosis2", "nosis"])
+    parser.add_argument("--concurrencia", type=int, default=LOTE_CONCURRENCIA)
+    parser.add_argument("--desde-cero", action="store_true", help="No reanudar: sobrescribir la salida")
+    args = parser.parse_args(argv)
+    iniciar_servidor()  # /metrics y /spans si METRICAS_PUERTO está definido
+
+    stats = asyncio.run(_correr(args))
+    print(f"Lote terminado: {stats['procesadas']} procesadas, {stats['salteadas']} salteadas "
+          f"(ya estaban), {stats['errores']} con error en {stats['segundos']:.1f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
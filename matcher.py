@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+"""
+matcher.py - Coincidencia flexible de un nombre parcial contra un nombre completo.
+
+Reglas (las de siempre de nosis2/nosis3):
+- el filtro está contenido en el nombre -> coincide
+- filtro de 3 letras o menos: solo por contenido
+- si no, por cada palabra del nombre: la palabra está contenida en el filtro, o la
+  distancia de Levenshtein al filtro (palabra completa, o su inicio del largo del filtro)
+  es de 1 error como máximo (filtros de hasta 6 letras) o 2 (más largos).
+  Ejemplos: JONATAN=JONATHAN, CARRISO=CARRIZO
+
+El filtro se compila una vez (`FiltroNombre`) y la distancia se calcula con el algoritmo
+bit-paralelo de Myers/Hyyrö: una sola pasada por palabra da a la vez la distancia a la
+palabra completa y a su inicio.
+
+Con muchos homónimos, `IndiceCandidatos` indexa una vez los nombres de la respuesta
+(palabras y trigramas) y ordena los que coinciden por similitud con el filtro, para
+quedarse con el mejor y no con el primero.
+"""
+
+import unicodedata
+from collections import Counter, defaultdict
+from functools import lru_cache
+from typing import List, Optional
+
+
+@lru_cache(maxsize=4096)
+def normalizar(s: str) -> str:
+    """Normaliza texto removiendo acentos y convirtiendo a minúsculas (memoizado)"""
+    if not s:
+        return ""
+    s = unicodedata.normalize("NFKD", s)
+    s = "".join(ch for ch in s if not unicodedata.combining(ch))
+    return " ".join(s.lower().split())
+
+
+class FiltroNombre:
+    """Filtro de nombre precompilado; `coincide(nombre)` decide igual que `coincide_flexible`"""
+
+    __slots__ = ("texto", "largo", "max_errores", "_peq", "_alto", "_mascara")
+
+    def __init__(self, filtro: str):
+        self.texto = (filtro or "").lower()
+        self.largo = len(self.texto)
+        self.max_errores = 1 if self.largo <= 6 else 2
+
+        # Máscara de posiciones de cada letra en el filtro (Peq del algoritmo de Myers)
+        self._peq = {}
+        for i, c in enumerate(self.texto):
+            self._peq[c] = self._peq.get(c, 0) | (1 << i)
+        self._alto = 1 << (self.largo - 1) if self.largo else 0
+        self._mascara = (1 << self.largo) - 1
+
+    def _distancias(self, palabra: str):
+        """
+        (distancia al inicio de la palabra del largo del filtro, distancia a la palabra completa).
+        La primera es None si la palabra es más corta que el filtro.
+        """
+        m = self.largo
+        peq = self._peq
+        alto = self._alto
+        mascara = self._mascara
+        pv, mv, puntaje = mascara, 0, m
+        inicio = None
+
+        for j, c in enumerate(palabra, 1):
+            eq = peq.get(c, 0)
+            xv = eq | mv
+            xh = (((eq & pv) + pv) ^ pv) | eq
+            ph = mv | (~(xh | pv) & mascara)
+            mh = pv & xh
+            if ph & alto:
+                puntaje += 1
+            elif mh & alto:
+                puntaje -= 1
+            # Distancia global: la fila 0 vale j, así que entra un +1 por abajo
+            ph = ((ph << 1) | 1) & mascara
+            mh = (mh << 1) & mascara
+            pv = mh | (~(xv | ph) & mascara)
+            mv = ph & xv
+            if j == m:
+                inicio = puntaje
+
+        return inicio, puntaje
+
+    def coincide(self, nombre: str) -> bool:
+        if not self.texto or not nombre:
+            return False
+
+        filtro = self.texto
+        nombre = nombre.lower()
+
+        # Coincidencia exacta contenida (cubre también "filtro contenido en una palabra")
+        if filtro in nombre:
+            return True
+
+        # Filtros cortos: solo por contenido, que ya se descartó
+        if self.largo <= 3:
+            return False
+
+        max_errores = self.max_errores
+        for palabra in nombre.split():
+            if palabra in filtro:
+                return True
+
+            # La distancia nunca es menor que la diferencia de largos
+            completa = abs(len(palabra) - self.largo) <= max_errores
+            if not completa and len(palabra) < self.largo:
+                continue
+
+            inicio, total = self._distancias(palabra)
+            if completa and total <= max_errores:
+                return True
+            if inicio is not None and inicio <= max_errores:
+                return True
+
+        return False
+
+
+@lru_cache(maxsize=256)
+def compilar(filtro: str) -> FiltroNombre:
+    """FiltroNombre compartido para un filtro (los lotes repiten el mismo muchas veces)"""
+    return FiltroNombre(filtro)
+
+
+def coincide_flexible(filtro: str, nombre: str) -> bool:
+    """
+    Verifica si el filtro coincide con el nombre de forma flexible.
+    Acepta coincidencias parciales y errores mínimos (hasta 2 caracteres de diferencia).
+    """
+    if not filtro or not nombre:
+        return False
+    return compilar(filtro).coincide(nombre)
+
+
+def _trigramas(palabra: str) -> Counter:
+    """Trigramas con relleno ("  ab", " abc", ...), así el inicio de la palabra pesa más"""
+    relleno = f"  {palabra} "
+    return Counter(relleno[i:i + 3] for i in range(len(relleno) - 2))
+
+
+class IndiceCandidatos:
+    """
+    Índice de los nombres de una respuesta con varios candidatos (homónimos).
+
+    Los nombres se normalizan una sola vez al construirlo; `ordenar(filtro)` devuelve los
+    índices de los que coinciden con el filtro (mismo criterio que `coincide_flexible`),
+    del más parecido al menos. El puntaje es, por cada palabra del filtro, la similitud
+    de Dice de trigramas con la palabra más parecida del nombre, promediada.
+    """
+
+    def __init__(self, nombres):
+        self.nombres = [normalizar(n) if n else "" for n in nombres]
+        # trigrama -> [(candidato, palabra, repeticiones)]
+        self._postings = defaultdict(list)
+        self._tamanos = {}
+        for i, nombre in enumerate(self.nombres):
+            for j, palabra in enumerate(nombre.split()):
+                trigramas = _trigramas(palabra)
+                self._tamanos[(i, j)] = sum(trigramas.values())
+                for trigrama, n in trigramas.items():
+                    self._postings[trigrama].append((i, j, n))
+
+    def __len__(self):
+        return len(self.nombres)
+
+    def puntajes(self, filtro_norm: str) -> List[float]:
+        """Similitud (0 a 1) de cada candidato con el filtro ya normalizado"""
+        palabras = filtro_norm.split()
+        totales = [0.0] * len(self.nombres)
+        if not palabras:
+            return totales
+
+        for palabra in palabras:
+            trigramas = _trigramas(palabra)
+            tamano = sum(trigramas.values())
+            comunes = defaultdict(int)
+            for trigrama, n in trigramas.items():
+                for i, j, m in self._postings.get(trigrama, ()):
+                    comunes[(i, j)] += min(n, m)
+
+            mejor = {}
+            for (i, j), c in comunes.items():
+                dice = 2.0 * c / (tamano + self._tamanos[(i, j)])
+                if dice > mejor.get(i, 0.0):
+                    mejor[i] = dice
+            for i, dice in mejor.items():
+                totales[i] += dice
+
+        return [t / len(palabras) for t in totales]
+
+    def ordenar(self, filtro_norm: str) -> List[int]:
+        """Índices de los candidatos que coinciden con el filtro, del mejor al peor (estable)"""
+        filtro = compilar(filtro_norm)
+        coinciden = [i for i, nombre in enumerate(self.nombres) if filtro.coincide(nombre)]
+        if len(coinciden) < 2:
+            return coinciden
+        puntajes = self.puntajes(filtro_norm)
+        return sorted(coinciden, key=lambda i: -puntajes[i])
+
+    def mejor(self, filtro_norm: str) -> Optional[int]:
+        """Índice del candidato que mejor coincide con el filtro, o None si ninguno coincide"""
+        orden = self.ordenar(filtro_norm)
+        return orden[0] if orden else None
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""
+memo.py - Memoización en memoria para las búsquedas async (nosis, nosis2, nosis3).
+
+`memo_async` envuelve una corrutina para que:
+- los pedidos idénticos que llegan mientras otro está en curso esperen ese mismo
+  resultado en lugar de repetir el trabajo externo (coalescing);
+- los resultados recientes se guarden en un LRU acotado con TTL.
+
+Lo que no salió de una llamada propia (acierto o pedido coalescido) se devuelve como
+copia con `desde_memo=True` cuando el resultado tiene ese atributo (ver resultado.py).
+"""
+
+import os
+import copy
+import time
+import asyncio
+import inspect
+import functools
+from collections import OrderedDict
+from cache_identidad import normalizar_clave
+
+MEMO_TTL = float(os.getenv("MEMO_TTL", "300"))  # Segundos que vive un resultado en memoria
+MEMO_MAX = int(os.getenv("MEMO_MAX", "1024"))  # Resultados recordados por función
+
+# Nombre de la función -> Memo, para reportar todos los contadores juntos
+memos = {}
+
+
+class Memo:
+    """LRU con TTL + tabla de pedidos en curso para una función async"""
+
+    def __init__(self, nombre: str, maxsize: int = MEMO_MAX, ttl: float = MEMO_TTL):
+        self.nombre = nombre
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lru = OrderedDict()  # clave -> (guardado, resultado)
+        self._en_curso = {}  # clave -> asyncio.Task
+        self.aciertos = 0
+        self.fallos = 0
+        self.coalescidas = 0
+        self.vencidas = 0
+        self.desalojos = 0
+
+    def obtener(self, clave):
+        """(True, resultado) si hay uno vigente para la clave; (False, None) si no"""
+        entrada = self._lru.get(clave)
+        if entrada is None:
+            return False, None
+        guardado, resultado = entrada
+        if time.monotonic() - guardado > self.ttl:
+            del self._lru[clave]
+            self.vencidas += 1
+            return False, None
+        self._lru.move_to_end(clave)
+        return True, resultado
+
+    def guardar(self, clave, resultado):
+        self._lru[clave] = (time.monotonic(), resultado)
+        self._lru.move_to_end(clave)
+        while len(self._lru) > self.maxsize:
+            self._lru.popitem(last=False)
+            self.desalojos += 1
+
+    def limpiar(self):
+        self._lru.clear()
+
+    def info(self) -> dict:
+        return {
+            "tamano": len(self._lru),
+            "en_curso": len(self._en_curso),
+            "aciertos": self.aciertos,
+            "fallos": self.fallos,
+            "coalescidas": self.coalescidas,
+            "vencidas": self.vencidas,
+            "desalojos": self.desalojos,
+        }
+
+
+def memo_async(clave, cachear=None, bypass: str = None, maxsize: int = MEMO_MAX, ttl: float = MEMO_TTL):
+    """
+    Decorador de memoización + coalescing para corrutinas.
+
+    Args:
+        clave: Función que recibe los argumentos ya ligados (dict nombre -> valor)
+               y devuelve la clave del pedido (p. ej. DNI normalizado + filtro)
+        cachear: Predicado sobre el resultado; solo se recuerdan los que lo cumplen
+                 (los errores transitorios no deberían quedar en memoria)
+        bypass: Nombre del argumento booleano que, en False, saltea la memoización
+        maxsize, ttl: Tamaño del LRU y segundos de vida de cada resultado
+    """
+    def decorador(func):
+        firma = inspect.signature(func)
+        memo = Memo(func.__name__, maxsize, ttl)
+        memos[func.__name__] = memo
+
+        @functools.wraps(func)
+        async def envoltura(*args, **kwargs):
+            ligados = firma.bind(*args, **kwargs)
+            ligados.apply_defaults()
+            if bypass and not ligados.arguments.get(bypass, True):
+                return await func(*args, **kwargs)
+
+            k = clave(ligados.arguments)
+
+            encontrado, resultado = memo.obtener(k)
+            if encontrado:
+                memo.aciertos += 1
+                return _desde_memo(resultado)
+
+            # shield: si un pedido se cancela, los demás que esperan la misma tarea siguen
+            tarea = memo._en_curso.get(k)
+            if tarea is not None:
+                memo.coalescidas += 1
+                return _desde_memo(await asyncio.shield(tarea))
+
+            memo.fallos += 1
+            tarea = asyncio.ensure_future(func(*args, **kwargs))
+            memo._en_curso[k] = tarea
+
+            def _terminar(t, k=k):
+                memo._en_curso.pop(k, None)
+                if t.cancelled() or t.exception() is not None:
+                    return
+                if cachear is None or cachear(t.result()):
+                    memo.guardar(k, t.result())
+
+            tarea.add_done_callback(_terminar)
+            return await asyncio.shield(tarea)
+
+        envoltura.memo = memo
+        return envoltura
+
+    return decorador
+
+
+def _desde_memo(resultado):
+    """Copia marcada con desde_memo=True; cada llamador recibe su propio objeto"""
+    if not hasattr(resultado, "desde_memo"):
+        return resultado
+    copia = copy.copy(resultado)
+    copia.candidatos = list(copia.candidatos)
+    copia.desde_memo = True
+    return copia
+
+
+def clave_busqueda(dni_o_cuil, nombre_filtro=None, separadores: str = "- ") -> tuple:
+    """
+    Clave de una búsqueda: DNI/CUIL normalizado + filtro en minúsculas sin espacios de más.
+
+    Solo se normaliza un documento que, sin los `separadores` que el backend mismo quita,
+    es todo dígitos; cualquier otra entrada queda tal cual, así "12a34567" (ERROR de
+    validación) no comparte clave con "1234567".
+    """
+    texto = str(dni_o_cuil or "").strip()
+    limpio = texto
+    for separador in separadores:
+        limpio = limpio.replace(separador, "")
+    documento = (normalizar_clave(limpio) if limpio.isdigit() else None) or texto
+    return (documento, " ".join(str(nombre_filtro or "").lower().split()))
+
+
+def estadisticas() -> dict:
+    """Contadores de todas las funciones memoizadas"""
+    return {nombre: memo.info() for nombre, memo in memos.items()}
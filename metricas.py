@@ -0,0 +1,304 @@
+# -*- coding: utf-8 -*-
+"""
+metricas.py - Métricas y trazas de las búsquedas (sin dependencias externas).
+
+- `tramo("nosis.goto", ...)`: mide una etapa. Su duración va al histograma
+  identidad_etapa_segundos{etapa=...} y queda como span estilo OpenTelemetry (trace_id,
+  span_id, padre, atributos, estado) en un buffer circular. Los tramos anidados,
+  también entre tareas asyncio, cuelgan del tramo que los contiene.
+- `contar(nombre, ...)`: contadores por etiqueta (resultados, tipos de respuesta, captchas).
+- `observar(nombre, segundos, ...)`: histogramas de latencia con buckets fijos.
+- `texto_prometheus()`: todo en formato de exposición de Prometheus; `spans()`: los
+  últimos spans como dicts (OTLP/JSON simplificado). `iniciar_servidor(puerto)` publica
+  /metrics y /spans por HTTP.
+
+METRICAS=0 apaga todo: los tramos pasan a costar una llamada vacía.
+"""
+
+import os
+import json
+import time
+import uuid
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+from registro import id_consulta
+
+METRICAS = os.getenv("METRICAS", "1") == "1"  # 0 desactiva contadores, histogramas y spans
+METRICAS_SPANS = int(os.getenv("METRICAS_SPANS", "2000"))  # Spans recientes que se conservan
+METRICAS_PUERTO = int(os.getenv("METRICAS_PUERTO", "0"))  # Puerto HTTP de /metrics (0 = no servir)
+
+# Buckets de latencia en segundos: de requests HTTP rápidos a captchas de un minuto
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+PREFIJO = "identidad_"
+
+
+def _etiquetas_texto(etiquetas: tuple) -> str:
+    if not etiquetas:
+        return ""
+    partes = []
+    for clave, valor in etiquetas:
+        valor = str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        partes.append(f'{clave}="{valor}"')
+    return "{" + ",".join(partes) + "}"
+
+
+class Contador:
+    def __init__(self, nombre: str, ayuda: str = ""):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.valores = {}
+        self._lock = threading.Lock()
+
+    def sumar(self, etiquetas: tuple = (), valor: float = 1):
+        with self._lock:
+            self.valores[etiquetas] = self.valores.get(etiquetas, 0) + valor
+
+    def exportar(self) -> list:
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} counter"]
+        with self._lock:
+            for etiquetas, valor in sorted(self.valores.items()):
+                lineas.append(f"{self.nombre}{_etiquetas_texto(etiquetas)} {valor:g}")
+        return lineas
+
+
+class Histograma:
+    def __init__(self, nombre: str, ayuda: str = "", buckets=BUCKETS):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.buckets = tuple(buckets)
+        self.series = {}  # etiquetas -> [conteos por bucket..., +Inf, suma]
+        self._lock = threading.Lock()
+
+    def observar(self, valor: float, etiquetas: tuple = ()):
+        with self._lock:
+            serie = self.series.get(etiquetas)
+            if serie is None:
+                serie = self.series[etiquetas] = [0] * (len(self.buckets) + 2)
+            for i, limite in enumerate(self.buckets):
+                if valor <= limite:
+                    serie[i] += 1
+                    break
+            else:
+                serie[len(self.buckets)] += 1
+            serie[-1] += valor
+
+    def exportar(self) -> list:
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} histogram"]
+        with self._lock:
+            for etiquetas, serie in sorted(self.series.items()):
+                acumulado = 0
+                for limite, n in zip(self.buckets + ("+Inf",), serie):
+                    acumulado += n
+                    lineas.append(f"{self.nombre}_bucket{_etiquetas_texto(etiquetas + (('le', f'{limite:g}' if limite != '+Inf' else limite),))} {acumulado}")
+                lineas.append(f"{self.nombre}_sum{_etiquetas_texto(etiquetas)} {serie[-1]:.6f}")
+                lineas.append(f"{self.nombre}_count{_etiquetas_texto(etiquetas)} {acumulado}")
+        return lineas
+
+
+class Metricas:
+    """Registro de contadores, histogramas y spans del proceso"""
+
+    def __init__(self, max_spans: int = METRICAS_SPANS):
+        self.contadores = {}
+        self.histogramas = {}
+        self.spans = deque(maxlen=max_spans)
+        self._lock = threading.Lock()
+
+    def contador(self, nombre: str, ayuda: str = "") -> Contador:
+        nombre = PREFIJO + nombre
+        with self._lock:
+            if nombre not in self.contadores:
+                self.contadores[nombre] = Contador(nombre, ayuda)
+            return self.contadores[nombre]
+
+    def histograma(self, nombre: str, ayuda: str = "") -> Histograma:
+        nombre = PREFIJO + nombre
+        with self._lock:
+            if nombre not in self.histogramas:
+                self.histogramas[nombre] = Histograma(nombre, ayuda)
+            return self.histogramas[nombre]
+
+    def texto_prometheus(self) -> str:
+        lineas = []
+        with self._lock:
+            metricas = list(self.contadores.values()) + list(self.histogramas.values())
+        for m in metricas:
+            lineas.extend(m.exportar())
+        return "\n".join(lineas) + "\n"
+
+    def reiniciar(self):
+        with self._lock:
+            self.contadores.clear()
+            self.histogramas.clear()
+            self.spans.clear()
+
+
+_metricas = Metricas()
+
+_AYUDAS = {
+    "etapa_segundos": "Duración de cada etapa de una búsqueda",
+    "resultados_total": "Resultados de *_buscar por fuente y estado",
+    "respuestas_total": "Respuestas de *_lookup por fuente y tipo (formato del bot)",
+    "captcha_total": "Captchas de Nosis vistos, resueltos y fallidos",
+    "fuente_total": "Consultas HTTP de nosis2 por fuente y desenlace",
+}
+
+
+def obtener_metricas() -> Metricas:
+    return _metricas
+
+
+def _tupla(etiquetas: dict) -> tuple:
+    return tuple(sorted((k, v) for k, v in etiquetas.items() if v is not None))
+
+
+def contar(nombre: str, valor: float = 1, **etiquetas):
+    """Suma `valor` al contador identidad_<nombre> con esas etiquetas"""
+    if METRICAS:
+        _metricas.contador(nombre, _AYUDAS.get(nombre, "")).sumar(_tupla(etiquetas), valor)
+
+
+def observar(nombre: str, segundos: float, **etiquetas):
+    """Registra una latencia en el histograma identidad_<nombre>"""
+    if METRICAS:
+        _metricas.histograma(nombre, _AYUDAS.get(nombre, "")).observar(segundos, _tupla(etiquetas))
+
+
+# --- Spans ---------------------------------------------------------------------------------
+
+_span_actual: contextvars.ContextVar = contextvars.ContextVar("span_actual", default=None)
+
+
+class Span:
+    """Una etapa medida; `atributos` se pueden completar dentro del bloque"""
+
+    __slots__ = ("nombre", "trace_id", "span_id", "padre", "inicio_ns", "fin_ns", "atributos", "estado", "error")
+
+    def __init__(self, nombre: str, padre: Optional["Span"], atributos: dict):
+        self.nombre = nombre
+        self.trace_id = padre.trace_id if padre else uuid.uuid4().hex
+        self.span_id = uuid.uuid4().hex[:16]
+        self.padre = padre.span_id if padre else None
+        self.inicio_ns = time.time_ns()
+        self.fin_ns = None
+        self.atributos = atributos
+        self.estado = "OK"
+        self.error = None
+
+    @property
+    def segundos(self) -> float:
+        return ((self.fin_ns or time.time_ns()) - self.inicio_ns) / 1e9
+
+    def a_dict(self) -> dict:
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.padre,
+            "name": self.nombre,
+            "startTimeUnixNano": self.inicio_ns,
+            "endTimeUnixNano": self.fin_ns,
+            "attributes": self.atributos,
+            "status": {"code": self.estado, "message": self.error},
+        }
+
+
+class _SpanNulo:
+    """Lo que entrega `tramo` con METRICAS=0: acepta atributos y no hace nada"""
+
+    segundos = 0.0
+
+    @property
+    def atributos(self) -> dict:
+        # Un dict nuevo cada vez: lo que se escribe se descarta, nada se comparte entre spans
+        return {}
+
+
+_SPAN_NULO = _SpanNulo()
+
+
+@contextmanager
+def tramo(nombre: str, **atributos):
+    """
+    Mide una etapa (`with tramo("nosis3.get_persona", cuil=...) as span:`).
+
+    Una excepción que escapa del bloque marca el span con estado ERROR y se propaga;
+    la cancelación de una tarea también se registra.
+    """
+    if not METRICAS:
+        yield _SPAN_NULO
+        return
+
+    padre = _span_actual.get()
+    if padre is None:
+        consulta = id_consulta()
+        if consulta:
+            atributos["id_consulta"] = consulta
+    span = Span(nombre, padre, atributos)
+    token = _span_actual.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.estado = "ERROR"
+        span.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _span_actual.reset(token)
+        span.fin_ns = time.time_ns()
+        _metricas.spans.append(span)
+        observar("etapa_segundos", span.segundos, etapa=nombre, estado=span.estado)
+
+
+def spans(n: Optional[int] = None, trace_id: Optional[str] = None) -> list:
+    """Últimos spans terminados como dicts (todos, o los de una traza)"""
+    lista = list(_metricas.spans)
+    if trace_id:
+        lista = [s for s in lista if s.trace_id == trace_id]
+    if n:
+        lista = lista[-n:]
+    return [s.a_dict() for s in lista]
+
+
+def texto_prometheus() -> str:
+    return _metricas.texto_prometheus()
+
+
+# --- Exposición HTTP ----------------------------------------------------------------------
+
+class _Manejador(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.startswith("/metrics"):
+            cuerpo = texto_prometheus().encode()
+            tipo = "text/plain; version=0.0.4; charset=utf-8"
+        elif self.path.startswith("/spans"):
+            cuerpo = json.dumps(spans(), ensure_ascii=False, default=str).encode()
+            tipo = "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", tipo)
+        self.send_header("Content-Length", str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def log_message(self, *args):
+        pass
+
+
+_servidor: Optional[ThreadingHTTPServer] = None
+
+
+def iniciar_servidor(puerto: int = None, host: str = "127.0.0.1") -> Optional[ThreadingHTTPServer]:
+    """Sirve /metrics (Prometheus) y /spans (JSON) en un thread aparte; idempotente"""
+    global _servidor
+    puerto = METRICAS_PUERTO if puerto is None else puerto
+    if _servidor is None and puerto:
+        _servidor = ThreadingHTTPServer((host, puerto), _Manejador)
+        threading.Thread(target=_servidor.serve_forever, name="metricas", daemon=True).start()
+    return _servidor
@@ -1,36 +1,118 @@
 # -*- coding: utf-8 -*-
-import unicodedata
 import os
+import logging
 import asyncio
+import json
+import shutil
+import tempfile
+import time
+from contextlib import asynccontextmanager
 from typing import Optional, Tuple
-from playwright.async_api import async_playwright
+from urllib.parse import urlparse
+from playwright.async_api import async_playwright, TimeoutError as PlaywrightTimeoutError
 from dotenv import load_dotenv
+from cache_identidad import obtener_cache
+from memo import memo_async, clave_busqueda
+from resultado import Resultado, Candidato, error, OK, MULTIPLE, NO_MATCH, NO_ENCONTRADO, ERROR
+from formato import tupla_nosis, tipo_respuesta
+from registro import obtener_logger, contexto_consulta
+from metricas import tramo, contar
+from matcher import normalizar as _norm, IndiceCandidatos
+from cuil import formatear as formatear_cuil
 
 # Cargar variables de entorno
 load_dotenv()
 
-NOSIS_URL = "https://informes.nosis.com/?source=SitioNosis&q=&UrlReferer="
+log = obtener_logger("nosis")
+
+NOSIS_URL = os.getenv("NOSIS_URL", "https://informes.nosis.com/?source=SitioNosis&q=&UrlReferer=")  # Los benchmarks apuntan a un servidor local
 
 # Path a la extensión Buster (descargada localmente)
 BUSTER_EXTENSION_PATH = os.path.join(os.path.dirname(__file__), "buster-extension")
 
+# Pool de navegadores (contextos persistentes pre-lanzados)
+POOL_TAMANO = int(os.getenv("NOSIS_POOL_TAMANO", "2"))  # Máximo de contextos vivos
+POOL_MINIMO = int(os.getenv("NOSIS_POOL_MINIMO", "1"))  # Contextos que sobreviven a la limpieza por inactividad
+POOL_MAX_USOS = int(os.getenv("NOSIS_POOL_MAX_USOS", "50"))  # Reciclar contexto tras N búsquedas
+POOL_MAX_INACTIVO = float(os.getenv("NOSIS_POOL_MAX_INACTIVO", "600"))  # Segundos ocioso antes de cerrarlo
+
+# Sesión que ya pasó el captcha (cookies + storage), compartida entre búsquedas
+SESION_PATH = os.getenv("NOSIS_SESION_PATH", os.path.join(os.path.dirname(__file__), "nosis_sesion.json"))
+SESION_TTL = float(os.getenv("NOSIS_SESION_TTL", "1800"))  # Segundos antes de considerarla vencida
+
+# Planificador de búsquedas concurrentes
+PLANIFICADOR_TASA = float(os.getenv("NOSIS_TASA_POR_SEGUNDO", "0.5"))  # Búsquedas por segundo por host
+PLANIFICADOR_RAFAGA = int(os.getenv("NOSIS_RAFAGA", "2"))  # Búsquedas seguidas permitidas sin esperar
+PLANIFICADOR_DEADLINE = float(os.getenv("NOSIS_DEADLINE", "180"))  # Segundos máximos por pedido (cola + búsqueda)
+
+# Configurar opciones del navegador con optimizaciones
+BROWSER_ARGS = [
+    '--disable-blink-features=AutomationControlled',
+    '--disable-dev-shm-usage',
+    '--no-sandbox',
+    '--disable-gpu',
+    # NUEVOS ARGS OPTIMIZADOS PARA HEADLESS:
+    '--single-process',  # Reduce memoria en headless
+    '--disable-background-timer-throttling',  # Performance
+    '--disable-backgrounding-occluded-windows',  # Performance
+    '--disable-renderer-backgrounding',  # Performance
+    '--disable-ipc-flooding-protection',  # Speed
+    '--password-store=basic',  # Menos overhead
+    '--use-mock-keychain',  # Menos overhead
+]
+
+
+# Predicado evaluado dentro de la página: qué condición de "captcha superado" se cumple
+_JS_CAPTCHA_O_RESULTADOS = """() => {
+    const captcha = document.querySelector('#contenedorCaptcha');
+    if (captcha && captcha.style.display === 'none') return 'captcha_oculto';
+    if (document.querySelector('div.result.row')) return 'resultados';
+    return false;
+}"""
+
+_JS_CAPTCHA_VISIBLE = """() => {
+    const captcha = document.querySelector('#contenedorCaptcha');
+    return !!((captcha && captcha.style.display !== 'none') || document.querySelector('div.g-recaptcha'));
+}"""
 
-def _norm(s: str) -> str:
-    """Normaliza texto removiendo acentos y convirtiendo a minúsculas"""
-    if not s:
-        return ""
-    s = unicodedata.normalize("NFKD", s)
-    s = "".join(ch for ch in s if not unicodedata.combining(ch))
-    return " ".join(s.lower().split())
 
+# Extracción de filas de resultados en la página: [{cuit, razon_social}] sin templates
+_JS_EXTRAER_RESULTADOS = """rows => {
+    const filas = [];
+    for (const row of rows) {
+        const cuit = row.querySelector('.cuit');
+        const rz = row.querySelector('.rz');
+        if (!cuit || !rz || !cuit.textContent || !rz.textContent) continue;
+        const c = cuit.textContent.trim();
+        const n = rz.textContent.trim();
+        // Filtrar templates HTML (placeholders no reemplazados)
+        if (c.includes('@cuit@') || n.includes('@razonsocial@')) continue;
+        filas.push({cuit: c, razon_social: n});
+    }
+    return {total: rows.length, descartadas: rows.length - filas.length, filas: filas};
+}"""
 
-def _norm(s: str) -> str:
-    """Normaliza texto removiendo acentos y convirtiendo a minúsculas"""
-    if not s:
-        return ""
-    s = unicodedata.normalize("NFKD", s)
-    s = "".join(ch for ch in s if not unicodedata.combining(ch))
-    return " ".join(s.lower().split())
+
+async def esperar_captcha_o_resultados(page, max_wait=60) -> Tuple[Optional[str], float]:
+    """
+    Espera dentro de la página (MutationObserver vía wait_for_function) a que el captcha
+    se oculte o aparezcan resultados, sin sondear desde Python.
+    
+    Returns:
+        (condicion, segundos) donde condicion es "captcha_oculto", "resultados" o None si timeout
+    """
+    inicio = time.monotonic()
+    try:
+        handle = await page.wait_for_function(
+            _JS_CAPTCHA_O_RESULTADOS, polling="mutation", timeout=max_wait * 1000
+        )
+        condicion = await handle.json_value()
+    except PlaywrightTimeoutError:
+        condicion = None
+    except Exception as e:
+        log.debug("Error esperando el captcha: %s: %s", type(e).__name__, e)
+        condicion = None
+    return condicion, time.monotonic() - inicio
 
 
 async def wait_for_captcha_solve(page, max_wait=60) -> bool:
@@ -44,196 +126,569 @@ async def wait_for_captcha_solve(page, max_wait=60) -> bool:
     Returns:
         True si se resolvió, False si timeout
     """
-    print(f"🤖 Esperando a que Buster resuelva el captcha (máx {max_wait}s)...")
+    log.info("Esperando a que Buster resuelva el captcha (máx %ss)...", max_wait)
+    
+    condicion, segundos = await esperar_captcha_o_resultados(page, max_wait)
+    
+    if condicion == "captcha_oculto":
+        log.info("Captcha resuelto por Buster en %.1f segundos!", segundos)
+        return True
+    if condicion == "resultados":
+        log.info("Resultados aparecieron - captcha resuelto en %.1f segundos!", segundos)
+        return True
+    
+    log.warning("Timeout esperando resolución del captcha (%.1fs)", segundos)
+    return False
+
+
+def _browser_args() -> list:
+    """Argumentos de Chromium, incluyendo la extensión Buster si está disponible"""
+    args = list(BROWSER_ARGS)
+    
+    # Si existe la extensión Buster, cargarla
+    if os.path.exists(BUSTER_EXTENSION_PATH):
+        log.debug("Cargando extensión Buster desde %s", BUSTER_EXTENSION_PATH)
+        args.append(f'--disable-extensions-except={BUSTER_EXTENSION_PATH}')
+        args.append(f'--load-extension={BUSTER_EXTENSION_PATH}')
+    else:
+        log.warning("Extensión Buster no encontrada en %s", BUSTER_EXTENSION_PATH)
+        log.warning("Los captchas no podrán resolverse automáticamente")
+    
+    return args
+
+
+class ContextoNosis:
+    """Contexto persistente de Chromium con una página ya posicionada en NOSIS_URL"""
+    
+    def __init__(self, context, page, user_data_dir: str):
+        self.context = context
+        self.page = page
+        self.user_data_dir = user_data_dir
+        self.usos = 0
+        self.ultimo_uso = time.monotonic()
+        self.sano = True
+        self.version_sesion = 0  # Versión de AlmacenSesion sembrada en este contexto
+    
+    def descartar(self):
+        """Marca el contexto para que el pool lo cierre en lugar de reutilizarlo"""
+        self.sano = False
+    
+    async def cerrar(self):
+        try:
+            await self.context.close()
+        except Exception as close_error:
+            log.warning("Error cerrando contexto: %s", close_error)
+        
+        # Limpiar directorio temporal del perfil
+        shutil.rmtree(self.user_data_dir, ignore_errors=True)
+
+
+class PoolNavegadores:
+    """
+    Pool acotado de contextos persistentes de Chromium para nosis_lookup.
     
-    for i in range(max_wait):
-        await asyncio.sleep(1)
+    Cada contexto se lanza una sola vez (con Buster cargado y la página en NOSIS_URL)
+    y se presta a las búsquedas. Al devolverlo se restablece la página en segundo plano,
+    se recicla tras `max_usos` búsquedas y se cierra si queda ocioso más de `max_inactivo`.
+    """
+    
+    def __init__(self, tamano: int = POOL_TAMANO, minimo: int = POOL_MINIMO,
+                 max_usos: int = POOL_MAX_USOS, max_inactivo: float = POOL_MAX_INACTIVO):
+        self.tamano = max(1, tamano)
+        self.minimo = max(0, min(minimo, self.tamano))
+        self.max_usos = max_usos
+        self.max_inactivo = max_inactivo
+        self._playwright = None
+        self._libres = []  # Pila LIFO: los menos usados quedan abajo y son los que se desalojan
+        self._semaforo = asyncio.Semaphore(self.tamano)
+        self._lock_inicio = asyncio.Lock()
+        self._tarea_limpieza = None
+        self._tareas_reset = set()
+        self._en_uso = 0
+        self._cerrado = False
+    
+    async def iniciar(self, precalentar: Optional[int] = None):
+        """Arranca Playwright y pre-lanza `precalentar` contextos (por defecto `minimo`)"""
+        async with self._lock_inicio:
+            if self._playwright is None:
+                self._playwright = await async_playwright().start()
+                self._cerrado = False
+            if self._tarea_limpieza is None and self.max_inactivo > 0:
+                self._tarea_limpieza = asyncio.create_task(self._limpiar_inactivos())
         
-        # Verificar si el captcha desapareció (se resolvió)
-        captcha_container = await page.query_selector('#contenedorCaptcha')
-        if captcha_container:
-            is_hidden = await page.evaluate('(element) => element.style.display === "none"', captcha_container)
-            if is_hidden:
-                print(f"✅ Captcha resuelto por Buster en {i+1} segundos!")
-                return True
+        objetivo = self.minimo if precalentar is None else min(precalentar, self.tamano)
+        while len(self._libres) < objetivo:
+            self._libres.append(await self._crear())
+    
+    async def cerrar(self):
+        """Cierra todos los contextos libres y detiene Playwright"""
+        self._cerrado = True
+        if self._tarea_limpieza:
+            self._tarea_limpieza.cancel()
+            self._tarea_limpieza = None
+        if self._tareas_reset:
+            await asyncio.gather(*self._tareas_reset, return_exceptions=True)
+        while self._libres:
+            await self._libres.pop().cerrar()
+        if self._playwright:
+            await self._playwright.stop()
+            self._playwright = None
+    
+    @asynccontextmanager
+    async def adquirir(self):
+        """Presta un ContextoNosis; se devuelve al pool al salir del bloque"""
+        await self._semaforo.acquire()
+        entrada = None
+        try:
+            entrada = await self._tomar()
+            self._en_uso += 1
+            yield entrada
+        except BaseException:
+            if entrada is not None:
+                entrada.descartar()
+            raise
+        finally:
+            if entrada is None:
+                self._semaforo.release()
+            else:
+                self._devolver(entrada)
+    
+    def estado(self) -> dict:
+        return {
+            "tamano": self.tamano,
+            "libres": len(self._libres),
+            "en_uso": self._en_uso,
+            "reseteando": len(self._tareas_reset),
+        }
+    
+    async def _crear(self) -> ContextoNosis:
+        if self._playwright is None:
+            await self.iniciar(precalentar=0)
         
-        # También verificar si aparecieron resultados
-        results = await page.query_selector('div.result.row')
-        if results:
-            print(f"✅ Resultados aparecieron - captcha resuelto en {i+1} segundos!")
+        log.debug("Iniciando navegador con contexto persistente...")
+        user_data_dir = tempfile.mkdtemp(prefix='playwright_')
+        context = None
+        try:
+            # Usar launch_persistent_context que soporta extensiones en headless
+            with tramo("nosis.lanzar_navegador"):
+                context = await self._playwright.chromium.launch_persistent_context(
+                    user_data_dir,
+                    headless=True,  # Ahora funciona con extensiones
+                    args=_browser_args(),
+                    timeout=30000  # 30 segundos timeout
+                )
+            
+            page = await context.new_page()
+            
+            # BLOQUEO DE RECURSOS PARA AHORRAR MEMORIA Y ANCHO DE BANDA
+            await page.route("**/*", lambda route: (
+                route.abort() if route.request.resource_type in ["image", "stylesheet", "font", "media"]
+                else route.continue_()
+            ))
+            
+            log.debug("Navegando a %s", NOSIS_URL)
+            with tramo("nosis.goto"):
+                await page.goto(NOSIS_URL, timeout=60000)
+        except BaseException:
+            if context:
+                try:
+                    await context.close()
+                except Exception:
+                    pass
+            shutil.rmtree(user_data_dir, ignore_errors=True)
+            raise
+        
+        return ContextoNosis(context, page, user_data_dir)
+    
+    async def _saludable(self, entrada: ContextoNosis) -> bool:
+        """Health check: la página sigue abierta y responde a una evaluación trivial"""
+        if not entrada.sano or entrada.page.is_closed():
+            return False
+        try:
+            await asyncio.wait_for(entrada.page.evaluate("1"), timeout=5)
             return True
+        except Exception:
+            return False
+    
+    async def _tomar(self) -> ContextoNosis:
+        while self._libres:
+            entrada = self._libres.pop()
+            if await self._saludable(entrada):
+                return entrada
+            log.debug("Contexto del pool no responde - descartado")
+            await entrada.cerrar()
+        return await self._crear()
+    
+    def _devolver(self, entrada: ContextoNosis):
+        self._en_uso -= 1
+        entrada.usos += 1
+        entrada.ultimo_uso = time.monotonic()
+        # El reseteo de la página corre en segundo plano para no demorar la respuesta
+        tarea = asyncio.create_task(self._restablecer(entrada))
+        self._tareas_reset.add(tarea)
+        tarea.add_done_callback(self._tareas_reset.discard)
+    
+    async def _restablecer(self, entrada: ContextoNosis):
+        try:
+            if self._cerrado or not entrada.sano or entrada.usos >= self.max_usos:
+                if entrada.usos >= self.max_usos:
+                    log.debug("Reciclando contexto tras %s usos", entrada.usos)
+                await entrada.cerrar()
+                return
+            try:
+                with tramo("nosis.goto", reinicio=True):
+                    await entrada.page.goto(NOSIS_URL, timeout=60000)
+            except Exception as reset_error:
+                log.debug("No se pudo restablecer la página (%s) - descartando contexto", reset_error)
+                await entrada.cerrar()
+                return
+            self._libres.append(entrada)
+        finally:
+            self._semaforo.release()
+    
+    async def _limpiar_inactivos(self):
+        """Cierra contextos libres ociosos por más de max_inactivo, conservando `minimo`"""
+        intervalo = max(1.0, min(30.0, self.max_inactivo / 2))
+        while True:
+            await asyncio.sleep(intervalo)
+            limite = time.monotonic() - self.max_inactivo
+            # Los más antiguos están al fondo de la pila
+            while len(self._libres) > self.minimo and self._libres[0].ultimo_uso < limite:
+                entrada = self._libres.pop(0)
+                log.debug("Cerrando contexto inactivo (%s usos)", entrada.usos)
+                await entrada.cerrar()
+
+
+_pool: Optional[PoolNavegadores] = None
+
+
+def obtener_pool() -> PoolNavegadores:
+    """Pool compartido del proceso (se crea perezosamente)"""
+    global _pool
+    if _pool is None:
+        _pool = PoolNavegadores()
+    return _pool
+
+
+async def iniciar_pool(precalentar: Optional[int] = None):
+    """Hook de arranque para la API: pre-lanza los contextos del pool"""
+    await obtener_pool().iniciar(precalentar)
+
+
+async def cerrar_pool():
+    """Hook de apagado para la API: cierra navegadores y limpia perfiles temporales"""
+    global _pool, _planificador
+    if _planificador is not None:
+        await _planificador.cerrar()
+        _planificador = None
+    if _pool is not None:
+        await _pool.cerrar()
+        _pool = None
+
+
+class AlmacenSesion:
+    """
+    Sesión (cookies + localStorage) de un contexto que ya pasó el captcha de Nosis.
+    
+    Se persiste en disco para sobrevivir reinicios y se siembra en los contextos del pool,
+    de modo que las búsquedas nuevas normalmente no vean el captcha. Cada sesión guardada
+    incrementa `version`; un contexto sembrado con una versión que igual muestra captcha
+    la invalida.
+    """
+    
+    def __init__(self, ruta: str = SESION_PATH, ttl: float = SESION_TTL):
+        self.ruta = ruta
+        self.ttl = ttl
+        self.estado = None  # storage_state de Playwright
+        self.guardado = None  # time.time() del momento en que se resolvió el captcha
+        self.version = 0
+        self.invalidaciones = 0
+        self.lock = asyncio.Lock()  # Un solo worker resuelve captcha a la vez
+        self._cargar()
+    
+    def _cargar(self):
+        try:
+            with open(self.ruta, "r", encoding="utf-8") as f:
+                datos = json.load(f)
+            self.estado = datos["estado"]
+            self.guardado = float(datos["guardado"])
+            self.version = 1
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            log.warning("Sesión de Nosis guardada ilegible (%s) - se ignora", e)
+    
+    def edad(self) -> Optional[float]:
+        """Segundos desde que se guardó la sesión (None si no hay)"""
+        if self.guardado is None:
+            return None
+        return time.time() - self.guardado
+    
+    def _cookies_vigentes(self) -> list:
+        ahora = time.time()
+        return [
+            c for c in (self.estado or {}).get("cookies", [])
+            if c.get("expires", -1) in (-1, None) or c["expires"] > ahora
+        ]
+    
+    def vigente(self) -> bool:
+        if not self.estado:
+            return False
+        if self.edad() > self.ttl:
+            return False
+        return bool(self._cookies_vigentes())
+    
+    async def sembrar(self, entrada: "ContextoNosis") -> bool:
+        """Aplica la sesión al contexto si es más nueva que la que ya tiene; recarga la página"""
+        if entrada.version_sesion == self.version or not self.vigente():
+            return False
+        
+        await entrada.context.add_cookies(self._cookies_vigentes())
         
-        if (i + 1) % 5 == 0:
-            print(f"   Esperando... {i+1}s transcurridos")
+        origen = await entrada.page.evaluate("location.origin")
+        for o in self.estado.get("origins", []):
+            if o.get("origin") == origen and o.get("localStorage"):
+                await entrada.page.evaluate(
+                    "items => items.forEach(i => localStorage.setItem(i.name, i.value))",
+                    o["localStorage"]
+                )
+        
+        entrada.version_sesion = self.version
+        await entrada.page.reload(timeout=60000)
+        return True
     
-    print(f"❌ Timeout esperando resolución del captcha")
-    return False
+    async def guardar(self, entrada: "ContextoNosis"):
+        """Guarda la sesión del contexto que acaba de pasar el captcha"""
+        try:
+            self.estado = await entrada.context.storage_state()
+        except Exception as e:
+            log.warning("No se pudo leer la sesión del contexto: %s", e)
+            return
+        
+        self.guardado = time.time()
+        self.version += 1
+        entrada.version_sesion = self.version
+        
+        try:
+            tmp = f"{self.ruta}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"guardado": self.guardado, "estado": self.estado}, f)
+            os.replace(tmp, self.ruta)
+        except Exception as e:
+            log.warning("No se pudo persistir la sesión de Nosis: %s", e)
+        
+        log.debug("Sesión v%s guardada (%s cookies)", self.version, len(self._cookies_vigentes()))
+    
+    def invalidar(self, version: int):
+        """Descarta la sesión si sigue siendo la versión que provocó el captcha"""
+        if not self.estado or version != self.version:
+            return
+        log.debug("Sesión v%s vencida (edad %.0fs) - se re-resolverá el captcha", version, self.edad())
+        self.estado = None
+        self.guardado = None
+        self.invalidaciones += 1
+        try:
+            os.remove(self.ruta)
+        except OSError:
+            pass
+    
+    def info(self) -> dict:
+        return {
+            "version": self.version,
+            "vigente": self.vigente(),
+            "edad": self.edad(),
+            "invalidaciones": self.invalidaciones,
+        }
+
+
+_almacen_sesion: Optional[AlmacenSesion] = None
+
 
+def obtener_almacen_sesion() -> AlmacenSesion:
+    """Almacén de sesión compartido del proceso (se crea perezosamente)"""
+    global _almacen_sesion
+    if _almacen_sesion is None:
+        _almacen_sesion = AlmacenSesion()
+    return _almacen_sesion
 
-async def nosis_lookup(dni: str, nombre_filtro: str = None) -> Tuple[Optional[str], Optional[str]]:
-    print(f"\n{'='*60}")
-    print(f"DEBUG NOSIS_LOOKUP - Inicio")
-    print(f"  DNI recibido: '{dni}'")
-    print(f"  Nombre filtro recibido: '{nombre_filtro}'")
-    print(f"{'='*60}")
+
+async def _captcha_visible(page) -> bool:
+    """True si el contenedor del captcha está visible o hay un reCAPTCHA en la página"""
+    return await page.evaluate(_JS_CAPTCHA_VISIBLE)
+
+
+async def _resolver_captcha(entrada: ContextoNosis) -> bool:
+    """
+    Resuelve el captcha de una sola búsqueda a la vez.
     
-    # Inicializar variables para el finally block
-    context = None
-    user_data_dir = None
+    Si mientras esperaba el turno otro worker ya lo resolvió, reutiliza su sesión en vez
+    de resolver de nuevo. Si la sesión con la que se sembró el contexto provocó captcha,
+    se invalida. Al resolver, se guarda la nueva sesión para el resto de las búsquedas.
+    """
+    almacen = obtener_almacen_sesion()
+    version = entrada.version_sesion
+    contar("captcha_total", evento="visto")
+    
+    async with almacen.lock:
+        if almacen.version != version and almacen.vigente():
+            log.debug("Otro worker resolvió el captcha - reutilizando sesión v%s", almacen.version)
+            await almacen.sembrar(entrada)
+            if not await _captcha_visible(entrada.page):
+                contar("captcha_total", evento="reutilizado")
+                return True
+        
+        # La sesión sembrada ya no alcanza para evitar el captcha
+        almacen.invalidar(entrada.version_sesion)
+        
+        if not os.path.exists(BUSTER_EXTENSION_PATH):
+            log.debug("Extensión Buster no encontrada")
+            log.debug("Instala Buster en: %s", BUSTER_EXTENSION_PATH)
+            contar("captcha_total", evento="fallido")
+            return False
+        
+        # Si tenemos Buster, solo esperar a que lo resuelva
+        with tramo("nosis.captcha") as span:
+            solved = await wait_for_captcha_solve(entrada.page, max_wait=60)
+            span.atributos["resuelto"] = solved
+        contar("captcha_total", evento="resuelto" if solved else "fallido")
+        if solved:
+            await almacen.guardar(entrada)
+        return solved
+
+
+def _desde_cache(dni: str, nombre_filtro: str = None):
+    """
+    Resultado de Nosis desde la cache de identidades (None si no sirve).
+    
+    Solo se usan entradas guardadas por Nosis sin filtro: las otras fuentes devuelven una
+    sola persona y acá se muestran todas las que comparten el DNI.
+    """
+    cache = obtener_cache()
+    if cache is None or nombre_filtro:
+        return None
+    hit = cache.buscar(dni, fuentes=("nosis",))
+    if hit:
+        # La cache guarda el CUIL sin guiones; Nosis lo muestra como 20-12345678-9
+        return Resultado(OK, [Candidato(formatear_cuil(hit["cuil"]), hit["nombre"])], fuente="nosis", desde_cache=True)
+    if cache.es_negativo(dni, "nosis"):
+        return Resultado(NO_ENCONTRADO, fuente="nosis", desde_cache=True)
+    return None
+
+
+@memo_async(
+    clave=lambda a: clave_busqueda(a["dni"], a["nombre_filtro"], separadores=""),  # Nosis no acepta guiones
+    cachear=lambda r: r.estado not in (ERROR, NO_ENCONTRADO),  # Nosis no distingue "no existe" de un fallo
+    bypass="usar_cache",
+)
+async def nosis_buscar(dni: str, nombre_filtro: str = None, usar_cache: bool = True) -> Resultado:
+    """Busca en Nosis.com por DNI/CUIL; todas las personas que comparten el DNI van como candidatos"""
+    with contexto_consulta(), tramo("nosis.buscar") as span:
+        inicio = time.monotonic()
+        resultado = await _buscar(dni, nombre_filtro, usar_cache)
+        resultado.fuente = "nosis"
+        resultado.segundos = time.monotonic() - inicio
+        span.atributos.update(resultado=resultado.estado, desde_cache=resultado.desde_cache)
+        contar("resultados_total", fuente="nosis", estado=resultado.estado)
+        log.debug("Nosis %s -> %s (%.2fs)", dni, resultado.estado, resultado.segundos)
+    return resultado
+
+
+async def _buscar(dni: str, nombre_filtro: str, usar_cache: bool) -> Resultado:
+    log.debug("Búsqueda Nosis - DNI recibido: '%s', filtro: '%s'", dni, nombre_filtro)
     
     dni = (dni or '').strip()
-    print(f"DEBUG: DNI después de strip: '{dni}'")
+    log.debug("DNI después de strip: '%s'", dni)
     
     # Validar entrada
     if not dni.isdigit():
-        print(f"DEBUG: DNI inválido - no es numérico")
-        print(f"{'='*60}\n")
-        return None, None
+        log.debug("DNI inválido - no es numérico")
+        return error("DNI inválido")
     
     # Detectar si es CUIL de 11 dígitos o DNI de 7-9
     es_cuil = len(dni) == 11
     es_dni = 7 <= len(dni) <= 9
     
     if not (es_dni or es_cuil):
-        print(f"DEBUG: Longitud inválida - debe ser DNI (7-9) o CUIL (11 dígitos)")
-        print(f"{'='*60}\n")
-        return None, None
+        log.debug("Longitud inválida - debe ser DNI (7-9) o CUIL (11 dígitos)")
+        return error("Longitud inválida")
     
     # Si es CUIL, extraer DNI para la búsqueda
     dni_busqueda = dni
     if es_cuil:
         dni_busqueda = dni[2:10]  # Quitar primeros 2 dígitos y último dígito
-        print(f"DEBUG: CUIL detectado, extrayendo DNI para búsqueda: {dni_busqueda}")
+        log.debug("CUIL detectado, extrayendo DNI para búsqueda: %s", dni_busqueda)
+    
+    if usar_cache:
+        en_cache = _desde_cache(dni, nombre_filtro)
+        if en_cache:
+            log.debug("Resultado desde cache de identidades: %s", en_cache)
+            return en_cache
     
     # Normalizar nombre de filtro si existe
     nombre_filtro_norm = None
     if nombre_filtro:
-        print(f"DEBUG: Nombre filtro normalizado: '{nombre_filtro_norm}'")
+        nombre_filtro_norm = _norm(nombre_filtro.strip())
+        log.debug("Nombre filtro normalizado: '%s'", nombre_filtro_norm)
     else:
-        print(f"DEBUG: No hay filtro de nombre")
-    
-    # Crear directorio temporal para el perfil de usuario (debe estar antes del async with)
-    import tempfile
-    user_data_dir = tempfile.mkdtemp(prefix='playwright_')
+        log.debug("No hay filtro de nombre")
     
-    async with async_playwright() as p:
-        print(f"DEBUG: Iniciando navegador con contexto persistente...")
-        
-        # Configurar opciones del navegador con optimizaciones
-        browser_args = [
-            '--disable-blink-features=AutomationControlled',
-            '--disable-dev-shm-usage',
-            '--no-sandbox',
-            '--disable-gpu',
-            # NUEVOS ARGS OPTIMIZADOS PARA HEADLESS:
-            '--single-process',  # Reduce memoria en headless
-            '--disable-background-timer-throttling',  # Performance
-            '--disable-backgrounding-occluded-windows',  # Performance
-            '--disable-renderer-backgrounding',  # Performance
-            '--disable-ipc-flooding-protection',  # Speed
-            '--password-store=basic',  # Menos overhead
-            '--use-mock-keychain',  # Menos overhead
-        ]
-        
-        # Si existe la extensión Buster, cargarla
-        if os.path.exists(BUSTER_EXTENSION_PATH):
-            print(f"DEBUG: Cargando extensión Buster desde {BUSTER_EXTENSION_PATH}")
-            browser_args.append(f'--disable-extensions-except={BUSTER_EXTENSION_PATH}')
-            browser_args.append(f'--load-extension={BUSTER_EXTENSION_PATH}')
-        else:
-            print(f"⚠️ ADVERTENCIA: Extensión Buster no encontrada en {BUSTER_EXTENSION_PATH}")
-            print(f"⚠️ Los captchas no podrán resolverse automáticamente")
-        
-        # Usar launch_persistent_context que soporta extensiones en headless
-        context = await p.chromium.launch_persistent_context(
-            user_data_dir,
-            headless=True,  # Ahora funciona con extensiones
-            args=browser_args,
-            timeout=30000  # 30 segundos timeout
-        )
-        
-        page = await context.new_page()
-        
-        # BLOQUEO DE RECURSOS PARA AHORRAR MEMORIA Y ANCHO DE BANDA
-        await page.route("**/*", lambda route: (
-            route.abort() if route.request.resource_type in ["image", "stylesheet", "font", "media"]
-            else route.continue_()
-        ))
+    async with obtener_pool().adquirir() as entrada:
+        page = entrada.page
         
         try:
-            print(f"DEBUG: Navegando a {NOSIS_URL}")
-            await page.goto(NOSIS_URL, timeout=60000)
+            log.debug("Usando contexto del pool (usos previos: %s)", entrada.usos)
             
-            # Verificar si hay CAPTCHA inmediatamente visible
-            captcha_container = await page.query_selector('#contenedorCaptcha')
-            recaptcha_div = await page.query_selector('div.g-recaptcha')
+            # Sembrar cookies de una sesión que ya pasó el captcha (si hay una más nueva)
+            if await obtener_almacen_sesion().sembrar(entrada):
+                log.debug("Contexto sembrado con sesión v%s", entrada.version_sesion)
             
-            captcha_visible = False
-            if captcha_container:
-                is_visible = await page.evaluate('(element) => element.style.display !== "none"', captcha_container)
-                captcha_visible = is_visible
-            
-            if captcha_visible or recaptcha_div:
-                print(f"DEBUG: ⚠️ CAPTCHA DETECTADO en página inicial")
+            # Verificar si hay CAPTCHA inmediatamente visible
+            if await _captcha_visible(page):
+                log.warning("CAPTCHA DETECTADO en página inicial")
                 
-                # Si tenemos Buster, solo esperar a que lo resuelva
-                if os.path.exists(BUSTER_EXTENSION_PATH):
-                    solved = await wait_for_captcha_solve(page, max_wait=60)
-                    if not solved:
-                        print(f"DEBUG: Buster no pudo resolver el captcha - Abortando")
-                        print(f"{'='*60}\n")
-                        await context.close()
-                        return (None, None)
-                else:
-                    print(f"DEBUG: Extensión Buster no encontrada - Abortando")
-                    print(f"DEBUG: Instala Buster en: {BUSTER_EXTENSION_PATH}")
-                    print(f"{'='*60}\n")
-                    await context.close()
-                    return (None, None)
-            
-            print(f"DEBUG: Esperando que el campo de búsqueda esté visible...")
-            await page.wait_for_selector("#Busqueda_Texto", timeout=10000)
+                solved = await _resolver_captcha(entrada)
+                if not solved:
+                    log.warning("No se pudo resolver el captcha - Abortando")
+                    entrada.descartar()
+                    return error("No se pudo resolver el captcha")
             
-            print(f"DEBUG: Llenando campo de búsqueda con DNI: {dni_busqueda}")
-            await page.fill("#Busqueda_Texto", dni_busqueda)
-            await page.press("#Busqueda_Texto", "Enter")
+            log.debug("Esperando que el campo de búsqueda esté visible...")
+            with tramo("nosis.formulario"):
+                await page.wait_for_selector("#Busqueda_Texto", timeout=10000)
+                
+                log.debug("Llenando campo de búsqueda con DNI: %s", dni_busqueda)
+                await page.fill("#Busqueda_Texto", dni_busqueda)
+                await page.press("#Busqueda_Texto", "Enter")
             
-            print(f"DEBUG: Esperando resultados (div.result.row)...")
+            log.debug("Esperando resultados (div.result.row)...")
             try:
-                await page.wait_for_selector("div.result.row", timeout=30000)
+                with tramo("nosis.esperar_resultados"):
+                    await page.wait_for_selector("div.result.row", timeout=30000)
             except Exception as wait_error:
-                print(f"DEBUG: ⚠️ Timeout esperando resultados")
+                log.warning("Timeout esperando resultados")
                 
                 # Verificar si apareció captcha después del submit
-                captcha_container = await page.query_selector('#contenedorCaptcha')
-                recaptcha_div = await page.query_selector('div.g-recaptcha')
-                
-                captcha_visible = False
-                if captcha_container:
-                    is_visible = await page.evaluate('(element) => element.style.display !== "none"', captcha_container)
-                    captcha_visible = is_visible
-                
-                if captcha_visible or recaptcha_div:
-                    print(f"DEBUG: ⚠️ CAPTCHA apareció después del submit")
+                if await _captcha_visible(page):
+                    log.warning("CAPTCHA apareció después del submit")
                     
-                    # Si tenemos Buster, esperar a que lo resuelva
-                    if os.path.exists(BUSTER_EXTENSION_PATH):
-                        solved = await wait_for_captcha_solve(page, max_wait=60)
-                        if solved:
-                            print(f"DEBUG: ✓ Captcha resuelto por Buster")
-                        else:
-                            print(f"DEBUG: Buster no pudo resolver el captcha")
-                            raise wait_error
+                    solved = await _resolver_captcha(entrada)
+                    if solved:
+                        log.debug("Captcha resuelto")
+                        # Si la sesión vino de otro worker la página se recargó: repetir la búsqueda
+                        if not await page.query_selector("div.result.row"):
+                            await page.fill("#Busqueda_Texto", dni_busqueda)
+                            await page.press("#Busqueda_Texto", "Enter")
+                            await page.wait_for_selector("div.result.row", timeout=30000)
                     else:
-                        print(f"DEBUG: Extensión Buster no encontrada")
+                        log.debug("No se pudo resolver el captcha")
                         raise wait_error
                 else:
                     # No es captcha, es otro error
-                    print(f"DEBUG: Guardando screenshot y HTML para análisis...")
+                    log.debug("Guardando screenshot y HTML para análisis...")
                     
                     try:
                         await page.screenshot(path="nosis_error.png", full_page=True)
-                        print(f"DEBUG: Screenshot guardado en nosis_error.png")
+                        log.debug("Screenshot guardado en nosis_error.png")
                     except:
                         pass
                     
@@ -241,167 +696,259 @@ async def nosis_lookup(dni: str, nombre_filtro: str = None) -> Tuple[Optional[st
                         html_content = await page.content()
                         with open("nosis_error.html", "w", encoding="utf-8") as f:
                             f.write(html_content)
-                        print(f"DEBUG: HTML guardado en nosis_error.html")
+                        log.debug("HTML guardado en nosis_error.html")
                     except:
                         pass
                     
                     raise wait_error
             
-            # Obtener todos los divs de resultados
-            result_divs = await page.query_selector_all("div.result.row")
+            # Extraer todas las filas en un solo round-trip (incluye descarte de templates)
+            with tramo("nosis.extraer") as span:
+                extraccion = await page.eval_on_selector_all("div.result.row", _JS_EXTRAER_RESULTADOS)
+                span.atributos["filas"] = extraccion["total"]
             
-            print(f"DEBUG: Encontrados {len(result_divs)} divs de resultados")
+            log.debug("Encontrados %s divs de resultados", extraccion['total'])
             
-            if not result_divs:
-                print(f"DEBUG: No se encontraron resultados - retornando None")
-                print(f"{'='*60}\n")
-                return (None, None)
+            if extraccion["descartadas"]:
+                log.debug("Descartadas %s filas (sin .cuit/.rz, vacías o templates)", extraccion['descartadas'])
             
-            # Procesar todos los resultados
-            todos_cuils = []
-            todos_nombres = []
+            # wait_for_selector garantiza al menos una fila: sin filas válidas (solo templates
+            # o vacías) Nosis respondió la búsqueda sin resultados
+            if not extraccion["filas"]:
+                cache = obtener_cache()
+                if cache is not None:
+                    cache.guardar_negativo(dni, "nosis")
+                log.debug("No hay resultados válidos después de procesar")
+                return Resultado(NO_ENCONTRADO, consulta=dni)
             
-            print(f"DEBUG: Procesando todos los resultados...")
-            for i, result_div in enumerate(result_divs):
-                # Buscar CUIL dentro del div (puede estar en span.cuit o similar)
-                cuil_element = await result_div.query_selector(".cuit")
-                nombre_element = await result_div.query_selector(".rz")
-                
-                if cuil_element and nombre_element:
-                    cuil_text = await cuil_element.text_content()
-                    nombre_text = await nombre_element.text_content()
-                    
-                    print(f"DEBUG: Resultado {i+1}:")
-                    print(f"  CUIL raw: '{cuil_text}'")
-                    print(f"  Nombre raw: '{nombre_text}'")
-                    
-                    if cuil_text and nombre_text:
-                        cuil_clean = cuil_text.strip()
-                        nombre_clean = nombre_text.strip()
-                        
-                        # Filtrar templates HTML (placeholders no reemplazados)
-                        if '@cuit@' in cuil_clean or '@razonsocial@' in nombre_clean:
-                            print(f"  ✗ Descartado - es un template HTML, no datos reales")
-                            continue
-                        
-                        todos_cuils.append(cuil_clean)
-                        todos_nombres.append(nombre_clean)
-                        print(f"  ✓ Agregado - CUIL: '{cuil_clean}', Nombre: '{nombre_clean}'")
-                    else:
-                        print(f"  ✗ Descartado - texto vacío")
-                else:
-                    print(f"DEBUG: Resultado {i+1}: No se encontraron elementos .cuit o .rz dentro del div")
+            # Procesar todos los resultados
+            candidatos = [Candidato(fila["cuit"], fila["razon_social"]) for fila in extraccion["filas"]]
             
-            print(f"DEBUG: Total procesados: {len(todos_cuils)} resultados")
+            if log.isEnabledFor(logging.DEBUG):
+                for i, c in enumerate(candidatos):
+                    log.debug("Resultado %s - CUIL: '%s', Nombre: '%s'", i + 1, c.cuil, c.nombre)
             
-            if not todos_cuils or not todos_nombres:
-                print(f"DEBUG: No hay resultados válidos después de procesar")
-                print(f"{'='*60}\n")
-                return (None, None)
+            log.debug("Total procesados: %s resultados", len(candidatos))
             
             # Si hay filtro de nombre, buscar coincidencias
             if nombre_filtro_norm:
-                print(f"DEBUG: Aplicando filtro de nombre: '{nombre_filtro_norm}'")
-                resultado_cuils = []
-                resultado_nombres = []
+                log.debug("Aplicando filtro de nombre: '%s'", nombre_filtro_norm)
+                # Índice de los homónimos: las coincidencias salen de la más parecida a la menos
+                orden = IndiceCandidatos([c.nombre for c in candidatos]).ordenar(nombre_filtro_norm)
+                coincidencias = [candidatos[i] for i in orden]
+                log.debug("Coincidencias con filtro: %s", len(coincidencias))
                 
-                for i in range(len(todos_cuils)):
-                    nombre_norm = _norm(todos_nombres[i])
-                    print(f"DEBUG: Comparando filtro '{nombre_filtro_norm}' con '{nombre_norm}'")
-                    
-                    if nombre_filtro_norm in nombre_norm:
-                        resultado_cuils.append(todos_cuils[i])
-                        resultado_nombres.append(todos_nombres[i])
-                        print(f"  ✓ COINCIDENCIA encontrada")
-                    else:
-                        print(f"  ✗ No coincide")
-                
-                print(f"DEBUG: Coincidencias con filtro: {len(resultado_cuils)}")
-                
-                # Si no hay coincidencias, mostrar mensaje + todos los resultados
-                if not resultado_cuils:
-                    print(f"DEBUG: Sin coincidencias - generando mensaje con todos los resultados")
-                    mensaje = f"❌ No se encontraron coincidencias con '{nombre_filtro}'\n\n"
-                    mensaje += f"📋 Todos los resultados para DNI {dni}:\n\n"
-                    
-                    for i in range(len(todos_cuils)):
-                        mensaje += f"CUIL {i+1}: {todos_cuils[i]}\n"
-                        mensaje += f"NOMBRE {i+1}: {todos_nombres[i]}"
-                        if i < len(todos_cuils) - 1:
-                            mensaje += "\n\n"
-                    
-                    print(f"DEBUG: Retornando NO_MATCH_SHOWING_ALL")
-                    print(f"{'='*60}\n")
-                    return (mensaje, "NO_MATCH_SHOWING_ALL")
-                
-                # Si hay coincidencias con el filtro
-                num_resultados = len(resultado_cuils)
-                print(f"DEBUG: Generando respuesta con {num_resultados} coincidencia(s)")
-                
-                if num_resultados == 1:
-                    mensaje = f"✅ SE ENCONTRÓ 1 CUIL CON '{nombre_filtro}':\n\n"
-                    mensaje += f"CUIL: {resultado_cuils[0]}\n"
-                    mensaje += f"NOMBRE: {resultado_nombres[0]}"
-                    print(f"DEBUG: Retornando FILTERED_SINGLE")
-                    print(f"{'='*60}\n")
-                    return (mensaje, "FILTERED_SINGLE")
-                
-                mensaje = f"✅ SE ENCONTRARON {num_resultados} CUILS CON '{nombre_filtro}':\n\n"
-                
-                for i in range(num_resultados):
-                    mensaje += f"CUIL {i+1}: {resultado_cuils[i]}\n"
-                    mensaje += f"NOMBRE {i+1}: {resultado_nombres[i]}"
-                    if i < num_resultados - 1:
-                        mensaje += "\n\n"
-                
-                print(f"DEBUG: Retornando FILTERED_MULTIPLE")
-                print(f"{'='*60}\n")
-                return (mensaje, "FILTERED_MULTIPLE")
+                # Si no hay coincidencias, se devuelven todos los resultados
+                if not coincidencias:
+                    return Resultado(NO_MATCH, candidatos, filtro=nombre_filtro, consulta=dni)
+                return Resultado(OK, coincidencias, filtro=nombre_filtro, consulta=dni)
             
             # Sin filtro de nombre - mostrar todos
-            print(f"DEBUG: Sin filtro - mostrando todos los {len(todos_cuils)} resultados")
-            
-            if len(todos_cuils) == 1:
-                print(f"DEBUG: Un solo resultado - retornando tupla simple")
-                print(f"  CUIL: {todos_cuils[0]}")
-                print(f"  Nombre: {todos_nombres[0]}")
-                print(f"{'='*60}\n")
-                return (todos_cuils[0], todos_nombres[0])
-            
-            num_resultados = len(todos_cuils)
-            mensaje = f"SE ENCONTRARON {num_resultados} CUIL{'S' if num_resultados > 1 else ''}:\n\n"
+            log.debug("Sin filtro - mostrando todos los %s resultados", len(candidatos))
             
-            for i in range(num_resultados):
-                mensaje += f"CUIL {i+1}: {todos_cuils[i]}\n"
-                mensaje += f"NOMBRE {i+1}: {todos_nombres[i]}"
-                if i < num_resultados - 1:
-                    mensaje += "\n\n"
+            if len(candidatos) == 1:
+                cache = obtener_cache()
+                if cache is not None:
+                    cache.guardar(candidatos[0].cuil, candidatos[0].nombre, "nosis")
+                return Resultado(OK, candidatos, consulta=dni)
             
-            print(f"DEBUG: Retornando MULTIPLE_RESULTS")
-            print(f"{'='*60}\n")
-            return (mensaje, "MULTIPLE_RESULTS")
+            return Resultado(MULTIPLE, candidatos, consulta=dni)
             
         except Exception as e:
-            print(f"\n{'!'*60}")
-            print(f"ERROR en nosis_lookup: {type(e).__name__}: {e}")
-            import traceback
-            traceback.print_exc()
-            print(f"{'!'*60}\n")
-            return (None, None)
-        finally:
-            if context:
-                print(f"DEBUG: Cerrando contexto y navegador...")
-                try:
-                    await context.close()
-                    print(f"DEBUG: Contexto cerrado exitosamente")
-                except Exception as close_error:
-                    print(f"ERROR cerrando contexto: {close_error}")
+            log.exception("Error en nosis_lookup: %s: %s", type(e).__name__, e)
+            entrada.descartar()
+            return error(f"{type(e).__name__}: {e}")
+
+
+async def nosis_lookup(dni: str, nombre_filtro: str = None,
+                       usar_cache: bool = True) -> Tuple[Optional[str], Optional[str]]:
+    """Igual que nosis_buscar, en el formato que espera el bot"""
+    respuesta = tupla_nosis(await nosis_buscar(dni, nombre_filtro, usar_cache))
+    contar("respuestas_total", fuente="nosis", tipo=tipo_respuesta(respuesta))
+    return respuesta
+
+
+class TokenBucket:
+    """Limitador token-bucket: `tasa` permisos por segundo con ráfagas de hasta `capacidad`"""
+    
+    def __init__(self, tasa: float, capacidad: int):
+        self.tasa = tasa
+        self.capacidad = max(1, capacidad)
+        self._tokens = float(self.capacidad)
+        self._ultimo = time.monotonic()
+        self._lock = asyncio.Lock()  # Los que esperan se atienden en orden de llegada
+    
+    def _recargar(self):
+        ahora = time.monotonic()
+        self._tokens = min(self.capacidad, self._tokens + (ahora - self._ultimo) * self.tasa)
+        self._ultimo = ahora
+    
+    async def adquirir(self):
+        if self.tasa <= 0:
+            return
+        async with self._lock:
+            self._recargar()
+            while self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.tasa)
+                self._recargar()
+            self._tokens -= 1
+
+
+class PlanificadorNosis:
+    """
+    Planificador asíncrono delante de nosis_buscar.
+    
+    Las búsquedas se encolan en orden FIFO y las atienden `concurrencia` workers
+    (por defecto el tamaño del pool de navegadores, así nunca se lanzan Chromium de más).
+    Antes de cada búsqueda se toma un permiso del token-bucket del host destino para no
+    disparar captchas, y cada pedido tiene un deadline que cubre la espera en cola y la búsqueda.
+    """
+    
+    def __init__(self, concurrencia: Optional[int] = None, tasa: float = PLANIFICADOR_TASA,
+                 rafaga: int = PLANIFICADOR_RAFAGA, deadline: float = PLANIFICADOR_DEADLINE):
+        self.concurrencia = concurrencia or obtener_pool().tamano
+        self.tasa = tasa
+        self.rafaga = rafaga
+        self.deadline = deadline
+        self._cola = asyncio.Queue()
+        self._workers = []
+        self._buckets = {}  # host -> TokenBucket
+        self._en_curso = 0
+        self._stats = {
+            "encoladas": 0,
+            "completadas": 0,
+            "vencidas": 0,
+            "errores": 0,
+            "espera_total": 0.0,
+            "espera_max": 0.0,
+            "espera_ultima": 0.0,
+        }
+    
+    def iniciar(self):
+        while len(self._workers) < self.concurrencia:
+            self._workers.append(asyncio.create_task(self._worker()))
+    
+    async def cerrar(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        # Los pedidos en curso los resolvió cada worker al cancelarse; los que quedaron
+        # en cola terminan igual, así nadie espera hasta su deadline
+        while not self._cola.empty():
+            fut = self._cola.get_nowait()[0]
+            self._cola.task_done()
+            if not fut.done():
+                fut.set_result(error("Planificador cerrado", "nosis"))
+    
+    def _bucket(self, url: str) -> TokenBucket:
+        host = urlparse(url).netloc
+        if host not in self._buckets:
+            self._buckets[host] = TokenBucket(self.tasa, self.rafaga)
+        return self._buckets[host]
+    
+    async def buscar(self, dni: str, nombre_filtro: str = None, deadline: Optional[float] = None,
+                     usar_cache: bool = True) -> Resultado:
+        """Encola una búsqueda y espera su resultado; ERROR si vence el deadline"""
+        # Lo que ya está en cache no hace cola
+        if usar_cache:
+            en_cache = _desde_cache((dni or '').strip(), nombre_filtro)
+            if en_cache:
+                return en_cache
+        
+        self.iniciar()
+        
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        encolado = time.monotonic()
+        limite = encolado + (deadline if deadline is not None else self.deadline)
+        
+        self._stats["encoladas"] += 1
+        await self._cola.put((fut, dni, nombre_filtro, limite, encolado, usar_cache))
+        
+        try:
+            return await asyncio.wait_for(asyncio.shield(fut), timeout=max(0, limite - time.monotonic()))
+        except asyncio.TimeoutError:
+            log.debug("Búsqueda Nosis de %s venció su deadline", dni)
+            fut.cancel()
+            return error("Venció el deadline", "nosis")
+    
+    async def _worker(self):
+        while True:
+            fut, dni, nombre_filtro, limite, encolado, usar_cache = await self._cola.get()
+            try:
+                if fut.done():
+                    continue  # El que la pidió ya dejó de esperar
+                
+                espera = time.monotonic() - encolado
+                self._stats["espera_total"] += espera
+                self._stats["espera_max"] = max(self._stats["espera_max"], espera)
+                self._stats["espera_ultima"] = espera
                 
-                # Limpiar directorio temporal
+                self._en_curso += 1
                 try:
-                    import shutil
-                    shutil.rmtree(user_data_dir, ignore_errors=True)
-                except:
-                    pass
-            else:
-                print(f"DEBUG: No hay contexto para cerrar")
+                    restante = limite - time.monotonic()
+                    if restante <= 0:
+                        raise asyncio.TimeoutError()
+                    resultado = await asyncio.wait_for(self._ejecutar(dni, nombre_filtro, usar_cache), timeout=restante)
+                finally:
+                    self._en_curso -= 1
+                
+                self._stats["completadas"] += 1
+                if not fut.done():
+                    fut.set_result(resultado)
+            except asyncio.TimeoutError:
+                self._stats["vencidas"] += 1
+                if not fut.done():
+                    fut.set_result(error("Venció el deadline", "nosis"))
+            except asyncio.CancelledError:
+                # cerrar() canceló al worker con este pedido ya sacado de la cola
+                if not fut.done():
+                    fut.set_result(error("Planificador cerrado", "nosis"))
+                raise
+            except Exception as e:
+                self._stats["errores"] += 1
+                if not fut.done():
+                    fut.set_exception(e)
+            finally:
+                self._cola.task_done()
+    
+    async def _ejecutar(self, dni: str, nombre_filtro: str, usar_cache: bool = True):
+        await self._bucket(NOSIS_URL).adquirir()
+        return await nosis_buscar(dni, nombre_filtro, usar_cache)
+    
+    def metricas(self) -> dict:
+        atendidas = self._stats["completadas"] + self._stats["vencidas"] + self._stats["errores"]
+        return {
+            "profundidad_cola": self._cola.qsize(),
+            "en_curso": self._en_curso,
+            "concurrencia": self.concurrencia,
+            **self._stats,
+            "espera_promedio": self._stats["espera_total"] / atendidas if atendidas else 0.0,
+        }
+
+
+_planificador: Optional[PlanificadorNosis] = None
+
+
+def obtener_planificador() -> PlanificadorNosis:
+    """Planificador compartido del proceso (se crea perezosamente)"""
+    global _planificador
+    if _planificador is None:
+        _planificador = PlanificadorNosis()
+    return _planificador
+
+
+async def nosis_buscar_planificado(dni: str, nombre_filtro: str = None, deadline: Optional[float] = None,
+                                   usar_cache: bool = True) -> Resultado:
+    """Igual que nosis_buscar pero pasando por el planificador (concurrencia, rate limit y deadline)"""
+    with contexto_consulta():
+        return await obtener_planificador().buscar(dni, nombre_filtro, deadline, usar_cache)
+
+
+async def nosis_lookup_planificado(dni: str, nombre_filtro: str = None, deadline: Optional[float] = None,
+                                   usar_cache: bool = True) -> Tuple[Optional[str], Optional[str]]:
+    """Igual que nosis_lookup pero pasando por el planificador (concurrencia, rate limit y deadline)"""
+    respuesta = tupla_nosis(await nosis_buscar_planificado(dni, nombre_filtro, deadline, usar_cache))
+    contar("respuestas_total", fuente="nosis", tipo=tipo_respuesta(respuesta))
+    return respuesta
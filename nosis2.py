@@ -1,8 +1,28 @@
 # -*- coding: utf-8 -*-
 import httpx
-from bs4 import BeautifulSoup
-import re
-import unicodedata
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+from functools import partial
+from urllib.parse import urlparse
+from nosis2_parsers import obtener_parser
+from cache_identidad import obtener_cache
+from memo import memo_async, clave_busqueda
+from resultado import Resultado, Candidato, error, OK, NO_MATCH, INCOMPLETO, NO_ENCONTRADO
+from formato import tupla_nosis2, tipo_respuesta
+from registro import obtener_logger, contexto_consulta
+from metricas import tramo, contar
+from matcher import coincide_flexible, normalizar as _norm, IndiceCandidatos
+from cuil import candidatos as candidatos_cuil, formatear as formatear_cuil
+
+try:
+    import h2  # noqa: F401 - habilita HTTP/2 en httpx
+    HTTP2_DISPONIBLE = True
+except ImportError:
+    HTTP2_DISPONIBLE = False
+
+log = obtener_logger("nosis2")
 
 HEADERS = {
     'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
@@ -10,220 +30,281 @@ HEADERS = {
     'Referer': 'https://www.google.com/'
 }
 
-def limpiar(t):
-    """Limpia y normaliza texto"""
-    if not t: 
-        return ""
-    for b in ["()", "VER DETALLES DE", "CONSTANCIA DE CUIL", "VER INFORME COMPLETO", "»", "•"]:
-        t = t.replace(b, "")
-    return " ".join(t.split()).strip().upper()
-
-def _distancia_levenshtein(s1: str, s2: str) -> int:
-    """Calcula la distancia de Levenshtein entre dos strings"""
-    if len(s1) < len(s2):
-        return _distancia_levenshtein(s2, s1)
-    if len(s2) == 0:
-        return len(s1)
-    
-    fila_anterior = range(len(s2) + 1)
-    for i, c1 in enumerate(s1):
-        fila_actual = [i + 1]
-        for j, c2 in enumerate(s2):
-            # Costo de insercion, eliminacion o sustitucion
-            inserciones = fila_anterior[j + 1] + 1
-            eliminaciones = fila_actual[j] + 1
-            sustituciones = fila_anterior[j] + (c1 != c2)
-            fila_actual.append(min(inserciones, eliminaciones, sustituciones))
-        fila_anterior = fila_actual
-    
-    return fila_anterior[-1]
+# Cliente HTTP compartido por todos los scrapers (keep-alive + pool de conexiones)
+HTTP_TIMEOUT = float(os.getenv("NOSIS2_HTTP_TIMEOUT", "10"))
+HTTP_MAX_CONEXIONES = int(os.getenv("NOSIS2_MAX_CONEXIONES", "20"))
+HTTP_MAX_POR_HOST = int(os.getenv("NOSIS2_MAX_POR_HOST", "4"))
+HTTP_KEEPALIVE = float(os.getenv("NOSIS2_KEEPALIVE", "30"))  # Segundos que se conserva una conexión ociosa
 
-def _coincide_flexible(filtro: str, nombre: str) -> bool:
-    """
-    Verifica si el filtro coincide con el nombre de forma flexible.
-    Acepta coincidencias parciales y errores minimos (hasta 2 caracteres de diferencia).
-    Ejemplos: JONATAN=JONATHAN, CARRISO=CARRIZO
-    """
-    if not filtro or not nombre:
-        return False
-    
-    filtro = filtro.lower()
-    nombre = nombre.lower()
-    
-    # Coincidencia exacta contenida
-    if filtro in nombre:
-        return True
-    
-    # Verificar cada palabra del nombre
-    palabras_nombre = nombre.split()
-    for palabra in palabras_nombre:
-        # Si la palabra es muy corta (<=3), debe coincidir exactamente o estar contenida
-        if len(filtro) <= 3:
-            if filtro == palabra[:len(filtro)] or filtro in palabra:
-                return True
-            continue
-        
-        # Coincidencia por contenido
-        if filtro in palabra or palabra in filtro:
-            return True
-        
-        # Usar distancia de Levenshtein para palabras similares
-        # Permitir hasta 2 errores (1 para palabras cortas, 2 para largas)
-        max_errores = 1 if len(filtro) <= 6 else 2
-        
-        # Comparar con la palabra completa
-        if _distancia_levenshtein(filtro, palabra) <= max_errores:
-            return True
-        
-        # Comparar con el inicio de la palabra (mismo largo que el filtro)
-        if len(palabra) >= len(filtro):
-            inicio = palabra[:len(filtro)]
-            if _distancia_levenshtein(filtro, inicio) <= max_errores:
-                return True
-    
-    return False
+# Modo concurrente de nosis2_lookup: lanza las fuentes juntas en lugar de una tras otra
+NOSIS2_CONCURRENTE = os.getenv("NOSIS2_CONCURRENTE", "0") == "1"
+NOSIS2_HEDGE = float(os.getenv("NOSIS2_HEDGE", "0"))  # Segundos antes de lanzar la siguiente fuente (0 = todas juntas)
+
+# Fuentes (configurables para apuntarlas a los servidores locales de benchmarks/)
+CUITONLINE_URL = os.getenv("NOSIS2_CUITONLINE_URL", "https://www.cuitonline.com")
+S360_URL = os.getenv("NOSIS2_S360_URL", "https://sistemas360.ar/cuitonline")
+DATEAS_URL = os.getenv("NOSIS2_DATEAS_URL", "https://www.dateas.com")
+
+_client = None
+_client_loop = None
+_semaforos_host = {}
 
-def _norm(s: str) -> str:
-    """Normaliza texto removiendo acentos y convirtiendo a minúsculas"""
-    if not s:
-        return ""
-    s = unicodedata.normalize("NFKD", s)
-    s = "".join(ch for ch in s if not unicodedata.combining(ch))
-    return " ".join(s.lower().split())
+# Token CSRF de Sistemas360 reutilizado entre consultas
+_token_s360 = {"token": None, "obtenido": None, "obtenidos": 0, "refrescos": 0}
+_lock_token_s360 = None
+
+
+def _crear_cliente():
+    return httpx.AsyncClient(
+        timeout=HTTP_TIMEOUT,
+        verify=False,
+        http2=HTTP2_DISPONIBLE,
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONEXIONES,
+            max_keepalive_connections=HTTP_MAX_CONEXIONES,
+            keepalive_expiry=HTTP_KEEPALIVE,
+        ),
+    )
+
+async def iniciar_cliente():
+    """Hook de arranque para la API: crea el cliente compartido en el loop actual"""
+    global _client, _client_loop, _semaforos_host, _lock_token_s360
+    loop = asyncio.get_running_loop()
+    if _client is not None and not _client.is_closed and _client_loop is loop:
+        return _client
+    _client = _crear_cliente()
+    _client_loop = loop
+    _semaforos_host = {}
+    # Cliente nuevo = cookies nuevas: el token anterior ya no sirve
+    _lock_token_s360 = asyncio.Lock()
+    _token_s360["token"] = None
+    return _client
+
+async def cerrar_cliente():
+    """Hook de apagado para la API: cierra las conexiones abiertas"""
+    global _client, _client_loop
+    if _client is not None:
+        if not _client.is_closed and _client_loop is asyncio.get_running_loop():
+            await _client.aclose()
+        _client = None
+        _client_loop = None
+
+async def obtener_cliente():
+    """Cliente compartido; se (re)crea si no existe o pertenece a otro event loop"""
+    if _client is None or _client.is_closed or _client_loop is not asyncio.get_running_loop():
+        return await iniciar_cliente()
+    return _client
+
+@asynccontextmanager
+async def _limite_host(url):
+    """Limita las conexiones simultáneas contra un mismo host"""
+    host = urlparse(url).netloc
+    if host not in _semaforos_host:
+        _semaforos_host[host] = asyncio.Semaphore(HTTP_MAX_POR_HOST)
+    async with _semaforos_host[host]:
+        yield
+
+async def _get(url, **kwargs):
+    client = await obtener_cliente()
+    async with _limite_host(url):
+        with tramo("nosis2.http", metodo="GET", host=urlparse(url).netloc) as span:
+            r = await client.get(url, headers=HEADERS, **kwargs)
+            span.atributos["status"] = r.status_code
+            return r
+
+async def _post(url, **kwargs):
+    client = await obtener_cliente()
+    async with _limite_host(url):
+        with tramo("nosis2.http", metodo="POST", host=urlparse(url).netloc) as span:
+            r = await client.post(url, headers=HEADERS, **kwargs)
+            span.atributos["status"] = r.status_code
+            return r
 
 def calcular_cuits(dni):
-    """Calcula los posibles CUIT/CUIL a partir de un DNI"""
-    candidatos = []
-    for pre in [20, 27, 23]:
-        cadena = f"{pre}{str(dni).zfill(8)}"
-        factores = [5, 4, 3, 2, 7, 6, 5, 4, 3, 2]
-        suma = sum(int(cadena[i]) * factores[i] for i in range(10))
-        resto = suma % 11
-        dv = 0 if resto == 0 else (9 if resto == 1 and pre == 23 else (None if resto == 1 else 11 - resto))
-        if dv is not None:
-            candidatos.append({'fmt': f"{pre}-{str(dni).zfill(8)}-{dv}", 'num': f"{pre}{str(dni).zfill(8)}{dv}"})
-    return candidatos
+    """Calcula los posibles CUIT/CUIL a partir de un DNI (20, 27, 23; ver cuil.py)"""
+    return [{'fmt': formatear_cuil(num), 'num': num} for num in candidatos_cuil(dni)]
+
+# Las fuentes devuelven None/[] cuando no tienen a nadie con ese documento (incluido un 404).
+# Timeouts, errores HTTP y páginas que no se pueden leer se propagan: una fuente caída no
+# equivale a "no encontrado" (ver _Cascada).
+
+def _respuesta(r):
+    """None si la fuente contestó 404 (no existe), la respuesta si fue exitosa; si no, lanza"""
+    if r.status_code == 404:
+        return None
+    r.raise_for_status()
+    return r
 
 async def info_cuitonline_search_cuil(cuil):
     """Consulta CuitOnline por CUIL exacto (11 dígitos)"""
-    url = f"https://www.cuitonline.com/search.php?q={cuil}"
-    try:
-        async with httpx.AsyncClient(timeout=10.0, verify=False) as client:
-            r = await client.get(url, headers=HEADERS)
-            soup = BeautifulSoup(r.text, 'html.parser')
-            
-            hits = soup.find_all("div", class_="hit")
-            if not hits:
-                return []
-            
-            resultados = []
-            for hit in hits:
-                datos = {}
-                nombre_tag = hit.find(["h2", "h3"], class_="denominacion")
-                if nombre_tag: 
-                    datos["NOMBRE"] = limpiar(nombre_tag.get_text())
-                
-                cuit_tag = hit.find("span", class_="cuit")
-                if cuit_tag: 
-                    datos["CUIT"] = limpiar(cuit_tag.get_text())
-                
-                if datos.get("NOMBRE") and datos.get("CUIT"):
-                    resultados.append(datos)
-            
-            return resultados
-    except: 
-        return []
+    url = f"{CUITONLINE_URL}/search.php?q={cuil}"
+    r = _respuesta(await _get(url))
+    return obtener_parser().cuitonline(r.text) if r else []
 
 async def info_cuitonline_search(dni):
     """Consulta CuitOnline por DNI - retorna lista de resultados"""
-    url = f"https://www.cuitonline.com/search.php?q={dni}"
-    try:
-        async with httpx.AsyncClient(timeout=10.0, verify=False) as client:
-            r = await client.get(url, headers=HEADERS)
-            soup = BeautifulSoup(r.text, 'html.parser')
-            
-            # Buscar todos los resultados (múltiples hits)
-            hits = soup.find_all("div", class_="hit")
-            if not hits:
-                return []
-            
-            resultados = []
-            for hit in hits:
-                datos = {}
-                nombre_tag = hit.find(["h2", "h3"], class_="denominacion")
-                if nombre_tag: 
-                    datos["NOMBRE"] = limpiar(nombre_tag.get_text())
-                
-                cuit_tag = hit.find("span", class_="cuit")
-                if cuit_tag: 
-                    datos["CUIT"] = limpiar(cuit_tag.get_text())
-                
-                if datos.get("NOMBRE") and datos.get("CUIT"):
-                    resultados.append(datos)
-            
-            return resultados
-    except: 
-        return []
+    url = f"{CUITONLINE_URL}/search.php?q={dni}"
+    r = _respuesta(await _get(url))
+    # Todos los resultados (múltiples hits)
+    return obtener_parser().cuitonline(r.text) if r else []
+
+async def _token_sistemas360(refrescar=False, rechazado=None):
+    """
+    Token CSRF de Sistemas360 cacheado (sus cookies de sesión viven en el cliente compartido).
+    Con refrescar=True se pide uno nuevo, salvo que otra consulta ya haya reemplazado el rechazado.
+    """
+    global _lock_token_s360
+    if _lock_token_s360 is None:
+        _lock_token_s360 = asyncio.Lock()
+    
+    async with _lock_token_s360:
+        actual = _token_s360["token"]
+        if actual and (not refrescar or actual != rechazado):
+            return actual
+        
+        r_get = await _get(S360_URL)
+        _token_s360["token"] = obtener_parser().token_sistemas360(r_get.text)
+        _token_s360["obtenido"] = time.time()
+        _token_s360["obtenidos"] += 1
+        if refrescar:
+            _token_s360["refrescos"] += 1
+        return _token_s360["token"]
+
+def estado_token_sistemas360():
+    """Métricas del token cacheado: edad, tokens obtenidos y refrescos por token vencido"""
+    obtenido = _token_s360["obtenido"]
+    return {
+        "vigente": bool(_token_s360["token"]),
+        "edad": time.time() - obtenido if obtenido else None,
+        "obtenidos": _token_s360["obtenidos"],
+        "refrescos": _token_s360["refrescos"],
+    }
+
+# Textos de la página de respuesta cuando el documento no tiene resultados
+_S360_SIN_RESULTADOS = ("sin resultados", "no se encontr", "no existe")
+
+def _respuesta_sistemas360(r):
+    """
+    True si Sistemas360 respondió la consulta (con la tabla de resultados o avisando que no
+    hay ninguno). Un 419, o una página sin tabla ni aviso (p. ej. el formulario de nuevo),
+    indica que el token ya no sirve; cualquier otro error HTTP se propaga.
+    """
+    if r.status_code == 419:
+        return False
+    if r.status_code == 404:
+        return True
+    r.raise_for_status()  # Otros errores HTTP son falla de la fuente, no del token
+    texto = r.text.lower()
+    return "<table" in texto or any(aviso in texto for aviso in _S360_SIN_RESULTADOS)
 
 async def info_sistemas360(dni):
     """Consulta Sistemas360 (AFIP)"""
-    url = "https://sistemas360.ar/cuitonline"
-    try:
-        async with httpx.AsyncClient(timeout=10.0, verify=False) as client:
-            r_get = await client.get(url, headers=HEADERS)
-            soup_get = BeautifulSoup(r_get.text, 'html.parser')
-            token_input = soup_get.find("input", {"name": "_token"})
-            if not token_input:
-                return None
-            token = token_input.get('value')
-            
-            r_post = await client.post(url, data={'cuit': dni, '_token': token}, headers=HEADERS)
-            soup = BeautifulSoup(r_post.text, 'html.parser')
-            nombre = soup.find("span", class_="fw-bold text-dark")
-            if not nombre: 
-                return None
-            
-            datos = {"NOMBRE": limpiar(nombre.get_text())}
-            for tr in soup.find_all("tr"):
-                th, td = tr.find("th"), tr.find("td")
-                if th and td:
-                    clave = limpiar(th.get_text())
-                    valor = limpiar(td.get_text())
-                    datos[clave] = valor
-                    if clave == "CUIT": 
-                        datos["CUIT"] = valor
-            return datos
-    except: 
-        return None
+    token = await _token_sistemas360()
+    if not token:
+        raise RuntimeError("Sistemas360 no entregó el token del formulario")
+    
+    for intento in range(2):
+        r_post = await _post(S360_URL, data={'cuit': dni, '_token': token})
+        if _respuesta_sistemas360(r_post):
+            return obtener_parser().sistemas360(r_post.text) if r_post.status_code != 404 else None
+        if intento:
+            raise RuntimeError("Sistemas360 rechazó el token recién obtenido")
+        # Token rechazado (419) o volvió el formulario: refrescarlo una vez y reintentar
+        token = await _token_sistemas360(refrescar=True, rechazado=token)
+        if not token:
+            raise RuntimeError("Sistemas360 no entregó el token del formulario")
 
 async def info_dateas(cuit_num):
     """Consulta Dateas para datos del padrón electoral"""
-    url = f"https://www.dateas.com/es/persona/cuit-{cuit_num}"
-    try:
-        async with httpx.AsyncClient(timeout=10.0, verify=False) as client:
-            r = await client.get(url, headers=HEADERS)
-            soup = BeautifulSoup(r.text, 'html.parser')
-            tabla = soup.find("table", class_="entity-table")
-            if not tabla: 
-                return None
-            datos = {}
-            for tr in tabla.find_all("tr"):
-                th, td = tr.find("th"), tr.find("td")
-                if th and td:
-                    if td.find("button"): 
-                        td.find("button").decompose()
-                    clave = limpiar(th.get_text())
-                    valor = limpiar(td.get_text())
-                    datos[clave] = valor
-                    if "APELLIDO Y NOMBRE" in clave: 
-                        datos["NOMBRE"] = valor
-                    if "CUIT/CUIL" in clave: 
-                        datos["CUIT"] = valor
-            return datos
-    except: 
+    url = f"{DATEAS_URL}/es/persona/cuit-{cuit_num}"
+    r = _respuesta(await _get(url))
+    return obtener_parser().dateas(r.text) if r else None
+
+async def _medir_fuente(nombre, consulta):
+    """Consulta una fuente con su tramo y cuenta el desenlace (hit, vacio, falla, cancelada)"""
+    fuente = nombre.split(":")[0]  # "dateas:<cuil>" -> "dateas"
+    with tramo(f"nosis2.{fuente}") as span:
+        try:
+            resultado = await consulta()
+        except asyncio.CancelledError:
+            contar("fuente_total", fuente=fuente, desenlace="cancelada")
+            raise
+        except Exception as e:
+            log.debug("Fuente %s falló: %s", nombre, e)
+            contar("fuente_total", fuente=fuente, desenlace="falla")
+            raise
+        desenlace = "hit" if resultado else "vacio"
+        span.atributos["desenlace"] = desenlace
+        contar("fuente_total", fuente=fuente, desenlace=desenlace)
+        return resultado
+
+class _Cascada:
+    """
+    Fuentes de nosis2_lookup en orden de prioridad.
+    
+    En modo secuencial cada fuente se consulta recién cuando se pide su resultado.
+    En modo concurrente se lanzan todas al crear la cascada (con `hedge` > 0, cada una
+    arranca cuando la anterior responde o pasan `hedge` segundos, lo que ocurra primero).
+    Los resultados se consumen igual en orden de prioridad, así la respuesta es la misma
+    que en modo secuencial; al decidir, cancelar() aborta las consultas que ya no hacen falta.
+    
+    Una fuente que falla cuenta como vacía para la decisión, pero queda en `fallas`: sin
+    ella no se puede afirmar que el documento no exista.
+    """
+    
+    def __init__(self, fuentes, concurrente=False, hedge=0.0):
+        self._fuentes = {nombre: partial(_medir_fuente, nombre, consulta) for nombre, consulta in fuentes.items()}
+        self._tareas = {}
+        self.fallas = []
+        if concurrente:
+            anterior = None
+            for nombre, consulta in self._fuentes.items():
+                anterior = asyncio.ensure_future(self._lanzar(consulta, anterior, hedge))
+                self._tareas[nombre] = anterior
+    
+    @staticmethod
+    async def _lanzar(consulta, anterior, hedge):
+        if anterior is not None and hedge > 0:
+            await asyncio.wait([anterior], timeout=hedge)
+        return await consulta()
+    
+    async def resultado(self, nombre):
+        if nombre not in self._tareas:
+            self._tareas[nombre] = asyncio.ensure_future(self._fuentes[nombre]())
+        try:
+            return await self._tareas[nombre]
+        except Exception:
+            self.fallas.append(nombre)
+            return None
+    
+    def cancelar(self):
+        for tarea in self._tareas.values():
+            if not tarea.done():
+                tarea.cancel()
+            elif not tarea.cancelled():
+                tarea.exception()  # Fallas de fuentes que no se llegaron a usar: ya se contaron
+
+def _desde_cache(dni_o_cuil, nombre_filtro_norm):
+    """Resultado de nosis2 desde la cache de identidades (None si no sirve)"""
+    cache = obtener_cache()
+    if cache is None:
         return None
+    
+    hit = cache.buscar(dni_o_cuil)
+    if hit and (not nombre_filtro_norm or coincide_flexible(nombre_filtro_norm, _norm(hit["nombre"]))):
+        return Resultado(OK, [Candidato(hit["cuil"], hit["nombre"])], desde_cache=True)
+    
+    if cache.es_negativo(dni_o_cuil, "nosis2"):
+        return Resultado(NO_ENCONTRADO, desde_cache=True)
+    return None
 
-async def nosis2_lookup(dni_o_cuil: str, nombre_filtro: str = None):
+@memo_async(
+    clave=lambda a: clave_busqueda(a["dni_o_cuil"], a["nombre_filtro"]),
+    cachear=lambda r: r.estado in (OK, NO_MATCH, INCOMPLETO),
+    bypass="usar_cache",
+)
+async def nosis2_buscar(dni_o_cuil: str, nombre_filtro: str = None, concurrente: bool = None,
+                        usar_cache: bool = True) -> Resultado:
     """
     Consulta múltiples fuentes para obtener NOMBRE y CUIL consolidados.
     Consulta: CuitOnline, Sistemas360 (AFIP), Dateas.
@@ -232,203 +313,271 @@ async def nosis2_lookup(dni_o_cuil: str, nombre_filtro: str = None):
         dni_o_cuil: DNI (7-9 dígitos) o CUIL (11 dígitos, con o sin guiones)
                     Ejemplos: "47156273", "20471562735", "20-47156273-5"
         nombre_filtro: Nombre parcial para filtrar resultados (opcional, acepta errores mínimos)
+        concurrente: Consultar las fuentes en paralelo (por defecto NOSIS2_CONCURRENTE).
+                     Se respeta la prioridad CuitOnline > Sistemas360 > Dateas.
+        usar_cache: False fuerza la consulta a las fuentes (el resultado igual se guarda en cache)
     
     Returns:
-        Tupla (cuil, nombre) - el CUIL siempre sin guiones
-        Si no hay coincidencia con el nombre, retorna mensaje con todos los resultados
+        Resultado con el candidato elegido (CUIL sin guiones). NO_MATCH trae el primer
+        resultado que no coincidió con el nombre
     """
+    with contexto_consulta(), tramo("nosis2.buscar") as span:
+        inicio = time.monotonic()
+        resultado = await _buscar(dni_o_cuil, nombre_filtro, concurrente, usar_cache)
+        resultado.fuente = "nosis2"
+        resultado.segundos = time.monotonic() - inicio
+        span.atributos.update(resultado=resultado.estado, desde_cache=resultado.desde_cache)
+        contar("resultados_total", fuente="nosis2", estado=resultado.estado)
+        log.debug("nosis2 %s -> %s (%.2fs)", dni_o_cuil, resultado.estado, resultado.segundos)
+    return resultado
+
+async def _buscar(dni_o_cuil, nombre_filtro, concurrente, usar_cache):
     # Limpiar input (quitar guiones, espacios)
     dni_o_cuil = (dni_o_cuil or '').strip().replace("-", "").replace(" ", "")
     
     # Validar que sea numérico
     if not dni_o_cuil.isdigit():
-        return ("Input inválido", "ERROR")
+        return error("Input inválido")
     
     # Detectar si es DNI o CUIL
     es_cuil = len(dni_o_cuil) == 11
     es_dni = 7 <= len(dni_o_cuil) <= 9
     
     if not (es_dni or es_cuil):
-        return ("Longitud inválida. Debe ser DNI (7-9) o CUIL (11 dígitos)", "ERROR")
+        return error("Longitud inválida. Debe ser DNI (7-9) o CUIL (11 dígitos)")
     
     # Normalizar filtro de nombre si existe
     nombre_filtro_norm = None
     if nombre_filtro:
         nombre_filtro_norm = _norm(nombre_filtro.strip())
     
+    if usar_cache:
+        en_cache = _desde_cache(dni_o_cuil, nombre_filtro_norm)
+        if en_cache:
+            en_cache.filtro = nombre_filtro
+            return en_cache
+    
+    if concurrente is None:
+        concurrente = NOSIS2_CONCURRENTE
+    
+    clave_cache = dni_o_cuil
+    fallas = []  # Fuentes consultadas que no respondieron
+    
     # Diccionario de identidad consolidado
     id_final = {"NOMBRE": "NO IDENTIFICADO", "CUIT": "NO IDENTIFICADO"}
     
     # CASO 1: Es un CUIL (11 dígitos) - No calcular variantes
     if es_cuil:
-        # Buscar directamente por el CUIL
-        resultados_co = await info_cuitonline_search_cuil(dni_o_cuil)
-        
-        if resultados_co:
-            # Si hay filtro de nombre, buscar coincidencia
-            if nombre_filtro_norm:
-                for res in resultados_co:
-                    nombre_norm = _norm(res.get("NOMBRE", ""))
-                    if _coincide_flexible(nombre_filtro_norm, nombre_norm):
-                        id_final["NOMBRE"] = res["NOMBRE"]
-                        id_final["CUIT"] = res["CUIT"]
-                        break
-                
-                # Si no hubo coincidencia, mostrar mensaje + primer resultado
-                if id_final["NOMBRE"] == "NO IDENTIFICADO":
-                    primer_resultado = resultados_co[0]
-                    mensaje = f"⚠️ No se encontró coincidencia con '{nombre_filtro}'\n\n"
-                    mensaje += f"CUIL: {primer_resultado['CUIT'].replace('-', '')}\n"
-                    mensaje += f"NOMBRE: {primer_resultado['NOMBRE']}"
-                    return (mensaje, "NO_MATCH")
-            else:
-                # Sin filtro, usar el primer resultado
-                id_final["NOMBRE"] = resultados_co[0]["NOMBRE"]
-                id_final["CUIT"] = resultados_co[0]["CUIT"]
-        
-        # Intentar Sistemas360 si no encontramos
-        if id_final["NOMBRE"] == "NO IDENTIFICADO":
-            s360 = await info_sistemas360(dni_o_cuil)
-            if s360:
-                # Si hay filtro de nombre, verificar coincidencia
+        cascada = _Cascada({
+            "cuitonline": partial(info_cuitonline_search_cuil, dni_o_cuil),
+            "sistemas360": partial(info_sistemas360, dni_o_cuil),
+            "dateas": partial(info_dateas, dni_o_cuil),
+        }, concurrente, NOSIS2_HEDGE)
+        try:
+            # Buscar directamente por el CUIL
+            resultados_co = await cascada.resultado("cuitonline")
+            
+            if resultados_co:
+                # Si hay filtro de nombre, buscar coincidencia
                 if nombre_filtro_norm:
-                    nombre_norm = _norm(s360["NOMBRE"])
-                    if _coincide_flexible(nombre_filtro_norm, nombre_norm):
+                    # De los hits que coinciden, el más parecido al filtro
+                    mejor = IndiceCandidatos([r.get("NOMBRE", "") for r in resultados_co]).mejor(nombre_filtro_norm)
+                    if mejor is not None:
+                        id_final["NOMBRE"] = resultados_co[mejor]["NOMBRE"]
+                        id_final["CUIT"] = resultados_co[mejor]["CUIT"]
+                    
+                    # Si no hubo coincidencia, mostrar mensaje + primer resultado
+                    if id_final["NOMBRE"] == "NO IDENTIFICADO":
+                        primer_resultado = resultados_co[0]
+                        return Resultado(
+                            NO_MATCH, [Candidato(primer_resultado['CUIT'], primer_resultado['NOMBRE'])],
+                            filtro=nombre_filtro
+                        )
+                else:
+                    # Sin filtro, usar el primer resultado
+                    id_final["NOMBRE"] = resultados_co[0]["NOMBRE"]
+                    id_final["CUIT"] = resultados_co[0]["CUIT"]
+            
+            # Intentar Sistemas360 si no encontramos
+            if id_final["NOMBRE"] == "NO IDENTIFICADO":
+                s360 = await cascada.resultado("sistemas360")
+                if s360:
+                    # Si hay filtro de nombre, verificar coincidencia
+                    if nombre_filtro_norm:
+                        nombre_norm = _norm(s360["NOMBRE"])
+                        if coincide_flexible(nombre_filtro_norm, nombre_norm):
+                            id_final["NOMBRE"] = s360["NOMBRE"]
+                            if s360.get("CUIT"):
+                                id_final["CUIT"] = s360["CUIT"]
+                        else:
+                            # No coincide, retornar NO_MATCH
+                            return Resultado(NO_MATCH, [Candidato(dni_o_cuil, s360['NOMBRE'])], filtro=nombre_filtro)
+                    else:
+                        # Sin filtro, usar el resultado
                         id_final["NOMBRE"] = s360["NOMBRE"]
                         if s360.get("CUIT"):
                             id_final["CUIT"] = s360["CUIT"]
+            
+            # Intentar Dateas con el CUIL exacto
+            if id_final["NOMBRE"] == "NO IDENTIFICADO" or id_final["CUIT"] == "NO IDENTIFICADO":
+                d_da = await cascada.resultado("dateas")
+                if d_da:
+                    # Si hay filtro de nombre, verificar coincidencia
+                    if nombre_filtro_norm and id_final["NOMBRE"] == "NO IDENTIFICADO":
+                        nombre_norm = _norm(d_da.get("NOMBRE", ""))
+                        if coincide_flexible(nombre_filtro_norm, nombre_norm):
+                            if id_final["NOMBRE"] == "NO IDENTIFICADO": 
+                                id_final["NOMBRE"] = d_da.get("NOMBRE", "NO IDENTIFICADO")
+                            if id_final["CUIT"] == "NO IDENTIFICADO": 
+                                id_final["CUIT"] = d_da.get("CUIT", dni_o_cuil)
+                        else:
+                            # No coincide, retornar NO_MATCH
+                            return Resultado(NO_MATCH, [Candidato(dni_o_cuil, d_da.get('NOMBRE'))], filtro=nombre_filtro)
                     else:
-                        # No coincide, retornar NO_MATCH
-                        mensaje = f"⚠️ No se encontró coincidencia con '{nombre_filtro}'\n\n"
-                        mensaje += f"CUIL: {dni_o_cuil}\n"
-                        mensaje += f"NOMBRE: {s360['NOMBRE']}"
-                        return (mensaje, "NO_MATCH")
-                else:
-                    # Sin filtro, usar el resultado
-                    id_final["NOMBRE"] = s360["NOMBRE"]
-                    if s360.get("CUIT"):
-                        id_final["CUIT"] = s360["CUIT"]
-        
-        # Intentar Dateas con el CUIL exacto
-        if id_final["NOMBRE"] == "NO IDENTIFICADO" or id_final["CUIT"] == "NO IDENTIFICADO":
-            d_da = await info_dateas(dni_o_cuil)
-            if d_da:
-                # Si hay filtro de nombre, verificar coincidencia
-                if nombre_filtro_norm and id_final["NOMBRE"] == "NO IDENTIFICADO":
-                    nombre_norm = _norm(d_da.get("NOMBRE", ""))
-                    if _coincide_flexible(nombre_filtro_norm, nombre_norm):
+                        # Sin filtro o ya tenemos nombre, usar el resultado
                         if id_final["NOMBRE"] == "NO IDENTIFICADO": 
                             id_final["NOMBRE"] = d_da.get("NOMBRE", "NO IDENTIFICADO")
                         if id_final["CUIT"] == "NO IDENTIFICADO": 
                             id_final["CUIT"] = d_da.get("CUIT", dni_o_cuil)
-                    else:
-                        # No coincide, retornar NO_MATCH
-                        mensaje = f"⚠️ No se encontró coincidencia con '{nombre_filtro}'\n\n"
-                        mensaje += f"CUIL: {dni_o_cuil}\n"
-                        mensaje += f"NOMBRE: {d_da.get('NOMBRE', 'NO IDENTIFICADO')}"
-                        return (mensaje, "NO_MATCH")
-                else:
-                    # Sin filtro o ya tenemos nombre, usar el resultado
-                    if id_final["NOMBRE"] == "NO IDENTIFICADO": 
-                        id_final["NOMBRE"] = d_da.get("NOMBRE", "NO IDENTIFICADO")
-                    if id_final["CUIT"] == "NO IDENTIFICADO": 
-                        id_final["CUIT"] = d_da.get("CUIT", dni_o_cuil)
-        
-        # Si no se encontró nada con CUIL directo, extraer DNI y buscar con variantes
-        if id_final["NOMBRE"] == "NO IDENTIFICADO" or id_final["CUIT"] == "NO IDENTIFICADO":
-            print(f"[NOSIS2] No se encontró CUIL {dni_o_cuil} directo, extrayendo DNI...")
-            dni_extraido = dni_o_cuil[2:10]  # Quitar primeros 2 dígitos y último dígito
-            # Continuar con búsqueda por DNI (convertir es_cuil a False para forzar CASO 2)
-            es_cuil = False
-            dni_o_cuil = dni_extraido
+            
+            # Si no se encontró nada con CUIL directo, extraer DNI y buscar con variantes
+            if id_final["NOMBRE"] == "NO IDENTIFICADO" or id_final["CUIT"] == "NO IDENTIFICADO":
+                log.debug("No se encontró CUIL %s directo, extrayendo DNI...", dni_o_cuil)
+                dni_extraido = dni_o_cuil[2:10]  # Quitar primeros 2 dígitos y último dígito
+                # Continuar con búsqueda por DNI (convertir es_cuil a False para forzar CASO 2)
+                es_cuil = False
+                dni_o_cuil = dni_extraido
+        finally:
+            cascada.cancelar()
+            fallas.extend(cascada.fallas)
     
     # CASO 2: Es un DNI (7-9 dígitos O extraído de CUIL) - Calcular variantes
     if not es_cuil:
-        # 1. CUITONLINE SEARCH (retorna lista de resultados)
-        resultados_co = await info_cuitonline_search(dni_o_cuil)
-        
-        # Si hay filtro de nombre, buscar coincidencia flexible
-        if nombre_filtro_norm and resultados_co:
-            coincidencias = []
-            for res in resultados_co:
-                nombre_norm = _norm(res.get("NOMBRE", ""))
-                if _coincide_flexible(nombre_filtro_norm, nombre_norm):
-                    coincidencias.append(res)
+        cuits_posibles = calcular_cuits(dni_o_cuil)
+        fuentes = {
+            "cuitonline": partial(info_cuitonline_search, dni_o_cuil),
+            "sistemas360": partial(info_sistemas360, dni_o_cuil),
+        }
+        for c in cuits_posibles:
+            fuentes[f"dateas:{c['num']}"] = partial(info_dateas, c['num'])
+        cascada = _Cascada(fuentes, concurrente, NOSIS2_HEDGE)
+        try:
+            # 1. CUITONLINE SEARCH (retorna lista de resultados)
+            resultados_co = await cascada.resultado("cuitonline")
             
-            if coincidencias:
-                # Usar la primera coincidencia
-                id_final["NOMBRE"] = coincidencias[0]["NOMBRE"]
-                id_final["CUIT"] = coincidencias[0]["CUIT"]
-            else:
-                # No hubo coincidencias - mostrar mensaje + primer resultado
-                if resultados_co:
-                    primer_resultado = resultados_co[0]
-                    mensaje = f"⚠️ No se encontró coincidencia con '{nombre_filtro}'\n\n"
-                    mensaje += f"CUIL: {primer_resultado['CUIT'].replace('-', '')}\n"
-                    mensaje += f"NOMBRE: {primer_resultado['NOMBRE']}"
-                    return (mensaje, "NO_MATCH")
-        elif resultados_co:
-            # Sin filtro, usar el primer resultado
-            id_final["NOMBRE"] = resultados_co[0]["NOMBRE"]
-            id_final["CUIT"] = resultados_co[0]["CUIT"]
-        
-        # 2. SISTEMAS360 (AFIP) - solo si no encontramos datos en CuitOnline
-        if id_final["NOMBRE"] == "NO IDENTIFICADO":
-            s360 = await info_sistemas360(dni_o_cuil)
-            if s360:
-                # Si hay filtro de nombre, verificar coincidencia
-                if nombre_filtro_norm:
-                    nombre_norm = _norm(s360["NOMBRE"])
-                    if _coincide_flexible(nombre_filtro_norm, nombre_norm):
+            # Si hay filtro de nombre, buscar coincidencia flexible
+            if nombre_filtro_norm and resultados_co:
+                # Homónimos: índice de los nombres y orden por parecido con el filtro
+                orden = IndiceCandidatos([r.get("NOMBRE", "") for r in resultados_co]).ordenar(nombre_filtro_norm)
+                coincidencias = [resultados_co[i] for i in orden]
+                
+                if coincidencias:
+                    # Usar la mejor coincidencia
+                    id_final["NOMBRE"] = coincidencias[0]["NOMBRE"]
+                    id_final["CUIT"] = coincidencias[0]["CUIT"]
+                else:
+                    # No hubo coincidencias - mostrar mensaje + primer resultado
+                    if resultados_co:
+                        primer_resultado = resultados_co[0]
+                        return Resultado(
+                            NO_MATCH, [Candidato(primer_resultado['CUIT'], primer_resultado['NOMBRE'])],
+                            filtro=nombre_filtro
+                        )
+            elif resultados_co:
+                # Sin filtro, usar el primer resultado
+                id_final["NOMBRE"] = resultados_co[0]["NOMBRE"]
+                id_final["CUIT"] = resultados_co[0]["CUIT"]
+            
+            # 2. SISTEMAS360 (AFIP) - solo si no encontramos datos en CuitOnline
+            if id_final["NOMBRE"] == "NO IDENTIFICADO":
+                s360 = await cascada.resultado("sistemas360")
+                if s360:
+                    # Si hay filtro de nombre, verificar coincidencia
+                    if nombre_filtro_norm:
+                        nombre_norm = _norm(s360["NOMBRE"])
+                        if coincide_flexible(nombre_filtro_norm, nombre_norm):
+                            id_final["NOMBRE"] = s360["NOMBRE"]
+                            if s360.get("CUIT"):
+                                id_final["CUIT"] = s360["CUIT"]
+                        else:
+                            # No coincide, retornar NO_MATCH
+                            return Resultado(
+                                NO_MATCH, [Candidato(s360.get('CUIT'), s360['NOMBRE'])],
+                                filtro=nombre_filtro, consulta=dni_o_cuil
+                            )
+                    else:
+                        # Sin filtro, usar el resultado
                         id_final["NOMBRE"] = s360["NOMBRE"]
                         if s360.get("CUIT"):
                             id_final["CUIT"] = s360["CUIT"]
-                    else:
-                        # No coincide, retornar NO_MATCH
-                        mensaje = f"⚠️ No se encontró coincidencia con '{nombre_filtro}'\n\n"
-                        mensaje += f"Resultado encontrado con DNI {dni_o_cuil}:\n"
-                        mensaje += f"CUIL: {s360.get('CUIT', 'NO IDENTIFICADO').replace('-', '')}\n"
-                        mensaje += f"NOMBRE: {s360['NOMBRE']}"
-                        return (mensaje, "NO_MATCH")
-                else:
-                    # Sin filtro, usar el resultado
-                    id_final["NOMBRE"] = s360["NOMBRE"]
-                    if s360.get("CUIT"):
-                        id_final["CUIT"] = s360["CUIT"]
-        
-        # 3. DATEAS (Padrón Electoral) - solo si aún no tenemos datos
-        if id_final["NOMBRE"] == "NO IDENTIFICADO" or id_final["CUIT"] == "NO IDENTIFICADO":
-            cuits_posibles = calcular_cuits(dni_o_cuil)
-            for c in cuits_posibles:
-                d_da = await info_dateas(c['num'])
-                if d_da:
-                    # Si hay filtro de nombre, verificar coincidencia
-                    if nombre_filtro_norm and id_final["NOMBRE"] == "NO IDENTIFICADO":
-                        nombre_norm = _norm(d_da.get("NOMBRE", ""))
-                        if _coincide_flexible(nombre_filtro_norm, nombre_norm):
+            
+            # 3. DATEAS (Padrón Electoral) - solo si aún no tenemos datos
+            if id_final["NOMBRE"] == "NO IDENTIFICADO" or id_final["CUIT"] == "NO IDENTIFICADO":
+                for c in cuits_posibles:
+                    d_da = await cascada.resultado(f"dateas:{c['num']}")
+                    if d_da:
+                        # Si hay filtro de nombre, verificar coincidencia
+                        if nombre_filtro_norm and id_final["NOMBRE"] == "NO IDENTIFICADO":
+                            nombre_norm = _norm(d_da.get("NOMBRE", ""))
+                            if coincide_flexible(nombre_filtro_norm, nombre_norm):
+                                if id_final["NOMBRE"] == "NO IDENTIFICADO": 
+                                    id_final["NOMBRE"] = d_da.get("NOMBRE", "NO IDENTIFICADO")
+                                if id_final["CUIT"] == "NO IDENTIFICADO": 
+                                    id_final["CUIT"] = d_da.get("CUIT", c['num'])
+                                break
+                            else:
+                                # No coincide pero guardamos para mostrar si no hay mejor opción
+                                if id_final["NOMBRE"] == "NO IDENTIFICADO":
+                                    # Guardar primer resultado no coincidente
+                                    return Resultado(
+                                        NO_MATCH, [Candidato(c['num'], d_da.get('NOMBRE'))],
+                                        filtro=nombre_filtro
+                                    )
+                        else:
+                            # Sin filtro o ya tenemos nombre, usar el resultado
                             if id_final["NOMBRE"] == "NO IDENTIFICADO": 
                                 id_final["NOMBRE"] = d_da.get("NOMBRE", "NO IDENTIFICADO")
                             if id_final["CUIT"] == "NO IDENTIFICADO": 
-                                id_final["CUIT"] = d_da.get("CUIT", c['num'])
+                                id_final["CUIT"] = d_da.get("CUIT", c['num'])  # Usar 'num' sin guiones
                             break
-                        else:
-                            # No coincide pero guardamos para mostrar si no hay mejor opción
-                            if id_final["NOMBRE"] == "NO IDENTIFICADO":
-                                # Guardar primer resultado no coincidente
-                                mensaje = f"⚠️ No se encontró coincidencia con '{nombre_filtro}'\n\n"
-                                mensaje += f"CUIL: {c['num']}\n"
-                                mensaje += f"NOMBRE: {d_da.get('NOMBRE', 'NO IDENTIFICADO')}"
-                                return (mensaje, "NO_MATCH")
-                    else:
-                        # Sin filtro o ya tenemos nombre, usar el resultado
-                        if id_final["NOMBRE"] == "NO IDENTIFICADO": 
-                            id_final["NOMBRE"] = d_da.get("NOMBRE", "NO IDENTIFICADO")
-                        if id_final["CUIT"] == "NO IDENTIFICADO": 
-                            id_final["CUIT"] = d_da.get("CUIT", c['num'])  # Usar 'num' sin guiones
-                        break
+        finally:
+            cascada.cancelar()
+            fallas.extend(cascada.fallas)
     
     # Limpiar guiones del CUIL antes de retornar
     cuil_sin_guiones = id_final['CUIT'].replace("-", "")
     
-    # Retornar tupla (cuil, nombre) como espera el bot
-    return (cuil_sin_guiones, id_final['NOMBRE'])
+    encontrados = (id_final["NOMBRE"] != "NO IDENTIFICADO") + (id_final["CUIT"] != "NO IDENTIFICADO")
+    
+    # Nadie lo encontró, pero alguna fuente no respondió: no es un "no encontrado"
+    if encontrados == 0 and fallas:
+        return error(f"Sin respuesta de {', '.join(dict.fromkeys(f.split(':')[0] for f in fallas))}")
+    
+    cache = obtener_cache()
+    if cache is not None:
+        if encontrados == 2:
+            cache.guardar(cuil_sin_guiones, id_final["NOMBRE"], "nosis2")
+        elif encontrados == 0:
+            cache.guardar_negativo(clave_cache, "nosis2")
+    
+    if encontrados == 0:
+        return Resultado(NO_ENCONTRADO, filtro=nombre_filtro)
+    
+    candidato = Candidato(
+        None if id_final["CUIT"] == "NO IDENTIFICADO" else cuil_sin_guiones,
+        None if id_final["NOMBRE"] == "NO IDENTIFICADO" else id_final["NOMBRE"]
+    )
+    return Resultado(OK if encontrados == 2 else INCOMPLETO, [candidato], filtro=nombre_filtro)
+
+async def nosis2_lookup(dni_o_cuil: str, nombre_filtro: str = None, concurrente: bool = None,
+                        usar_cache: bool = True):
+    """
+    Igual que nosis2_buscar, en el formato que espera el bot.
+    
+    Returns:
+        Tupla (cuil, nombre) - el CUIL siempre sin guiones
+        Si no hay coincidencia con el nombre, retorna (mensaje, "NO_MATCH")
+    """
+    respuesta = tupla_nosis2(await nosis2_buscar(dni_o_cuil, nombre_filtro, concurrente, usar_cache))
+    contar("respuestas_total", fuente="nosis2", tipo=tipo_respuesta(respuesta))
+    return respuesta
@@ -0,0 +1,600 @@
+# -*- coding: utf-8 -*-
+"""
+nosis2_parsers.py - Backends de parseo HTML para los scrapers de nosis2
+
+Todos los backends devuelven los mismos campos que el parseo original con
+BeautifulSoup('html.parser'):
+  - bs4:        BeautifulSoup + html.parser (referencia)
+  - lxml:       lxml.html (si está instalado)
+  - selectolax: selectolax/lexbor (si está instalado)
+  - streaming:  html.parser sin árbol; deja de leer cuando ya encontró lo que busca
+
+lxml y selectolax arman el árbol según HTML5, así que solo coinciden con bs4 en HTML bien
+anidado (el de las páginas consultadas). streaming usa el mismo tokenizer que bs4 y replica
+su anidamiento incluso en HTML mal formado.
+
+Comparación de backends: python -m benchmarks.bench_parsers
+
+El backend se elige con NOSIS2_PARSER (auto, bs4, lxml, selectolax, streaming).
+"auto" usa streaming, que devuelve lo mismo que bs4 con cualquier HTML; lxml y
+selectolax hay que pedirlos explícitamente.
+"""
+
+import os
+from html.parser import HTMLParser
+from typing import Optional
+
+from bs4 import BeautifulSoup
+
+try:
+    import lxml.html
+    LXML_DISPONIBLE = True
+except ImportError:
+    LXML_DISPONIBLE = False
+
+try:
+    from selectolax.lexbor import LexborHTMLParser
+    SELECTOLAX_DISPONIBLE = True
+except ImportError:
+    SELECTOLAX_DISPONIBLE = False
+
+# Contenido que get_text() de BeautifulSoup no incluye
+_TAGS_SIN_TEXTO = {"script", "style", "template"}
+
+# Elementos vacíos: nunca tienen tag de cierre
+_TAGS_VACIOS = {
+    "area", "base", "basefont", "bgsound", "br", "col", "command", "embed", "frame", "hr",
+    "image", "img", "input", "isindex", "keygen", "link", "menuitem", "meta", "nextid",
+    "param", "source", "spacer", "track", "wbr",
+}
+
+
+def limpiar(t):
+    """Limpia y normaliza texto"""
+    if not t:
+        return ""
+    for b in ["()", "VER DETALLES DE", "CONSTANCIA DE CUIL", "VER INFORME COMPLETO", "»", "•"]:
+        t = t.replace(b, "")
+    return " ".join(t.split()).strip().upper()
+
+
+def _clases(valor) -> list:
+    return (valor or "").split()
+
+
+def _clase_exacta(valor) -> str:
+    """Valor del atributo class tal como lo compara BeautifulSoup con class_='a b'"""
+    return " ".join(_clases(valor))
+
+
+def _quitar(lista, item):
+    """list.remove por identidad (los items son listas mutables que pueden ser iguales)"""
+    for i in range(len(lista) - 1, -1, -1):
+        if lista[i] is item:
+            del lista[i]
+            return
+
+
+def _agregar_fila(datos, clave, valor, campos):
+    datos[clave] = valor
+    for patron, campo in campos:
+        if patron(clave):
+            datos[campo] = valor
+
+
+# Campos derivados de las filas <th>/<td> de cada fuente
+_CAMPOS_S360 = [(lambda clave: clave == "CUIT", "CUIT")]
+_CAMPOS_DATEAS = [
+    (lambda clave: "APELLIDO Y NOMBRE" in clave, "NOMBRE"),
+    (lambda clave: "CUIT/CUIL" in clave, "CUIT"),
+]
+
+
+# ═══════════════════════════════════════════════════════════════
+# BACKEND: BeautifulSoup (referencia)
+# ═══════════════════════════════════════════════════════════════
+
+class ParserBS4:
+    nombre = "bs4"
+
+    def cuitonline(self, html: str) -> list:
+        soup = BeautifulSoup(html, 'html.parser')
+
+        resultados = []
+        for hit in soup.find_all("div", class_="hit"):
+            datos = {}
+            nombre_tag = hit.find(["h2", "h3"], class_="denominacion")
+            if nombre_tag:
+                datos["NOMBRE"] = limpiar(nombre_tag.get_text())
+
+            cuit_tag = hit.find("span", class_="cuit")
+            if cuit_tag:
+                datos["CUIT"] = limpiar(cuit_tag.get_text())
+
+            if datos.get("NOMBRE") and datos.get("CUIT"):
+                resultados.append(datos)
+        return resultados
+
+    def token_sistemas360(self, html: str) -> Optional[str]:
+        soup = BeautifulSoup(html, 'html.parser')
+        token_input = soup.find("input", {"name": "_token"})
+        return token_input.get('value') if token_input else None
+
+    def sistemas360(self, html: str) -> Optional[dict]:
+        soup = BeautifulSoup(html, 'html.parser')
+        nombre = soup.find("span", class_="fw-bold text-dark")
+        if not nombre:
+            return None
+
+        datos = {"NOMBRE": limpiar(nombre.get_text())}
+        for tr in soup.find_all("tr"):
+            th, td = tr.find("th"), tr.find("td")
+            if th and td:
+                _agregar_fila(datos, limpiar(th.get_text()), limpiar(td.get_text()), _CAMPOS_S360)
+        return datos
+
+    def dateas(self, html: str) -> Optional[dict]:
+        soup = BeautifulSoup(html, 'html.parser')
+        tabla = soup.find("table", class_="entity-table")
+        if not tabla:
+            return None
+        datos = {}
+        for tr in tabla.find_all("tr"):
+            th, td = tr.find("th"), tr.find("td")
+            if th and td:
+                if td.find("button"):
+                    td.find("button").decompose()
+                _agregar_fila(datos, limpiar(th.get_text()), limpiar(td.get_text()), _CAMPOS_DATEAS)
+        return datos
+
+
+# ═══════════════════════════════════════════════════════════════
+# BACKEND: lxml
+# ═══════════════════════════════════════════════════════════════
+
+class ParserLxml:
+    nombre = "lxml"
+
+    @staticmethod
+    def _doc(html: str):
+        return lxml.html.document_fromstring(html or "<html></html>")
+
+    @classmethod
+    def _texto(cls, el) -> str:
+        """Texto como get_text(): sin comentarios ni contenido de script/style"""
+        if el.tag in _TAGS_SIN_TEXTO:
+            return ""
+        partes = []
+        if el.text:
+            partes.append(el.text)
+        for hijo in el:
+            if isinstance(hijo.tag, str):
+                partes.append(cls._texto(hijo))
+            if hijo.tail:
+                partes.append(hijo.tail)
+        return "".join(partes)
+
+    @staticmethod
+    def _con_clase(tag: str, clase: str, eje: str = "descendant::") -> str:
+        return f"{eje}{tag}[contains(concat(' ', normalize-space(@class), ' '), ' {clase} ')]"
+
+    def cuitonline(self, html: str) -> list:
+        doc = self._doc(html)
+
+        resultados = []
+        for hit in doc.xpath(self._con_clase("div", "hit", eje="//")):
+            datos = {}
+            nombre_tag = hit.xpath(
+                "descendant::*[self::h2 or self::h3]"
+                "[contains(concat(' ', normalize-space(@class), ' '), ' denominacion ')][1]"
+            )
+            if nombre_tag:
+                datos["NOMBRE"] = limpiar(self._texto(nombre_tag[0]))
+
+            cuit_tag = hit.xpath(self._con_clase("span", "cuit") + "[1]")
+            if cuit_tag:
+                datos["CUIT"] = limpiar(self._texto(cuit_tag[0]))
+
+            if datos.get("NOMBRE") and datos.get("CUIT"):
+                resultados.append(datos)
+        return resultados
+
+    def token_sistemas360(self, html: str) -> Optional[str]:
+        token_input = self._doc(html).xpath("//input[@name='_token'][1]")
+        return token_input[0].get('value') if token_input else None
+
+    def sistemas360(self, html: str) -> Optional[dict]:
+        doc = self._doc(html)
+        nombre = next((s for s in doc.iter("span") if _clase_exacta(s.get("class")) == "fw-bold text-dark"), None)
+        if nombre is None:
+            return None
+
+        datos = {"NOMBRE": limpiar(self._texto(nombre))}
+        for tr in doc.iter("tr"):
+            th, td = tr.find(".//th"), tr.find(".//td")
+            if th is not None and td is not None:
+                _agregar_fila(datos, limpiar(self._texto(th)), limpiar(self._texto(td)), _CAMPOS_S360)
+        return datos
+
+    def dateas(self, html: str) -> Optional[dict]:
+        doc = self._doc(html)
+        tabla = doc.xpath(self._con_clase("table", "entity-table") + "[1]")
+        if not tabla:
+            return None
+        datos = {}
+        for tr in tabla[0].iter("tr"):
+            th, td = tr.find(".//th"), tr.find(".//td")
+            if th is not None and td is not None:
+                boton = td.find(".//button")
+                if boton is not None:
+                    boton.drop_tree()
+                _agregar_fila(datos, limpiar(self._texto(th)), limpiar(self._texto(td)), _CAMPOS_DATEAS)
+        return datos
+
+
+# ═══════════════════════════════════════════════════════════════
+# BACKEND: selectolax (lexbor)
+# ═══════════════════════════════════════════════════════════════
+
+class ParserSelectolax:
+    nombre = "selectolax"
+
+    @staticmethod
+    def _texto(nodo) -> str:
+        """Texto como get_text(): sin comentarios ni contenido de script/style/template"""
+        partes = []
+        for n in nodo.traverse(include_text=True):
+            if n.tag != "-text":
+                continue
+            padre = n.parent
+            while padre is not None and padre.tag not in _TAGS_SIN_TEXTO and padre.mem_id != nodo.mem_id:
+                padre = padre.parent
+            if padre is None or padre.tag not in _TAGS_SIN_TEXTO:
+                partes.append(n.text_content or "")
+        return "".join(partes)
+
+    @staticmethod
+    def _primero(nodo, tags, clase=None):
+        """Primer descendiente (en orden de documento) con alguno de los tags y la clase dada"""
+        recorrido = nodo.traverse()
+        next(recorrido)  # El propio nodo
+        for n in recorrido:
+            if n.tag in tags and (clase is None or clase in _clases(n.attributes.get("class"))):
+                return n
+        return None
+
+    def cuitonline(self, html: str) -> list:
+        doc = LexborHTMLParser(html)
+
+        resultados = []
+        for hit in doc.css("div.hit"):
+            datos = {}
+            nombre_tag = self._primero(hit, ("h2", "h3"), "denominacion")
+            if nombre_tag is not None:
+                datos["NOMBRE"] = limpiar(self._texto(nombre_tag))
+
+            cuit_tag = hit.css_first("span.cuit")
+            if cuit_tag is not None:
+                datos["CUIT"] = limpiar(self._texto(cuit_tag))
+
+            if datos.get("NOMBRE") and datos.get("CUIT"):
+                resultados.append(datos)
+        return resultados
+
+    def token_sistemas360(self, html: str) -> Optional[str]:
+        token_input = LexborHTMLParser(html).css_first('input[name="_token"]')
+        return token_input.attributes.get('value') if token_input is not None else None
+
+    def sistemas360(self, html: str) -> Optional[dict]:
+        doc = LexborHTMLParser(html)
+        nombre = next((s for s in doc.css("span") if _clase_exacta(s.attributes.get("class")) == "fw-bold text-dark"), None)
+        if nombre is None:
+            return None
+
+        datos = {"NOMBRE": limpiar(self._texto(nombre))}
+        for tr in doc.css("tr"):
+            th, td = tr.css_first("th"), tr.css_first("td")
+            if th is not None and td is not None:
+                _agregar_fila(datos, limpiar(self._texto(th)), limpiar(self._texto(td)), _CAMPOS_S360)
+        return datos
+
+    def dateas(self, html: str) -> Optional[dict]:
+        tabla = LexborHTMLParser(html).css_first("table.entity-table")
+        if tabla is None:
+            return None
+        datos = {}
+        for tr in tabla.css("tr"):
+            th, td = tr.css_first("th"), tr.css_first("td")
+            if th is not None and td is not None:
+                boton = td.css_first("button")
+                if boton is not None:
+                    boton.decompose()
+                _agregar_fila(datos, limpiar(self._texto(th)), limpiar(self._texto(td)), _CAMPOS_DATEAS)
+        return datos
+
+
+# ═══════════════════════════════════════════════════════════════
+# BACKEND: streaming (html.parser sin árbol, con corte temprano)
+# ═══════════════════════════════════════════════════════════════
+
+class _Listo(Exception):
+    """Corta el parseo: ya se encontró todo lo necesario"""
+
+
+class _Buffer:
+    __slots__ = ("partes", "suprimido")
+
+    def __init__(self):
+        self.partes = []
+        self.suprimido = 0
+
+    def texto(self) -> str:
+        return "".join(self.partes)
+
+
+class _Nodo:
+    __slots__ = ("tag", "attrs", "abre", "suprime", "extra")
+
+    def __init__(self, tag, attrs):
+        self.tag = tag
+        self.attrs = attrs
+        self.abre = []  # Buffers que capturan el texto de este elemento
+        self.suprime = []  # Buffers que ignoran el texto de este elemento
+        self.extra = None
+
+
+class _Extractor(HTMLParser):
+    """
+    Recorre el HTML sin construir árbol, replicando el anidamiento que arma BeautifulSoup
+    con html.parser (los tags de cierre cierran hasta el último abierto con ese nombre).
+    Las subclases capturan texto de elementos con capturar() y cortan con _Listo.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self._pila = []
+        self._abiertos = []
+        self._sin_texto = 0
+
+    def extraer(self, html: str):
+        try:
+            self.feed(html or "")
+            self.close()
+        except _Listo:
+            pass
+        return self.resultado()
+
+    def capturar(self, nodo: _Nodo) -> _Buffer:
+        buf = _Buffer()
+        nodo.abre.append(buf)
+        self._abiertos.append(buf)
+        return buf
+
+    def handle_starttag(self, tag, attrs):
+        nodo = _Nodo(tag, dict(attrs))
+        if tag in _TAGS_SIN_TEXTO:
+            self._sin_texto += 1
+        self.abrir(nodo)
+        if tag in _TAGS_VACIOS:
+            self._cerrar(nodo)
+        else:
+            self._pila.append(nodo)
+
+    def handle_startendtag(self, tag, attrs):
+        nodo = _Nodo(tag, dict(attrs))
+        if tag in _TAGS_SIN_TEXTO:
+            self._sin_texto += 1
+        self.abrir(nodo)
+        self._cerrar(nodo)
+
+    def handle_endtag(self, tag):
+        for i in range(len(self._pila) - 1, -1, -1):
+            if self._pila[i].tag == tag:
+                while len(self._pila) > i:
+                    self._cerrar(self._pila.pop())
+                return
+
+    def handle_data(self, data):
+        if self._sin_texto:
+            return
+        for buf in self._abiertos:
+            if not buf.suprimido:
+                buf.partes.append(data)
+
+    def _cerrar(self, nodo: _Nodo):
+        if nodo.tag in _TAGS_SIN_TEXTO:
+            self._sin_texto -= 1
+        for buf in nodo.abre:
+            self._abiertos.remove(buf)
+        for buf in nodo.suprime:
+            buf.suprimido -= 1
+        self.cerrar(nodo)
+
+    # Ganchos para las subclases
+    def abrir(self, nodo: _Nodo):
+        pass
+
+    def cerrar(self, nodo: _Nodo):
+        pass
+
+    def resultado(self):
+        raise NotImplementedError
+
+
+class _ExtractorCuitonline(_Extractor):
+    def __init__(self):
+        super().__init__()
+        self._hits = []  # [nombre_buf, cuit_buf] en orden de aparición
+        self._hits_abiertos = []
+
+    def abrir(self, nodo):
+        clases = _clases(nodo.attrs.get("class"))
+        for hit in self._hits_abiertos:
+            if hit[0] is None and nodo.tag in ("h2", "h3") and "denominacion" in clases:
+                hit[0] = self.capturar(nodo)
+            if hit[1] is None and nodo.tag == "span" and "cuit" in clases:
+                hit[1] = self.capturar(nodo)
+        if nodo.tag == "div" and "hit" in clases:
+            nodo.extra = [None, None]
+            self._hits.append(nodo.extra)
+            self._hits_abiertos.append(nodo.extra)
+
+    def cerrar(self, nodo):
+        if nodo.extra is not None:
+            _quitar(self._hits_abiertos, nodo.extra)
+
+    def resultado(self):
+        resultados = []
+        for nombre_buf, cuit_buf in self._hits:
+            datos = {}
+            if nombre_buf is not None:
+                datos["NOMBRE"] = limpiar(nombre_buf.texto())
+            if cuit_buf is not None:
+                datos["CUIT"] = limpiar(cuit_buf.texto())
+            if datos.get("NOMBRE") and datos.get("CUIT"):
+                resultados.append(datos)
+        return resultados
+
+
+class _ExtractorToken(_Extractor):
+    def __init__(self):
+        super().__init__()
+        self._token = None
+
+    def abrir(self, nodo):
+        if nodo.tag == "input" and nodo.attrs.get("name") == "_token":
+            self._token = nodo.attrs.get("value")
+            raise _Listo()
+
+    def resultado(self):
+        return self._token
+
+
+class _ExtractorFilas(_Extractor):
+    """Filas <tr> con su primer <th> y primer <td> (opcionalmente sin el primer <button> del td)"""
+
+    def __init__(self, sin_boton=False):
+        super().__init__()
+        self._sin_boton = sin_boton
+        self._filas = []  # [th_buf, td_buf, boton_suprimido]
+        self._filas_abiertas = []
+
+    def dentro(self) -> bool:
+        return True
+
+    def abrir(self, nodo):
+        if not self.dentro():
+            return
+        for fila in self._filas_abiertas:
+            if fila[0] is None and nodo.tag == "th":
+                fila[0] = self.capturar(nodo)
+            if fila[1] is None and nodo.tag == "td":
+                fila[1] = self.capturar(nodo)
+            elif (self._sin_boton and nodo.tag == "button" and fila[1] is not None
+                  and not fila[2] and fila[1] in self._abiertos):
+                fila[2] = True
+                fila[1].suprimido += 1
+                nodo.suprime.append(fila[1])
+        if nodo.tag == "tr":
+            nodo.extra = [None, None, False]
+            self._filas.append(nodo.extra)
+            self._filas_abiertas.append(nodo.extra)
+
+    def cerrar(self, nodo):
+        if nodo.tag == "tr" and nodo.extra is not None:
+            _quitar(self._filas_abiertas, nodo.extra)
+
+    def filas(self):
+        for th_buf, td_buf, _ in self._filas:
+            if th_buf is not None and td_buf is not None:
+                yield limpiar(th_buf.texto()), limpiar(td_buf.texto())
+
+
+class _ExtractorSistemas360(_ExtractorFilas):
+    def __init__(self):
+        super().__init__()
+        self._nombre = None
+
+    def abrir(self, nodo):
+        if (self._nombre is None and nodo.tag == "span"
+                and _clase_exacta(nodo.attrs.get("class")) == "fw-bold text-dark"):
+            self._nombre = self.capturar(nodo)
+        super().abrir(nodo)
+
+    def resultado(self):
+        if self._nombre is None:
+            return None
+        datos = {"NOMBRE": limpiar(self._nombre.texto())}
+        for clave, valor in self.filas():
+            _agregar_fila(datos, clave, valor, _CAMPOS_S360)
+        return datos
+
+
+class _ExtractorDateas(_ExtractorFilas):
+    def __init__(self):
+        super().__init__(sin_boton=True)
+        self._tabla = None  # Nodo de la primera table.entity-table
+        self._vista = False
+
+    def dentro(self) -> bool:
+        return self._tabla is not None
+
+    def abrir(self, nodo):
+        if (not self._vista and nodo.tag == "table"
+                and "entity-table" in _clases(nodo.attrs.get("class"))):
+            self._tabla = nodo
+            self._vista = True
+            return
+        super().abrir(nodo)
+
+    def cerrar(self, nodo):
+        super().cerrar(nodo)
+        if nodo is self._tabla:
+            raise _Listo()  # El resto de la página no interesa
+
+    def resultado(self):
+        if not self._vista:
+            return None
+        datos = {}
+        for clave, valor in self.filas():
+            _agregar_fila(datos, clave, valor, _CAMPOS_DATEAS)
+        return datos
+
+
+class ParserStreaming:
+    nombre = "streaming"
+
+    def cuitonline(self, html: str) -> list:
+        return _ExtractorCuitonline().extraer(html)
+
+    def token_sistemas360(self, html: str) -> Optional[str]:
+        return _ExtractorToken().extraer(html)
+
+    def sistemas360(self, html: str) -> Optional[dict]:
+        return _ExtractorSistemas360().extraer(html)
+
+    def dateas(self, html: str) -> Optional[dict]:
+        return _ExtractorDateas().extraer(html)
+
+
+# ═══════════════════════════════════════════════════════════════
+# SELECCIÓN DE BACKEND
+# ═══════════════════════════════════════════════════════════════
+
+BACKENDS = {"bs4": ParserBS4, "streaming": ParserStreaming}
+if LXML_DISPONIBLE:
+    BACKENDS["lxml"] = ParserLxml
+if SELECTOLAX_DISPONIBLE:
+    BACKENDS["selectolax"] = ParserSelectolax
+
+_instancias = {}
+
+
+def obtener_parser(nombre: str = None):
+    """Backend pedido (o NOSIS2_PARSER); "auto" o uno no instalado usan streaming"""
+    nombre = (nombre or os.getenv("NOSIS2_PARSER", "auto")).lower()
+    if nombre not in BACKENDS:
+        nombre = "streaming"
+    if nombre not in _instancias:
+        _instancias[nombre] = BACKENDS[nombre]()
+    return _instancias[nombre]
@@ -5,104 +5,312 @@ Requiere certificado AFIP (produccion.crt y privada.key en este mismo directorio
 """
 
 import os
+import json
+import time
+import asyncio
 import datetime
 import base64
+import threading
+import contextvars
 import warnings
 from zeep import Client
+from zeep.exceptions import Fault
+from zeep.cache import SqliteCache
 from zeep.transports import Transport
 from requests import Session
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor
 from cryptography import x509
 from cryptography.hazmat.primitives import hashes, serialization
 from cryptography.hazmat.primitives.serialization import pkcs7
 import xml.etree.ElementTree as ET
-import unicodedata
+from cache_identidad import obtener_cache
+from memo import memo_async, clave_busqueda
+from resultado import Resultado, Candidato, error, OK, NO_MATCH, NO_ENCONTRADO, ERROR
+from formato import tupla_nosis3, tipo_respuesta
+from registro import obtener_logger, contexto_consulta
+from metricas import tramo, contar
+from matcher import coincide_flexible, normalizar as _norm
+from cuil import armar as cuil_armar, candidatos as cuil_candidatos, PREFIJOS as PREFIJOS_CUIL
+
+log = obtener_logger("nosis3")
 
 # --- CONFIGURACIÓN ---
 CUIT_REPRESENTANTE = 20471562735  # CUIT del dueño del certificado
 DIR_ACTUAL = os.path.dirname(os.path.abspath(__file__))
-NOMBRE_CERT = os.path.join(DIR_ACTUAL, "produccion.crt")
-NOMBRE_KEY = os.path.join(DIR_ACTUAL, "privada.key")
+NOMBRE_CERT = os.getenv("AFIP_CERT", os.path.join(DIR_ACTUAL, "produccion.crt"))
+NOMBRE_KEY = os.getenv("AFIP_KEY", os.path.join(DIR_ACTUAL, "privada.key"))
 
 # URLs PROD
-WSDL_WSAA = "https://wsaa.afip.gov.ar/ws/services/LoginCms?wsdl"
-WSDL_A13 = "https://aws.afip.gov.ar/sr-padron/webservices/personaServiceA13?WSDL"
+WSDL_WSAA = os.getenv("AFIP_WSDL_WSAA", "https://wsaa.afip.gov.ar/ws/services/LoginCms?wsdl")
+WSDL_A13 = os.getenv("AFIP_WSDL_A13", "https://aws.afip.gov.ar/sr-padron/webservices/personaServiceA13?WSDL")
+
+# Cache en disco de WSDL/XSD (zeep) y pool de conexiones HTTP con keep-alive
+WSDL_CACHE_PATH = os.getenv("AFIP_WSDL_CACHE", os.path.join(DIR_ACTUAL, "afip_wsdl_cache.db"))
+WSDL_CACHE_TTL = int(os.getenv("AFIP_WSDL_CACHE_TTL", str(7 * 24 * 3600)))  # Segundos
+HTTP_POOL_MAXSIZE = int(os.getenv("AFIP_HTTP_POOL", "10"))
+
+# Threads para el trabajo bloqueante (firma, WSAA, getPersona): nunca corre en el event loop
+AFIP_MAX_WORKERS = int(os.getenv("AFIP_MAX_WORKERS", "6"))
+_ejecutor_afip = ThreadPoolExecutor(max_workers=AFIP_MAX_WORKERS, thread_name_prefix="afip")
 
 warnings.filterwarnings("ignore")
 
-# Cache para token (evitar autenticar en cada llamada)
-_token_cache = {"token": None, "sign": None, "expira": None}
-
-def _distancia_levenshtein(s1: str, s2: str) -> int:
-    """Calcula la distancia de Levenshtein entre dos strings"""
-    if len(s1) < len(s2):
-        return _distancia_levenshtein(s2, s1)
-    if len(s2) == 0:
-        return len(s1)
-    
-    fila_anterior = range(len(s2) + 1)
-    for i, c1 in enumerate(s1):
-        fila_actual = [i + 1]
-        for j, c2 in enumerate(s2):
-            inserciones = fila_anterior[j + 1] + 1
-            eliminaciones = fila_actual[j] + 1
-            sustituciones = fila_anterior[j] + (c1 != c2)
-            fila_actual.append(min(inserciones, eliminaciones, sustituciones))
-        fila_anterior = fila_actual
-    
-    return fila_anterior[-1]
-
-def _coincide_flexible(filtro: str, nombre: str) -> bool:
+# Ticket de acceso WSAA persistido en disco (sobrevive reinicios)
+TA_PATH = os.getenv("AFIP_TA_PATH", os.path.join(DIR_ACTUAL, "ta_a13.json"))
+TA_MARGEN = int(os.getenv("AFIP_TA_MARGEN", "300"))  # Segundos antes de `expira` para renovar en segundo plano
+TA_TOLERANCIA = 60  # Segundos: un ticket a punto de vencer ya no se usa
+TA_REINTENTO = 15  # Segundos entre intentos de renovación mientras el ticket actual siga vivo
+
+class GestorTicket:
     """
-    Verifica si el filtro coincide con el nombre de forma flexible.
+    Ticket de acceso (TA) de WSAA para ws_sr_padron_a13, compartido por todo el proceso.
+    
+    - Renovación single-flight: si vence con varias consultas en curso, un solo thread
+      firma el CMS y llama a loginCms; el resto espera y reutiliza el resultado
+      (WSAA rechaza logins repetidos con "ya posee un TA válido").
+    - Renovación en segundo plano: un timer pide el ticket nuevo `margen` segundos antes
+      de `expira`. Si WSAA todavía no lo entrega, se sigue usando el actual y se reintenta
+      al vencer.
+    - Si una consulta no logra renovarlo pero el TA actual todavía no venció, lo sigue
+      usando (reintentando cada `TA_REINTENTO` segundos); solo falla con el TA vencido.
+    - El TA se persiste en disco, así un reinicio no obliga a loguearse de nuevo.
     """
-    if not filtro or not nombre:
-        return False
     
-    filtro = filtro.lower()
-    nombre = nombre.lower()
+    def __init__(self, ruta=TA_PATH, margen=TA_MARGEN):
+        self.ruta = ruta
+        self.margen = margen
+        self.token = None
+        self.sign = None
+        self.obtenido = None  # time.time() de generación del TA
+        self.expira = None  # time.time() de vencimiento del TA
+        self.renovaciones = 0
+        self.errores = 0
+        self.lock = threading.Lock()
+        self._timer = None
+        self._no_antes = 0.0  # time.time() antes del cual no se reintenta renovar
+        self._cargar()
     
-    if filtro in nombre:
-        return True
+    def _cargar(self):
+        try:
+            with open(self.ruta, "r", encoding="utf-8") as f:
+                datos = json.load(f)
+            self.token = datos["token"]
+            self.sign = datos["sign"]
+            self.obtenido = float(datos["obtenido"])
+            self.expira = float(datos["expira"])
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            log.warning("Ticket AFIP guardado ilegible (%s) - se ignora", e)
+            return
+        if self.vigente():
+            self._programar()
     
-    palabras_nombre = nombre.split()
-    for palabra in palabras_nombre:
-        if len(filtro) <= 3:
-            if filtro == palabra[:len(filtro)] or filtro in palabra:
-                return True
-            continue
-        
-        if filtro in palabra or palabra in filtro:
-            return True
-        
-        max_errores = 1 if len(filtro) <= 6 else 2
-        
-        if _distancia_levenshtein(filtro, palabra) <= max_errores:
-            return True
+    def _guardar(self):
+        try:
+            tmp = f"{self.ruta}.tmp"
+            fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({
+                    "token": self.token,
+                    "sign": self.sign,
+                    "obtenido": self.obtenido,
+                    "expira": self.expira,
+                }, f)
+            os.replace(tmp, self.ruta)
+        except Exception as e:
+            log.warning("No se pudo persistir el ticket AFIP: %s", e)
+    
+    def vigente(self) -> bool:
+        return bool(self.token and self.expira and time.time() < self.expira - TA_TOLERANCIA)
+    
+    def edad(self):
+        """Segundos desde que se generó el ticket (None si no hay)"""
+        if self.obtenido is None:
+            return None
+        return time.time() - self.obtenido
+    
+    def restante(self):
+        """Segundos de vida que le quedan al ticket (None si no hay)"""
+        if self.expira is None:
+            return None
+        return self.expira - time.time()
+    
+    def _vivo(self) -> bool:
+        """El ticket todavía no venció (aunque esté dentro de la tolerancia)"""
+        restante = self.restante()
+        return bool(self.token and restante is not None and restante > 0)
+    
+    def obtener(self):
+        """(token, sign) vigentes; si no hay, los pide a WSAA (un solo thread a la vez)"""
+        if self.vigente() or (self._vivo() and time.time() < self._no_antes):
+            return self.token, self.sign
         
-        if len(palabra) >= len(filtro):
-            inicio = palabra[:len(filtro)]
-            if _distancia_levenshtein(filtro, inicio) <= max_errores:
-                return True
+        with self.lock:
+            # Otro thread pudo haberlo renovado (o intentado) mientras esperábamos
+            if self.vigente() or (self._vivo() and time.time() < self._no_antes):
+                return self.token, self.sign
+            try:
+                self._renovar()
+            except Exception as e:
+                if not self._vivo():
+                    raise
+                # WSAA se niega mientras el TA actual siga vigente: usarlo hasta que venza
+                self._no_antes = time.time() + TA_REINTENTO
+                log.warning("No se pudo renovar el ticket AFIP (%s) - se usa el actual, vence en %.0fs",
+                            e, self.restante())
+            return self.token, self.sign
+    
+    def _renovar(self):
+        """Pide un TA nuevo a WSAA. Llamar con `self.lock` tomado."""
+        try:
+            token, sign, obtenido, expira = _login_wsaa()
+        except Exception:
+            self.errores += 1
+            raise
+        self.token, self.sign = token, sign
+        self.obtenido, self.expira = obtenido, expira
+        self.renovaciones += 1
+        self._guardar()
+        self._programar()
+        log.debug("Ticket AFIP renovado (vence en %.0fs)", self.restante())
+    
+    def _programar(self, espera=None):
+        """Agenda la renovación en segundo plano antes de que venza el ticket"""
+        if self._timer:
+            self._timer.cancel()
+        if espera is None:
+            espera = self.restante() - self.margen
+        self._timer = threading.Timer(max(espera, 1), self._renovar_en_fondo)
+        self._timer.daemon = True
+        self._timer.start()
     
-    return False
+    def _renovar_en_fondo(self):
+        with self.lock:
+            if self.restante() is not None and self.restante() > self.margen:
+                return  # Ya lo renovó una consulta
+            try:
+                self._renovar()
+            except Exception as e:
+                # WSAA puede negarse mientras el TA actual siga vigente: reintentar al vencer
+                restante = self.restante() or 0
+                log.warning("Renovación anticipada del ticket AFIP falló: %s", e)
+                self._programar(restante if restante > 0 else 60)
+    
+    def cerrar(self):
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+    
+    def info(self) -> dict:
+        return {
+            "vigente": self.vigente(),
+            "edad": self.edad(),
+            "restante": self.restante(),
+            "renovaciones": self.renovaciones,
+            "errores": self.errores,
+        }
 
-def _norm(s: str) -> str:
-    """Normaliza texto removiendo acentos y convirtiendo a minúsculas"""
-    if not s:
-        return ""
-    s = unicodedata.normalize("NFKD", s)
-    s = "".join(ch for ch in s if not unicodedata.combining(ch))
-    return " ".join(s.lower().split())
 
-def obtener_ticket():
-    """Obtiene ticket de acceso (token + sign) de AFIP WSAA"""
-    global _token_cache
+class FirmanteAfip:
+    """
+    Certificado y clave privada de AFIP cargados una sola vez para firmar el CMS de WSAA.
+    
+    Antes de cada firma se compara el mtime de ambos archivos: si cambiaron (certificado
+    renovado) se vuelven a leer y validar. Así un login solo paga la firma y el SOAP.
+    """
+    
+    def __init__(self, ruta_cert=NOMBRE_CERT, ruta_key=NOMBRE_KEY):
+        self.ruta_cert = ruta_cert
+        self.ruta_key = ruta_key
+        self.cert = None
+        self.key = None
+        self.recargas = 0
+        self._mtimes = None
+        self.lock = threading.Lock()
+    
+    def _mtimes_actuales(self):
+        return (os.stat(self.ruta_cert).st_mtime_ns, os.stat(self.ruta_key).st_mtime_ns)
     
-    # Verificar si el token en cache aún es válido
-    if _token_cache["token"] and _token_cache["expira"]:
-        if datetime.datetime.now() < _token_cache["expira"]:
-            return _token_cache["token"], _token_cache["sign"]
+    def cargar(self):
+        """Lee y valida cert + key si todavía no se cargaron o si cambiaron en disco"""
+        mtimes = self._mtimes_actuales()
+        if mtimes == self._mtimes:
+            return
+        with self.lock:
+            if mtimes == self._mtimes:
+                return
+            with open(self.ruta_cert, "rb") as f:
+                cert = x509.load_pem_x509_certificate(f.read())
+            with open(self.ruta_key, "rb") as f:
+                key = serialization.load_pem_private_key(f.read(), password=None)
+            self._validar(cert, key)
+            self.cert, self.key = cert, key
+            self._mtimes = mtimes
+            self.recargas += 1
+            log.debug("Certificado AFIP cargado (vence en %.0f días)", self.dias_restantes())
     
+    @staticmethod
+    def _validar(cert, key):
+        if cert.public_key().public_numbers() != key.public_key().public_numbers():
+            raise ValueError("La clave privada no corresponde al certificado")
+        if _vencimiento_cert(cert) <= datetime.datetime.now(datetime.timezone.utc):
+            raise ValueError(f"Certificado vencido el {_vencimiento_cert(cert):%d/%m/%Y}")
+    
+    def firmar(self, datos: bytes) -> bytes:
+        """Firma PKCS#7 (DER) de `datos` con el certificado vigente"""
+        self.cargar()
+        cert, key = self.cert, self.key
+        return pkcs7.PKCS7SignatureBuilder().set_data(datos).add_signer(
+            cert, key, hashes.SHA256()
+        ).sign(serialization.Encoding.DER, [])
+    
+    def vencimiento(self):
+        """Fecha de vencimiento (UTC) del certificado cargado (None si no hay)"""
+        return _vencimiento_cert(self.cert) if self.cert else None
+    
+    def dias_restantes(self):
+        """Días que le quedan al certificado (None si no hay)"""
+        vence = self.vencimiento()
+        if vence is None:
+            return None
+        return (vence - datetime.datetime.now(datetime.timezone.utc)).total_seconds() / 86400
+    
+    def info(self) -> dict:
+        vence = self.vencimiento()
+        return {
+            "vence": vence.isoformat() if vence else None,
+            "dias_restantes": self.dias_restantes(),
+            "recargas": self.recargas,
+        }
+
+
+def _vencimiento_cert(cert):
+    if hasattr(cert, "not_valid_after_utc"):
+        return cert.not_valid_after_utc
+    return cert.not_valid_after.replace(tzinfo=datetime.timezone.utc)
+
+
+_firmante = None
+_lock_firmante = threading.Lock()
+
+def obtener_firmante():
+    """Firmante compartido del proceso (se crea perezosamente)"""
+    global _firmante
+    if _firmante is None:
+        with _lock_firmante:
+            if _firmante is None:
+                _firmante = FirmanteAfip()
+    return _firmante
+
+def _login_wsaa():
+    """
+    Firma el loginTicketRequest y lo canjea en WSAA (bloqueante).
+    
+    Returns:
+        (token, sign, generacion, vencimiento) con los tiempos en epoch
+    """
     ahora = datetime.datetime.now() - datetime.timedelta(minutes=5)
     expira = ahora + datetime.timedelta(minutes=60)
     
@@ -117,59 +325,128 @@ def obtener_ticket():
 </loginTicketRequest>""".encode('utf-8')
 
     try:
-        with open(NOMBRE_CERT, "rb") as f: 
-            cert = x509.load_pem_x509_certificate(f.read())
-        with open(NOMBRE_KEY, "rb") as f: 
-            key = serialization.load_pem_private_key(f.read(), password=None)
-        
-        signature = pkcs7.PKCS7SignatureBuilder().set_data(xml_req).add_signer(
-            cert, key, hashes.SHA256()
-        ).sign(serialization.Encoding.DER, [])
-        
-        cms = base64.b64encode(signature).decode('utf-8')
+        with tramo("nosis3.firma"):
+            cms = base64.b64encode(obtener_firmante().firmar(xml_req)).decode('utf-8')
         
-        session = Session()
-        session.verify = True
-        client = Client(WSDL_WSAA, transport=Transport(session=session))
-        rta = client.service.loginCms(in0=cms)
+        client = obtener_cliente(WSDL_WSAA)
+        with tramo("nosis3.wsaa_login"):
+            rta = client.service.loginCms(in0=cms)
         root = ET.fromstring(rta)
         
         token = root.find(".//token").text
         sign = root.find(".//sign").text
         
-        # Guardar en cache
-        _token_cache["token"] = token
-        _token_cache["sign"] = sign
-        _token_cache["expira"] = expira - datetime.timedelta(minutes=5)
+        # Tiempos del TA emitido (WSAA puede otorgar más vida que la pedida)
+        generacion = _epoch_ta(root.find(".//generationTime"), ahora)
+        vencimiento = _epoch_ta(root.find(".//expirationTime"), expira)
         
-        return token, sign
+        return token, sign, generacion, vencimiento
     except Exception as e:
         raise Exception(f"Error de autenticación AFIP: {e}")
 
+def _epoch_ta(nodo, defecto):
+    """Convierte un tiempo del TA (ISO 8601 con zona) a epoch; usa `defecto` si falta"""
+    try:
+        return datetime.datetime.fromisoformat(nodo.text.strip()).timestamp()
+    except Exception:
+        return defecto.timestamp()
+
+
+_gestor_ticket = None
+_lock_gestor = threading.Lock()
+
+def obtener_gestor_ticket():
+    """Gestor de ticket compartido del proceso (se crea perezosamente)"""
+    global _gestor_ticket
+    if _gestor_ticket is None:
+        with _lock_gestor:
+            if _gestor_ticket is None:
+                _gestor_ticket = GestorTicket()
+    return _gestor_ticket
+
+def obtener_ticket():
+    """Obtiene ticket de acceso (token + sign) de AFIP WSAA"""
+    return obtener_gestor_ticket().obtener()
+
+# Clientes SOAP del proceso: se crean una sola vez (la primera vez se descarga y parsea el WSDL)
+_clientes = {}
+_lock_clientes = threading.Lock()
+_session = None
+
+def _obtener_session():
+    """Sesión HTTP compartida por los clientes SOAP, con pool de conexiones keep-alive"""
+    global _session
+    if _session is None:
+        session = Session()
+        session.verify = True
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=HTTP_POOL_MAXSIZE)
+        session.mount("https://", adapter)
+        _session = session
+    return _session
+
+def obtener_cliente(wsdl):
+    """Cliente zeep para el WSDL dado, creado perezosamente y reutilizado por todo el proceso"""
+    cliente = _clientes.get(wsdl)
+    if cliente is not None:
+        return cliente
+    with _lock_clientes:
+        if wsdl not in _clientes:
+            transport = Transport(
+                session=_obtener_session(),
+                cache=SqliteCache(path=WSDL_CACHE_PATH, timeout=WSDL_CACHE_TTL)
+            )
+            _clientes[wsdl] = Client(wsdl, transport=transport)
+        return _clientes[wsdl]
+
+def cerrar_afip():
+    """Hook de apagado: frena la renovación del ticket y libera los threads de AFIP"""
+    global _ejecutor_afip
+    if _gestor_ticket is not None:
+        _gestor_ticket.cerrar()
+    # Queda un ejecutor nuevo (sin threads hasta que se use): el módulo sigue sirviendo
+    ejecutor = _ejecutor_afip
+    _ejecutor_afip = ThreadPoolExecutor(max_workers=AFIP_MAX_WORKERS, thread_name_prefix="afip")
+    ejecutor.shutdown(wait=False, cancel_futures=True)
+
+def precalentar():
+    """
+    Valida certificado/clave y carga los WSDL de WSAA y A13 (desde la cache en disco
+    si está vigente) al arrancar
+    """
+    obtener_firmante().cargar()
+    obtener_cliente(WSDL_WSAA)
+    obtener_cliente(WSDL_A13)
+
 def armar_cuit(dni, prefijo):
-    """Calcula CUIL/CUIT con dígito verificador"""
-    base = f"{prefijo}{str(dni).zfill(8)}"
-    mult = [5, 4, 3, 2, 7, 6, 5, 4, 3, 2]
-    suma = sum(int(base[i]) * mult[i] for i in range(10))
-    dv = 11 - (suma % 11)
-    if dv == 11: 
-        dv = 0
-    elif dv == 10: 
-        dv = 9
-    return int(f"{base}{dv}")
+    """Calcula CUIL/CUIT con dígito verificador (regla 20/27 -> 23 de cuil.py); None si no existe"""
+    cuil = cuil_armar(prefijo, dni)
+    return int(cuil) if cuil else None
+
+# Fault con que A13 contesta un CUIL que no existe (cualquier otro es una falla)
+_A13_NO_EXISTE = "no existe persona"
 
 def consultar_afip_directo(cuit_target, client, token, sign):
-    """Consulta directa a AFIP Web Service A13 por CUIL específico"""
-    try:
-        res = client.service.getPersona(
-            token=token, 
-            sign=sign,
-            cuitRepresentada=CUIT_REPRESENTANTE,
-            idPersona=cuit_target
-        )
-        return res.persona if (res and hasattr(res, 'persona') and res.persona) else None
-    except:
-        return None
+    """
+    Consulta directa a AFIP Web Service A13 por CUIL específico.
+    
+    Devuelve None si AFIP no tiene a nadie con ese CUIL; timeouts, errores HTTP y otros
+    faults (ticket inválido, servicio caído) se propagan.
+    """
+    with tramo("nosis3.get_persona", cuil=str(cuit_target)) as span:
+        try:
+            res = client.service.getPersona(
+                token=token, 
+                sign=sign,
+                cuitRepresentada=CUIT_REPRESENTANTE,
+                idPersona=cuit_target
+            )
+        except Fault as e:
+            if _A13_NO_EXISTE not in str(e.message or "").lower():
+                raise
+            res = None
+        persona = res.persona if (res and hasattr(res, 'persona') and res.persona) else None
+        span.atributos["encontrado"] = persona is not None
+        return persona
 
 def extraer_nombre_completo(persona):
     """Extrae nombre completo de objeto persona de AFIP"""
@@ -214,111 +491,215 @@ def extraer_fecha_nacimiento(persona):
     
     return "S/D"
 
-async def nosis3_lookup(dni_o_cuil, nombre_filtro=None):
+async def _en_ejecutor(func, *args):
+    """Corre una función bloqueante en el ejecutor AFIP sin trabar el event loop"""
+    loop = asyncio.get_running_loop()
+    # Con el contexto actual: los tramos del thread cuelgan del span de la búsqueda
+    return await loop.run_in_executor(_ejecutor_afip, contextvars.copy_context().run, func, *args)
+
+async def consultar_prefijos(dni, prefijos, client, token, sign, nombre_filtro_norm=None):
+    """
+    Consulta en paralelo (pool de threads acotado) los CUIL armados con cada prefijo.
+    
+    Los resultados se recorren en el orden de `prefijos`: en cuanto uno sirve (cualquiera
+    si no hay filtro, o el primero que coincide con el filtro) se descartan las consultas
+    restantes. Así la respuesta es la misma que consultando uno por uno.
+    
+    Si no se encontró a nadie y alguna consulta falló, se propaga esa falla: no se puede
+    afirmar que la persona no exista. Con alguien encontrado que no coincide, se devuelve
+    igual (NO_MATCH con sus candidatos).
+    """
+    loop = asyncio.get_running_loop()
+    # Sin repetidos: con resto 1, 20 y 27 pasan a 23 y darían el mismo CUIL
+    candidatos = [int(c) for c in cuil_candidatos(dni, prefijos)]
+    futuros = [
+        loop.run_in_executor(_ejecutor_afip, contextvars.copy_context().run,
+                             consultar_afip_directo, cuit, client, token, sign)
+        for cuit in candidatos
+    ]
+    
+    resultados_encontrados = []
+    falla = None
+    try:
+        for cuit_candidato, futuro in zip(candidatos, futuros):
+            try:
+                persona = await futuro
+            except Exception as e:
+                log.debug("Consulta A13 de %s falló: %s", cuit_candidato, e)
+                falla = falla or e
+                continue
+            
+            if persona:
+                nombre_completo = extraer_nombre_completo(persona)
+                fecha_nac = extraer_fecha_nacimiento(persona)
+                
+                if nombre_completo:
+                    resultados_encontrados.append({
+                        "cuil": str(cuit_candidato),
+                        "nombre": nombre_completo,
+                        "fecha": fecha_nac
+                    })
+                    if not nombre_filtro_norm or coincide_flexible(nombre_filtro_norm, _norm(nombre_completo)):
+                        break
+        else:
+            if falla is not None and not resultados_encontrados:
+                raise falla
+    finally:
+        for futuro in futuros:
+            futuro.cancel()
+    
+    return resultados_encontrados
+
+def _desde_cache(entrada, nombre_filtro_norm):
+    """Resultado de nosis3 desde la cache de identidades (None si no sirve)"""
+    cache = obtener_cache()
+    if cache is None:
+        return None
+    
+    # Solo sirven entradas con fecha de nacimiento (las que guarda nosis3)
+    hit = cache.buscar(entrada, requiere_fecha=True)
+    if hit and (not nombre_filtro_norm or coincide_flexible(nombre_filtro_norm, _norm(hit["nombre"]))):
+        return Resultado(OK, [Candidato(hit["cuil"], hit["nombre"], hit["fecha"])], desde_cache=True)
+    
+    if cache.es_negativo(entrada, "nosis3"):
+        dni = entrada[2:10] if len(entrada) == 11 else entrada
+        return Resultado(NO_ENCONTRADO, consulta=dni, desde_cache=True)
+    return None
+
+def _cachear(cuil, nombre, fecha):
+    """Guarda el resultado en la cache de identidades y lo devuelve como Resultado"""
+    cache = obtener_cache()
+    if cache is not None:
+        cache.guardar(cuil, nombre, "nosis3", fecha)
+    return Resultado(OK, [Candidato(str(cuil), nombre, fecha)])
+
+@memo_async(
+    clave=lambda a: clave_busqueda(a["dni_o_cuil"], a["nombre_filtro"]),
+    cachear=lambda r: r.estado not in (ERROR, NO_ENCONTRADO),  # Los negativos ya van a la cache con su TTL
+    bypass="usar_cache",
+)
+async def nosis3_buscar(dni_o_cuil, nombre_filtro=None, usar_cache=True) -> Resultado:
     """
     Busca identidad usando AFIP Web Service A13.
     
+    Args:
+        usar_cache: False fuerza la consulta a AFIP (el resultado igual se guarda en cache)
+    
     Returns:
-        Tupla (cuil, nombre, fecha_nacimiento) o (mensaje_error, "ERROR", None)
+        Resultado con un candidato (cuil, nombre, fecha de nacimiento)
     """
+    with contexto_consulta(), tramo("nosis3.buscar") as span:
+        inicio = time.monotonic()
+        resultado = await _buscar(dni_o_cuil, nombre_filtro, usar_cache)
+        resultado.fuente = "nosis3"
+        resultado.segundos = time.monotonic() - inicio
+        span.atributos.update(resultado=resultado.estado, desde_cache=resultado.desde_cache)
+        contar("resultados_total", fuente="nosis3", estado=resultado.estado)
+        log.debug("nosis3 %s -> %s (%.2fs)", dni_o_cuil, resultado.estado, resultado.segundos)
+    return resultado
+
+async def _buscar(dni_o_cuil, nombre_filtro, usar_cache):
     # Limpiar entrada
     entrada = str(dni_o_cuil).replace("-", "").replace(" ", "").strip()
     
     if not entrada.isdigit():
-        return ("Debe ingresar solo números", "ERROR", None)
+        return error("Debe ingresar solo números")
     
     es_dni = len(entrada) in [7, 8, 9]
     es_cuil = len(entrada) == 11
     
     if not (es_dni or es_cuil):
-        return ("Longitud inválida. Debe ser DNI (7-9) o CUIL (11 dígitos)", "ERROR", None)
+        return error("Longitud inválida. Debe ser DNI (7-9) o CUIL (11 dígitos)")
     
     # Normalizar filtro de nombre si existe
     nombre_filtro_norm = None
     if nombre_filtro:
         nombre_filtro_norm = _norm(nombre_filtro.strip())
     
+    if usar_cache:
+        en_cache = _desde_cache(entrada, nombre_filtro_norm)
+        if en_cache:
+            en_cache.filtro = nombre_filtro
+            return en_cache
+    
     try:
         # Obtener credenciales AFIP
-        token, sign = obtener_ticket()
+        token, sign = await _en_ejecutor(obtener_ticket)
         
-        # Crear cliente SOAP
-        session = Session()
-        session.verify = True
-        client = Client(WSDL_A13, transport=Transport(session=session))
+        # Cliente SOAP compartido (WSDL cacheado)
+        client = await _en_ejecutor(obtener_cliente, WSDL_A13)
         
         # CASO 1: Es un CUIL (11 dígitos) - Búsqueda directa primero
         if es_cuil:
-            persona = consultar_afip_directo(entrada, client, token, sign)
+            persona = await _en_ejecutor(consultar_afip_directo, entrada, client, token, sign)
             
             if persona:
                 nombre_completo = extraer_nombre_completo(persona)
                 fecha_nac = extraer_fecha_nacimiento(persona) # <--- EXTRACCIÓN
                 
                 if not nombre_completo:
-                    return ("Datos incompletos en AFIP", "ERROR", None)
+                    return error("Datos incompletos en AFIP")
                 
                 # Si hay filtro de nombre, verificar coincidencia
                 if nombre_filtro_norm:
                     nombre_norm = _norm(nombre_completo)
-                    if not _coincide_flexible(nombre_filtro_norm, nombre_norm):
-                        mensaje = f"⚠️ No se encontró coincidencia con '{nombre_filtro}'\n\n"
-                        mensaje += f"Resultado encontrado:\nCUIL: {entrada}\n"
-                        mensaje += f"NOMBRE: {nombre_completo}\n"
-                        mensaje += f"NACIMIENTO: {fecha_nac}"
-                        return (mensaje, "NO_MATCH", None)
+                    if not coincide_flexible(nombre_filtro_norm, nombre_norm):
+                        return Resultado(NO_MATCH, [Candidato(entrada, nombre_completo, fecha_nac)], filtro=nombre_filtro)
                 
-                return (entrada, nombre_completo, fecha_nac) # <--- RETORNO CON FECHA
+                return _cachear(entrada, nombre_completo, fecha_nac) # <--- RETORNO CON FECHA
             else:
                 # No se encontró con CUIL directo, extraer DNI y buscar con prefijos
-                print(f"[NOSIS3] No se encontró CUIL {entrada} directo, extrayendo DNI...")
+                log.debug("No se encontró CUIL %s directo, extrayendo DNI...", entrada)
                 entrada = entrada[2:10]  # Quitar primeros 2 dígitos y último dígito
                 # Continuar con búsqueda por prefijos (convertir a DNI)
         
         # CASO 2: Es un DNI (7-9 dígitos O extraído de CUIL) - Probar variantes
         if len(entrada) in [7, 8, 9]:
             # Orden de probabilidad: 20 (H), 27 (M), 23 (Ambos)
-            prefijos = [20, 27, 23]
-            
-            resultados_encontrados = []
+            prefijos = PREFIJOS_CUIL
             
-            for pre in prefijos:
-                cuit_candidato = armar_cuit(entrada, pre)
-                persona = consultar_afip_directo(cuit_candidato, client, token, sign)
-                
-                if persona:
-                    nombre_completo = extraer_nombre_completo(persona)
-                    fecha_nac = extraer_fecha_nacimiento(persona) # <--- EXTRACCIÓN
-                    
-                    if nombre_completo:
-                        resultados_encontrados.append({
-                            "cuil": str(cuit_candidato),
-                            "nombre": nombre_completo,
-                            "fecha": fecha_nac # <--- GUARDADO
-                        })
+            resultados_encontrados = await consultar_prefijos(
+                entrada, prefijos, client, token, sign, nombre_filtro_norm
+            )
             
             if not resultados_encontrados:
-                return (f"No se encontró ninguna persona activa con DNI {entrada}", "ERROR", None)
+                # AFIP respondió que no existe con cada prefijo (si alguna consulta falló,
+                # consultar_prefijos ya lanzó la excepción y no se guarda el negativo)
+                cache = obtener_cache()
+                if cache is not None:
+                    cache.guardar_negativo(dni_o_cuil, "nosis3")
+                return Resultado(NO_ENCONTRADO, consulta=entrada)
             
             # Si hay filtro de nombre, buscar coincidencia
             if nombre_filtro_norm:
                 for res in resultados_encontrados:
                     nombre_norm = _norm(res["nombre"])
-                    if _coincide_flexible(nombre_filtro_norm, nombre_norm):
-                        return (res["cuil"], res["nombre"], res["fecha"]) # <--- RETORNO CON FECHA
+                    if coincide_flexible(nombre_filtro_norm, nombre_norm):
+                        resultado = _cachear(res["cuil"], res["nombre"], res["fecha"]) # <--- RETORNO CON FECHA
+                        resultado.filtro = nombre_filtro
+                        return resultado
                 
                 # No hubo coincidencia - mostrar primer resultado
                 primer = resultados_encontrados[0]
-                mensaje = f"⚠️ No se encontró coincidencia con '{nombre_filtro}'\n\n"
-                mensaje += f"Resultado encontrado con DNI {entrada}:\n"
-                mensaje += f"CUIL: {primer['cuil']}\n"
-                mensaje += f"NOMBRE: {primer['nombre']}\n"
-                mensaje += f"NACIMIENTO: {primer['fecha']}"
-                return (mensaje, "NO_MATCH", None)
+                return Resultado(
+                    NO_MATCH, [Candidato(primer["cuil"], primer["nombre"], primer["fecha"])],
+                    filtro=nombre_filtro, consulta=entrada
+                )
             else:
                 # Sin filtro, retornar el primer resultado
                 primer = resultados_encontrados[0]
-                return (primer["cuil"], primer["nombre"], primer["fecha"]) # <--- RETORNO CON FECHA
+                return _cachear(primer["cuil"], primer["nombre"], primer["fecha"]) # <--- RETORNO CON FECHA
     
     except Exception as e:
-        return (f"Error al consultar AFIP: {str(e)}", "ERROR", None)
\ No newline at end of file
+        return error(f"Error al consultar AFIP: {str(e)}")
+
+async def nosis3_lookup(dni_o_cuil, nombre_filtro=None, usar_cache=True):
+    """
+    Igual que nosis3_buscar, en el formato que espera el bot.
+    
+    Returns:
+        Tupla (cuil, nombre, fecha_nacimiento) o (mensaje_error, "ERROR", None)
+    """
+    respuesta = tupla_nosis3(await nosis3_buscar(dni_o_cuil, nombre_filtro, usar_cache))
+    contar("respuestas_total", fuente="nosis3", tipo=tipo_respuesta(respuesta))
+    return respuesta
@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+"""
+registro.py - Logging de los backends de búsqueda (nosis, nosis2, nosis3 y compañía).
+
+- Loggers bajo "identidad." (`obtener_logger("nosis")` -> "identidad.nosis"), con formato
+  perezoso: `log.debug("CUIL %s", cuil)` no arma el texto si DEBUG está apagado.
+- Nivel general en LOG_NIVEL y por módulo en LOG_NIVELES ("nosis=DEBUG,nosis3=WARNING").
+- Salida de texto o JSON (LOG_FORMATO=json), una línea por registro.
+- Id de consulta (correlación) en un ContextVar: todas las líneas de una búsqueda, aunque
+  pasen por varios backends o tareas, llevan el mismo `id_consulta`.
+- Con LOG_COLA=1 (por defecto) el que loguea solo encola el registro; un thread aparte
+  formatea y escribe, así el event loop no espera a stdout.
+"""
+
+import os
+import sys
+import copy
+import json
+import uuid
+import queue
+import atexit
+import logging
+import logging.handlers
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Optional
+
+# Variables de entorno (se leen al configurar, después del load_dotenv de nosis.py):
+# LOG_NIVEL    Nivel por defecto de todos los módulos (INFO)
+# LOG_NIVELES  Niveles por módulo: "nosis=DEBUG,nosis2=WARNING"
+# LOG_FORMATO  "texto" o "json"
+# LOG_COLA     "1" escribe desde un thread aparte (QueueHandler); "0" directo
+
+RAIZ = "identidad"
+
+_id_consulta: contextvars.ContextVar = contextvars.ContextVar("id_consulta", default=None)
+
+# Atributos propios de LogRecord: lo que no esté acá vino en `extra=` y va al JSON
+_ATRIBUTOS_RECORD = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "id_consulta"}
+
+
+def id_consulta() -> Optional[str]:
+    """Id de la consulta en curso (None fuera de una consulta)"""
+    return _id_consulta.get()
+
+
+@contextmanager
+def contexto_consulta(id_: str = None):
+    """
+    Asigna un id de consulta al contexto actual mientras dura el bloque.
+
+    Si ya hay uno (p. ej. el resolver llama a un backend) se conserva, salvo que se pase
+    `id_` explícito. Las tareas creadas dentro del bloque heredan el id.
+    """
+    if id_ is None and _id_consulta.get() is not None:
+        yield _id_consulta.get()
+        return
+    token = _id_consulta.set(id_ or uuid.uuid4().hex[:12])
+    try:
+        yield _id_consulta.get()
+    finally:
+        _id_consulta.reset(token)
+
+
+class _FiltroConsulta(logging.Filter):
+    """Agrega `id_consulta` a cada registro (se evalúa en el thread que loguea)"""
+
+    def filter(self, record):
+        record.id_consulta = _id_consulta.get()
+        return True
+
+
+class FormatoTexto(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)-7s %(name)s%(consulta)s %(message)s")
+
+    def format(self, record):
+        id_ = getattr(record, "id_consulta", None)
+        record.consulta = f" [{id_}]" if id_ else ""
+        return super().format(record)
+
+
+class FormatoJSON(logging.Formatter):
+    """Una línea JSON por registro, con los campos pasados en `extra=`"""
+
+    def format(self, record):
+        datos = {
+            "ts": round(record.created, 3),
+            "nivel": record.levelname,
+            "logger": record.name,
+            "mensaje": record.getMessage(),
+        }
+        id_ = getattr(record, "id_consulta", None)
+        if id_:
+            datos["id_consulta"] = id_
+        for clave, valor in vars(record).items():
+            if clave not in _ATRIBUTOS_RECORD and clave != "consulta":
+                datos[clave] = valor
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            datos["excepcion"] = record.exc_text
+        return json.dumps(datos, ensure_ascii=False, default=str)
+
+
+class _HandlerCola(logging.handlers.QueueHandler):
+    """
+    Encola el registro con el mensaje ya armado (los args pueden cambiar después) pero
+    sin darle formato: de eso se encarga el thread del QueueListener.
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def _parsear_niveles(texto: str) -> dict:
+    niveles = {}
+    for parte in texto.split(","):
+        if "=" in parte:
+            modulo, nivel = parte.split("=", 1)
+            niveles[modulo.strip()] = nivel.strip().upper()
+    return niveles
+
+
+_configurado = False
+_lock_configuracion = threading.Lock()
+_oyente: Optional[logging.handlers.QueueListener] = None
+
+
+def configurar(nivel: str = None, niveles: dict = None, formato: str = None,
+               cola: bool = None, stream=None):
+    """
+    (Re)configura los loggers "identidad.*". Sin argumentos usa las variables de entorno.
+    Lo llama `obtener_logger` la primera vez; llamarlo de nuevo reemplaza la configuración.
+    """
+    global _configurado, _oyente
+    with _lock_configuracion:
+        raiz = logging.getLogger(RAIZ)
+
+        if _oyente is not None:
+            _oyente.stop()
+            _oyente = None
+        for handler in list(raiz.handlers):
+            raiz.removeHandler(handler)
+
+        salida = logging.StreamHandler(stream or sys.stdout)
+        formato = formato or os.getenv("LOG_FORMATO", "texto").lower()
+        salida.setFormatter(FormatoJSON() if formato == "json" else FormatoTexto())
+
+        if cola is None:
+            cola = os.getenv("LOG_COLA", "1") == "1"
+        if cola:
+            cola_registros = queue.SimpleQueue()
+            handler = _HandlerCola(cola_registros)
+            _oyente = logging.handlers.QueueListener(cola_registros, salida)
+            _oyente.start()
+        else:
+            handler = salida
+        # El id se toma al loguear, no en el thread que escribe
+        handler.addFilter(_FiltroConsulta())
+
+        raiz.addHandler(handler)
+        raiz.setLevel((nivel or os.getenv("LOG_NIVEL", "INFO")).upper())
+        raiz.propagate = False
+
+        if niveles is None:
+            niveles = _parsear_niveles(os.getenv("LOG_NIVELES", ""))
+        for nombre in list(logging.Logger.manager.loggerDict):
+            if nombre.startswith(RAIZ + "."):
+                logging.getLogger(nombre).setLevel(logging.NOTSET)
+        for modulo, nivel_modulo in niveles.items():
+            logging.getLogger(f"{RAIZ}.{modulo}").setLevel(nivel_modulo)
+
+        _configurado = True
+
+
+def _detener():
+    """Vacía la cola al salir para no perder las últimas líneas"""
+    global _oyente
+    with _lock_configuracion:
+        if _oyente is not None:
+            _oyente.stop()
+            _oyente = None
+
+
+atexit.register(_detener)
+
+
+def obtener_logger(modulo: str) -> logging.Logger:
+    """Logger "identidad.<modulo>"; configura el logging la primera vez"""
+    if not _configurado:
+        configurar()
+    return logging.getLogger(f"{RAIZ}.{modulo}")
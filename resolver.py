@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+"""
+resolver.py - Resolución de identidad (DNI/CUIL -> CUIL + nombre) probando los tres
+backends en proceso: nosis3 (AFIP A13), nosis2 (scrapers HTTP) y nosis (Nosis.com).
+
+El orden no es fijo: se elige con estadísticas en vivo de cada backend (latencia y tasa
+de éxito, promedios móviles exponenciales) minimizando el costo esperado de llegar a una
+respuesta. Se corta en la primera respuesta confiable; si ninguna lo es, se devuelve la
+mejor advertencia (p. ej. un NO_MATCH con candidatos) para que el que llama decida.
+"""
+
+import os
+import time
+import asyncio
+from typing import Optional
+
+from nosis import nosis_buscar_planificado
+from nosis2 import nosis2_buscar
+from nosis3 import nosis3_buscar
+from resultado import Resultado, error, OK, NO_ENCONTRADO
+from registro import obtener_logger, contexto_consulta
+from metricas import tramo
+
+RESOLVER_ALFA = float(os.getenv("RESOLVER_ALFA", "0.2"))  # Peso de la última muestra en los promedios
+RESOLVER_TIMEOUT = float(os.getenv("RESOLVER_TIMEOUT", "200"))  # Segundos máximos por backend
+
+log = obtener_logger("resolver")
+
+class EstadisticasBackend:
+    """Latencia y tasa de éxito de un backend (EWMA), con valores iniciales a priori"""
+
+    def __init__(self, latencia: float, exito: float, alfa: float = RESOLVER_ALFA):
+        self.latencia = latencia
+        self.exito = exito
+        self.alfa = alfa
+        self.llamadas = 0
+        self.exitos = 0
+        self.errores = 0
+
+    def registrar(self, segundos: float, ok: bool):
+        self.llamadas += 1
+        if ok:
+            self.exitos += 1
+        else:
+            self.errores += 1
+        self.latencia += self.alfa * (segundos - self.latencia)
+        self.exito += self.alfa * ((1.0 if ok else 0.0) - self.exito)
+
+    def costo(self) -> float:
+        """Segundos esperados hasta obtener una respuesta de este backend"""
+        return self.latencia / max(self.exito, 0.05)
+
+    def info(self) -> dict:
+        return {
+            "latencia": round(self.latencia, 3),
+            "exito": round(self.exito, 3),
+            "costo": round(self.costo(), 3),
+            "llamadas": self.llamadas,
+            "exitos": self.exitos,
+            "errores": self.errores,
+        }
+
+
+class Estrategia:
+    """
+    Un backend visto por el resolver: su `*_buscar` y sus estadísticas.
+
+    `limite` (p. ej. un asyncio.Semaphore) acota las consultas simultáneas a este backend;
+    la espera por él no cuenta como latencia ni consume el timeout.
+    """
+
+    def __init__(self, nombre: str, buscar, latencia: float, exito: float,
+                 timeout: float = RESOLVER_TIMEOUT, limite=None):
+        self.nombre = nombre
+        self.buscar = buscar
+        self.timeout = timeout
+        self.limite = limite
+        self.stats = EstadisticasBackend(latencia, exito)
+
+
+class Resolver:
+    """Prueba los backends en orden de costo esperado y corta en la primera respuesta confiable"""
+
+    def __init__(self, estrategias):
+        self.estrategias = {e.nombre: e for e in estrategias}
+
+    def orden(self, fuentes=None) -> list:
+        candidatas = [self.estrategias[f] for f in (fuentes or self.estrategias)]
+        return sorted(candidatas, key=lambda e: e.stats.costo())
+
+    async def _intentar(self, estrategia: Estrategia, entrada: str, nombre_filtro, usar_cache: bool):
+        if estrategia.limite is None:
+            return await self._medir(estrategia, entrada, nombre_filtro, usar_cache)
+        async with estrategia.limite:
+            return await self._medir(estrategia, entrada, nombre_filtro, usar_cache)
+
+    async def _medir(self, estrategia: Estrategia, entrada: str, nombre_filtro, usar_cache: bool):
+        inicio = time.monotonic()
+        try:
+            resultado = await asyncio.wait_for(
+                estrategia.buscar(entrada, nombre_filtro, usar_cache=usar_cache),
+                timeout=estrategia.timeout
+            )
+        except asyncio.TimeoutError:
+            resultado = error("Tiempo agotado", estrategia.nombre)
+        except Exception as e:
+            resultado = error(str(e), estrategia.nombre)
+        segundos = time.monotonic() - inicio
+
+        # Las estadísticas miden al backend: lo que salió de una cache o de la memo no dice
+        # nada de él (tampoco los pedidos que se sumaron a otro en curso)
+        if not (resultado.desde_cache or resultado.desde_memo):
+            # Éxito es identificar a alguien (un NO_MATCH trae candidatos); un NO_ENCONTRADO
+            # puede ser una fuente que no respondió, así que no suma
+            estrategia.stats.registrar(segundos, _confiable(resultado) or bool(resultado.candidatos))
+        return resultado, segundos
+
+    async def resolver(self, dni_o_cuil, nombre_filtro: str = None, fuentes=None,
+                       usar_cache: bool = True) -> dict:
+        """
+        Resuelve DNI/CUIL a identidad.
+
+        Args:
+            dni_o_cuil: DNI (7-9 dígitos) o CUIL (11, con o sin guiones)
+            nombre_filtro: Nombre parcial para elegir entre homónimos / validar
+            fuentes: Limitar a estos backends ("nosis3", "nosis2", "nosis")
+            usar_cache: False fuerza consultas nuevas en cada backend
+
+        Returns:
+            dict con ok, estado (los de resultado.py), cuil, nombre, fecha, fuente,
+            confiable, candidatos, mensaje, intentos y segundos
+        """
+        inicio = time.monotonic()
+        entrada = str(dni_o_cuil or "").replace("-", "").replace(" ", "").strip()
+
+        if not entrada.isdigit() or not (7 <= len(entrada) <= 9 or len(entrada) == 11):
+            return _respuesta(error("Debe ser DNI (7-9 dígitos) o CUIL (11 dígitos)"), [], inicio)
+
+        nombre_filtro = (nombre_filtro or "").strip() or None
+        with contexto_consulta(), tramo("resolver.resolver") as span:
+            respuesta = await self._resolver(entrada, nombre_filtro, fuentes, usar_cache, inicio)
+            span.atributos.update(resultado=respuesta["estado"], fuente=respuesta["fuente"])
+            return respuesta
+
+    async def _resolver(self, entrada, nombre_filtro, fuentes, usar_cache, inicio) -> dict:
+        intentos = []
+        advertencia = None
+
+        for estrategia in self.orden(fuentes):
+            resultado, segundos = await self._intentar(estrategia, entrada, nombre_filtro, usar_cache)
+            log.debug("Intento %s: %s en %.2fs", estrategia.nombre, resultado.estado, segundos)
+            intentos.append({
+                "fuente": estrategia.nombre,
+                "estado": resultado.estado,
+                "segundos": round(segundos, 3),
+                "desde_cache": resultado.desde_cache,
+            })
+
+            if _confiable(resultado):
+                return _respuesta(resultado, intentos, inicio)
+            if advertencia is None and resultado.primero and resultado.primero.cuil:
+                advertencia = resultado
+
+        final = advertencia or Resultado(
+            NO_ENCONTRADO, mensaje=f"Ningún backend encontró datos para {entrada}"
+        )
+        return _respuesta(final, intentos, inicio)
+
+    def estadisticas(self) -> dict:
+        return {
+            "orden": [e.nombre for e in self.orden()],
+            "backends": {nombre: e.stats.info() for nombre, e in self.estrategias.items()},
+        }
+
+
+def _confiable(r: Resultado) -> bool:
+    """Una sola persona identificada con CUIL y nombre (y que coincide con el filtro, si hay)"""
+    return r.estado == OK and len(r.candidatos) == 1 and bool(r.primero.cuil) and bool(r.primero.nombre)
+
+
+def _respuesta(r: Resultado, intentos: list, inicio: float) -> dict:
+    c = r.primero
+    confiable = _confiable(r)
+    return {
+        "ok": confiable,
+        "estado": r.estado,
+        "cuil": c.cuil if c else None,
+        "nombre": c.nombre if c else None,
+        "fecha": c.fecha if c else None,
+        "fuente": r.fuente,
+        "confiable": confiable,
+        "candidatos": [x.a_dict() for x in r.candidatos],
+        "mensaje": r.mensaje,
+        "intentos": intentos,
+        "segundos": round(time.monotonic() - inicio, 3),
+    }
+
+
+_resolver: Optional[Resolver] = None
+
+
+def obtener_resolver() -> Resolver:
+    """Resolver compartido del proceso. Los valores a priori reproducen el orden del bot: nosis3 > nosis2 > nosis"""
+    global _resolver
+    if _resolver is None:
+        _resolver = Resolver([
+            Estrategia("nosis3", nosis3_buscar, latencia=2.0, exito=0.9),
+            Estrategia("nosis2", nosis2_buscar, latencia=3.0, exito=0.8),
+            Estrategia("nosis", nosis_buscar_planificado, latencia=60.0, exito=0.7),
+        ])
+    return _resolver
+
+
+async def resolver_identidad(dni_o_cuil, nombre_filtro: str = None, fuentes=None,
+                             usar_cache: bool = True) -> dict:
+    """Atajo a obtener_resolver().resolver(...)"""
+    return await obtener_resolver().resolver(dni_o_cuil, nombre_filtro, fuentes, usar_cache)
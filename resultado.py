@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+resultado.py - Resultado estructurado de las búsquedas de identidad.
+
+Los `*_buscar` de nosis, nosis2 y nosis3 devuelven un `Resultado`; los textos para el bot
+(las tuplas de siempre de `*_lookup`) los arma formato.py a partir de él.
+"""
+
+from typing import Optional
+
+# Estados posibles de un Resultado
+OK = "OK"  # Identidad encontrada (con filtro: todos los candidatos coinciden)
+MULTIPLE = "MULTIPLE"  # Sin filtro, varias personas comparten el documento
+NO_MATCH = "NO_MATCH"  # Hay personas pero ninguna coincide con el filtro
+INCOMPLETO = "INCOMPLETO"  # Se obtuvo solo el CUIL o solo el nombre
+NO_ENCONTRADO = "NO_ENCONTRADO"  # La fuente no tiene a nadie con ese documento
+ERROR = "ERROR"  # Entrada inválida o falla de la fuente
+
+
+class Candidato:
+    """
+    Una persona devuelta por una fuente. `cuil` va siempre sin guiones; `cuil_texto` es
+    el CUIL tal como lo escribió la fuente (el que muestra el bot para Nosis).
+    """
+
+    __slots__ = ("cuil", "cuil_texto", "nombre", "fecha")
+
+    def __init__(self, cuil: Optional[str], nombre: Optional[str], fecha: Optional[str] = None):
+        self.cuil = cuil.replace("-", "") if cuil is not None else None
+        self.cuil_texto = cuil
+        self.nombre = nombre
+        self.fecha = fecha
+
+    def a_dict(self) -> dict:
+        return {"cuil": self.cuil, "nombre": self.nombre, "fecha": self.fecha}
+
+    def __repr__(self):
+        return f"Candidato({self.cuil!r}, {self.nombre!r}, {self.fecha!r})"
+
+
+class Resultado:
+    """
+    Resultado de una búsqueda.
+
+    Attributes:
+        estado: Uno de OK, MULTIPLE, NO_MATCH, INCOMPLETO, NO_ENCONTRADO, ERROR
+        candidatos: Personas encontradas (en NO_MATCH, las que no coincidieron)
+        fuente: Backend que respondió ("nosis", "nosis2", "nosis3")
+        filtro: Nombre usado para filtrar (tal como lo escribió el usuario)
+        consulta: DNI efectivamente consultado, cuando el mensaje lo cita
+        mensaje: Detalle para ERROR / NO_ENCONTRADO
+        segundos: Duración de la búsqueda
+        desde_cache: True si salió de la cache de identidades
+        desde_memo: True si es la copia que da la memo de `*_buscar` (acierto o pedido
+                    que se sumó a otro en curso): no hubo consulta propia a la fuente
+    """
+
+    __slots__ = ("estado", "candidatos", "fuente", "filtro", "consulta", "mensaje", "segundos", "desde_cache",
+                 "desde_memo")
+
+    def __init__(self, estado: str, candidatos=(), fuente: str = None, filtro: str = None,
+                 consulta: str = None, mensaje: str = None, segundos: float = 0.0,
+                 desde_cache: bool = False, desde_memo: bool = False):
+        self.estado = estado
+        self.candidatos = list(candidatos)
+        self.fuente = fuente
+        self.filtro = filtro
+        self.consulta = consulta
+        self.mensaje = mensaje
+        self.segundos = segundos
+        self.desde_cache = desde_cache
+        self.desde_memo = desde_memo
+
+    @property
+    def primero(self) -> Optional[Candidato]:
+        return self.candidatos[0] if self.candidatos else None
+
+    @property
+    def ok(self) -> bool:
+        return self.estado == OK
+
+    def a_dict(self) -> dict:
+        """Representación serializable (JSON) del resultado"""
+        return {
+            "estado": self.estado,
+            "candidatos": [c.a_dict() for c in self.candidatos],
+            "fuente": self.fuente,
+            "filtro": self.filtro,
+            "consulta": self.consulta,
+            "mensaje": self.mensaje,
+            "segundos": round(self.segundos, 3),
+            "desde_cache": self.desde_cache,
+        }
+
+    def __repr__(self):
+        return f"Resultado({self.estado}, {self.candidatos!r}, fuente={self.fuente!r})"
+
+
+def error(mensaje: str, fuente: str = None) -> Resultado:
+    return Resultado(ERROR, fuente=fuente, mensaje=mensaje)
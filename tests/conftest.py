@@ -0,0 +1,10 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+
+# Los módulos del proyecto están en la raíz del repo
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Sin cache de identidades en disco durante los tests
+os.environ.setdefault("CACHE_IDENTIDAD", "0")
+os.environ.setdefault("LOG_NIVEL", "WARNING")
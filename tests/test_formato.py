@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+"""Tests de formato.py: las tuplas del bot conservan el CUIL tal como lo entrega cada fuente"""
+
+from formato import tupla_nosis
+from resultado import Resultado, Candidato, OK, MULTIPLE
+
+
+def test_nosis_devuelve_el_cuit_tal_como_lo_muestra_la_pagina():
+    for texto in ("20-30123456-3", "20301234563", "20 30123456 3"):
+        assert tupla_nosis(Resultado(OK, [Candidato(texto, "PEREZ JUAN")])) == (texto, "PEREZ JUAN")
+
+
+def test_nosis_lista_de_homonimos_sin_reformatear():
+    candidatos = [Candidato("20-30123456-3", "PEREZ JUAN"), Candidato("27301234568", "GOMEZ MARIA")]
+    mensaje, tipo = tupla_nosis(Resultado(MULTIPLE, candidatos, consulta="30123456"))
+    assert tipo == "MULTIPLE_RESULTS"
+    assert "CUIL 1: 20-30123456-3\nNOMBRE 1: PEREZ JUAN" in mensaje
+    assert "CUIL 2: 27301234568\nNOMBRE 2: GOMEZ MARIA" in mensaje
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""Tests de lote.py con backends falsos: lectura de entradas, reanudación y límites de concurrencia"""
+
+import asyncio
+import json
+
+import pytest
+
+import lote
+import nosis3
+import resolver
+from resolver import Resolver, Estrategia
+from resultado import Resultado, Candidato, OK, ERROR
+
+
+def _escribir(ruta, texto):
+    ruta.write_text(texto, encoding="utf-8")
+    return str(ruta)
+
+
+def _leer_salida(ruta):
+    with open(ruta, "r", encoding="utf-8") as f:
+        return [json.loads(linea) for linea in f]
+
+
+def test_lee_csv_jsonl_y_texto(tmp_path):
+    con_encabezado = _escribir(tmp_path / "a.csv", "id,nombre,dni\nx1,Perez Maria,30123456\nx2,,\nx3,,20-30123457-1\n")
+    sin_encabezado = _escribir(tmp_path / "b.csv", "30123456;Perez Maria\n30123457;\n")
+    jsonl = _escribir(tmp_path / "c.jsonl", '{"cuil": "20301234563", "nombre": "Ana"}\n\n{"id": 7, "dni": "30123457"}\n')
+    texto = _escribir(tmp_path / "d.txt", "30123456 Perez Maria\n\n30123457\n")
+
+    assert list(lote.leer_entradas(con_encabezado)) == [
+        {"id": "x1", "dni": "30123456", "nombre": "Perez Maria"},
+        {"id": "x3", "dni": "20-30123457-1", "nombre": None},
+    ]
+    assert list(lote.leer_entradas(sin_encabezado)) == [
+        {"id": "1", "dni": "30123456", "nombre": "Perez Maria"},
+        {"id": "2", "dni": "30123457", "nombre": None},
+    ]
+    assert list(lote.leer_entradas(jsonl)) == [
+        {"id": "1", "dni": "20301234563", "nombre": "Ana"},
+        {"id": "7", "dni": "30123457", "nombre": None},
+    ]
+    assert list(lote.leer_entradas(texto)) == [
+        {"id": "1", "dni": "30123456", "nombre": "Perez Maria"},
+        {"id": "3", "dni": "30123457", "nombre": None},
+    ]
+
+
+@pytest.fixture
+def nosis3_falso(monkeypatch):
+    """nosis3_buscar falso: anota cada DNI y cuántas búsquedas llegan a estar en curso a la vez"""
+    estado = {"llamadas": [], "en_curso": 0, "maximo": 0}
+
+    async def buscar(dni, nombre_filtro=None, usar_cache=True):
+        estado["llamadas"].append(dni)
+        estado["en_curso"] += 1
+        estado["maximo"] = max(estado["maximo"], estado["en_curso"])
+        await asyncio.sleep(0.02)
+        estado["en_curso"] -= 1
+        return Resultado(OK, [Candidato("20" + dni + "3", "PEREZ MARIA")], fuente="nosis3")
+
+    monkeypatch.setattr(nosis3, "nosis3_buscar", buscar)
+    return estado
+
+
+def test_reanuda_truncando_la_linea_cortada_y_reintentando_errores(tmp_path, nosis3_falso):
+    salida = tmp_path / "salida.jsonl"
+    salida.write_text(
+        json.dumps({"id": "1", "estado": OK}) + "\n"
+        + json.dumps({"id": "2", "estado": ERROR}) + "\n"
+        + '{"id": "3", "estado": "O',
+        encoding="utf-8",
+    )
+
+    stats = asyncio.run(lote.procesar_lote(["30123451", "30123452", "30123453"], str(salida),
+                                           backend="nosis3"))
+
+    assert (stats["procesadas"], stats["salteadas"], stats["errores"]) == (2, 1, 0)
+    assert sorted(nosis3_falso["llamadas"]) == ["30123452", "30123453"]
+    lineas = _leer_salida(salida)
+    assert [l["id"] for l in lineas[:2]] == ["1", "2"]
+    assert sorted(l["id"] for l in lineas[2:]) == ["2", "3"]
+    assert all(l["estado"] == OK for l in lineas[2:])
+
+
+def test_concurrencia_acotada_por_backend(tmp_path, nosis3_falso):
+    dnis = [str(30123400 + i) for i in range(12)]
+
+    stats = asyncio.run(lote.procesar_lote(dnis, str(tmp_path / "salida.jsonl"), backend="nosis3",
+                                           concurrencia=8, limites={"nosis3": 3}))
+
+    assert stats["procesadas"] == 12
+    assert nosis3_falso["maximo"] == 3
+
+
+def test_espera_por_el_limite_no_cuenta_como_latencia_del_backend(tmp_path, monkeypatch):
+    async def buscar(dni, nombre_filtro=None, usar_cache=True):
+        await asyncio.sleep(0.05)
+        return Resultado(OK, [Candidato("20" + dni + "3", "PEREZ MARIA")], fuente="nosis3")
+
+    # Con límite 1 las búsquedas hacen cola; si la cola contara, vencería el timeout de 0.08s
+    del_proceso = Estrategia("nosis3", buscar, latencia=1.0, exito=0.9, timeout=0.08)
+    monkeypatch.setattr(resolver, "_resolver", Resolver([del_proceso]))
+    salida = str(tmp_path / "salida.jsonl")
+
+    stats = asyncio.run(lote.procesar_lote(["30123451", "30123452", "30123453"], salida,
+                                           concurrencia=3, limites={"nosis3": 1}))
+
+    assert stats["errores"] == 0
+    assert all(l["estado"] == OK and l["intentos"][0]["segundos"] < 0.08 for l in _leer_salida(salida))
+    # El lote lleva sus propias estadísticas: las del resolver del proceso no se tocan
+    assert del_proceso.stats.llamadas == 0
+
+
+def test_main_cierra_los_backends_aunque_el_lote_falle(tmp_path, monkeypatch):
+    cerrados = []
+
+    async def fallar(*args, **kwargs):
+        raise RuntimeError("se cortó")
+
+    async def cerrar(backend):
+        cerrados.append(backend)
+
+    monkeypatch.setattr(lote, "procesar_lote", fallar)
+    monkeypatch.setattr(lote, "_cerrar_backends", cerrar)
+
+    with pytest.raises(RuntimeError):
+        lote.main([_escribir(tmp_path / "e.txt", "30123456\n"), "-o", str(tmp_path / "s.jsonl"),
+                   "--backend", "nosis2"])
+    assert cerrados == ["nosis2"]
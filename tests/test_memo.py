@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""Tests de memo_async: coalescing, TTL/LRU, qué se recuerda y la clave de búsqueda"""
+
+import asyncio
+
+import memo
+from memo import memo_async, clave_busqueda
+from resultado import Resultado, OK, ERROR, error
+
+
+def _buscar_contando(llamadas, demora=0.0, resultado=None, **opciones):
+    """Corrutina memoizada con la clave de las búsquedas que anota cada llamada real"""
+
+    @memo_async(clave=lambda a: clave_busqueda(a["dni"]), bypass="usar_cache", **opciones)
+    async def buscar(dni, usar_cache=True):
+        llamadas.append(dni)
+        await asyncio.sleep(demora)
+        if resultado is not None:
+            return resultado(dni)
+        return Resultado(OK, consulta=dni)
+
+    return buscar
+
+
+def test_pedidos_identicos_en_curso_comparten_la_llamada():
+    llamadas = []
+    buscar = _buscar_contando(llamadas, demora=0.05)
+
+    async def correr():
+        return await asyncio.gather(*(buscar("20123456") for _ in range(5)))
+
+    resultados = asyncio.run(correr())
+
+    assert llamadas == ["20123456"]
+    # El que disparó la consulta recibe el original; los que se sumaron, copias marcadas
+    assert [r.desde_memo for r in resultados] == [False] + [True] * 4
+    assert all(r.consulta == "20123456" for r in resultados)
+    assert buscar.memo.coalescidas == 4
+    assert buscar.memo.info()["en_curso"] == 0
+
+
+def test_resultados_vencen_por_ttl_y_se_desalojan_por_lru(monkeypatch):
+    reloj = [1000.0]
+    monkeypatch.setattr(memo.time, "monotonic", lambda: reloj[0])
+    llamadas = []
+    buscar = _buscar_contando(llamadas, maxsize=2, ttl=60)
+
+    async def correr():
+        await buscar("11111111")
+        await buscar("22222222")
+        await buscar("11111111")  # acierto: 11111111 pasa a ser el más reciente
+        await buscar("33333333")  # desaloja a 22222222
+        await buscar("22222222")
+        reloj[0] += 61
+        await buscar("22222222")  # vencido
+
+    asyncio.run(correr())
+
+    assert llamadas == ["11111111", "22222222", "33333333", "22222222", "22222222"]
+    assert buscar.memo.aciertos == 1
+    assert buscar.memo.desalojos == 2
+    assert buscar.memo.vencidas == 1
+
+
+def test_error_nunca_queda_en_memoria():
+    llamadas = []
+    buscar = _buscar_contando(llamadas, resultado=lambda dni: error("AFIP no disponible"),
+                              cachear=lambda r: r.estado != ERROR)
+
+    async def correr():
+        return [await buscar("20123456") for _ in range(3)]
+
+    resultados = asyncio.run(correr())
+
+    assert [r.estado for r in resultados] == [ERROR] * 3
+    assert len(llamadas) == 3
+    assert buscar.memo.info()["tamano"] == 0
+
+
+def test_entrada_invalida_no_comparte_clave_con_un_dni_valido():
+    assert clave_busqueda("12a34567") != clave_busqueda("1234567")
+    assert clave_busqueda("1234567") == clave_busqueda("01234567") == ("01234567", "")
+    assert clave_busqueda("20-12345678-6") == clave_busqueda(" 20123456786 ")
+    # Si el backend no quita guiones, tampoco la clave
+    assert clave_busqueda("20-12345678-6", separadores="") != clave_busqueda("20123456786", separadores="")
+
+    def validar(dni):
+        return Resultado(OK, consulta=dni) if dni.isdigit() else error("DNI inválido")
+
+    llamadas = []
+    buscar = _buscar_contando(llamadas, demora=0.05, resultado=validar,
+                              cachear=lambda r: r.estado != ERROR)
+
+    async def correr():
+        juntos = await asyncio.gather(buscar("12a34567"), buscar("1234567"))
+        return juntos + [await buscar("12a34567")]
+
+    invalido, valido, de_nuevo = asyncio.run(correr())
+
+    assert (invalido.estado, valido.estado, de_nuevo.estado) == (ERROR, OK, ERROR)
+    assert llamadas == ["12a34567", "1234567", "12a34567"]
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""Tests de nosis3 sin AFIP: ticket, cliente SOAP y getPersona reemplazados por fakes"""
+
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+from zeep.exceptions import Fault
+
+import nosis3
+from resultado import OK, NO_MATCH, NO_ENCONTRADO, ERROR
+
+DEMORA = 0.2  # Segundos de cada llamada bloqueante simulada
+
+
+@pytest.fixture
+def afip_lento(monkeypatch):
+    """obtener_ticket y getPersona bloquean DEMORA segundos cada uno (como WSAA y A13)"""
+
+    def obtener_ticket():
+        time.sleep(DEMORA)
+        return "token", "sign"
+
+    def consultar_afip_directo(cuit, client, token, sign):
+        time.sleep(DEMORA)
+        return SimpleNamespace(apellido="PEREZ", nombre="MARIA", fechaNacimiento="1980-05-01")
+
+    monkeypatch.setattr(nosis3, "obtener_ticket", obtener_ticket)
+    monkeypatch.setattr(nosis3, "obtener_cliente", lambda wsdl: object())
+    monkeypatch.setattr(nosis3, "consultar_afip_directo", consultar_afip_directo)
+    monkeypatch.setattr(nosis3, "obtener_cache", lambda: None)
+
+
+def test_busquedas_concurrentes_se_solapan(afip_lento):
+    n = 5
+    assert n <= nosis3.AFIP_MAX_WORKERS
+
+    async def buscar_varias():
+        inicio = time.perf_counter()
+        resultados = await asyncio.gather(*(
+            nosis3.nosis3_buscar(f"2730000{i:03d}4", usar_cache=False) for i in range(n)
+        ))
+        return resultados, time.perf_counter() - inicio
+
+    resultados, segundos = asyncio.run(buscar_varias())
+
+    assert [r.estado for r in resultados] == [OK] * n
+    # Una búsqueda tarda 2 * DEMORA (ticket + getPersona); en serie serían n veces eso
+    una = 2 * DEMORA
+    assert segundos < 2 * una, f"{n} búsquedas tardaron {segundos:.2f}s (una sola tarda {una:.2f}s)"
+
+
+def test_ticket_por_vencer_se_sigue_usando_si_wsaa_no_renueva(monkeypatch, tmp_path):
+    llamadas = []
+
+    def login_rechazado():
+        llamadas.append(time.time())
+        raise Exception("El CEE ya posee un TA valido para el acceso al WSN solicitado")
+
+    monkeypatch.setattr(nosis3, "_login_wsaa", login_rechazado)
+    gestor = nosis3.GestorTicket(ruta=str(tmp_path / "ta.json"))
+    gestor.token, gestor.sign = "token", "sign"
+    gestor.obtenido = time.time() - 3600
+    gestor.expira = time.time() + nosis3.TA_TOLERANCIA / 2  # Dentro de la tolerancia: ya no vigente
+
+    assert not gestor.vigente()
+    assert gestor.obtener() == ("token", "sign")
+    assert gestor.obtener() == ("token", "sign")
+    assert len(llamadas) == 1  # No reintenta en cada consulta
+
+    gestor.expira = time.time() - 1  # Ahora sí venció
+    with pytest.raises(Exception):
+        gestor.obtener()
+
+
+class _CacheFalsa:
+    def __init__(self):
+        self.negativos = []
+
+    def guardar_negativo(self, entrada, fuente):
+        self.negativos.append((entrada, fuente))
+
+
+def _a13_con_faults(monkeypatch, faults):
+    """getPersona responde con el fault indicado para cada prefijo (20, 27, 23), o con la persona si no es texto"""
+
+    def get_persona(token, sign, cuitRepresentada, idPersona):
+        respuesta = faults[str(idPersona)[:2]]
+        if isinstance(respuesta, str):
+            raise Fault(respuesta)
+        return SimpleNamespace(persona=respuesta)
+
+    cliente = SimpleNamespace(service=SimpleNamespace(getPersona=get_persona))
+    cache = _CacheFalsa()
+    monkeypatch.setattr(nosis3, "obtener_ticket", lambda: ("token", "sign"))
+    monkeypatch.setattr(nosis3, "obtener_cliente", lambda wsdl: cliente)
+    monkeypatch.setattr(nosis3, "obtener_cache", lambda: cache)
+    return cache
+
+
+def test_no_encontrado_solo_si_afip_responde_que_no_existe(monkeypatch):
+    no_existe = "No existe persona con ese Id"
+    cache = _a13_con_faults(monkeypatch, {"20": no_existe, "27": no_existe, "23": no_existe})
+
+    resultado = asyncio.run(nosis3.nosis3_buscar("30123456", usar_cache=False))
+
+    assert resultado.estado == NO_ENCONTRADO
+    assert cache.negativos == [("30123456", "nosis3")]
+
+
+def test_falla_de_afip_no_se_guarda_como_negativo(monkeypatch):
+    no_existe = "No existe persona con ese Id"
+    cache = _a13_con_faults(monkeypatch, {"20": no_existe, "27": "Servicio no disponible", "23": no_existe})
+
+    resultado = asyncio.run(nosis3.nosis3_buscar("30123457", usar_cache=False))
+
+    assert resultado.estado == ERROR
+    assert cache.negativos == []
+
+
+def test_falla_de_otro_prefijo_no_tapa_a_la_persona_encontrada(monkeypatch):
+    no_existe = "No existe persona con ese Id"
+    persona = SimpleNamespace(apellido="PEREZ", nombre="MARIA", fechaNacimiento="1980-05-01")
+    cache = _a13_con_faults(monkeypatch, {"20": persona, "27": "Servicio no disponible", "23": no_existe})
+
+    resultado = asyncio.run(nosis3.nosis3_buscar("30123459", "zzz", usar_cache=False))
+
+    assert resultado.estado == NO_MATCH
+    assert [c.nombre for c in resultado.candidatos] == ["PEREZ MARIA"]
+    assert resultado.candidatos[0].cuil.startswith("20")
+    assert cache.negativos == []
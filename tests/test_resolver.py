@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""Tests del Resolver con backends falsos: orden por costo, corte, advertencia y estadísticas"""
+
+import asyncio
+
+from memo import memo_async, clave_busqueda
+from resolver import Resolver, Estrategia
+from resultado import Resultado, Candidato, OK, NO_MATCH, NO_ENCONTRADO, ERROR, error
+
+
+def _backend(nombre, resultado, llamadas, demora=0.0):
+    """`*_buscar` falso que anota cada llamada y devuelve resultado() con la fuente puesta"""
+
+    async def buscar(dni, nombre_filtro=None, usar_cache=True):
+        llamadas.append(nombre)
+        await asyncio.sleep(demora)
+        r = resultado()
+        r.fuente = nombre
+        return r
+
+    return buscar
+
+
+def _ok(cuil="20301234563", nombre="PEREZ MARIA"):
+    return lambda: Resultado(OK, [Candidato(cuil, nombre)])
+
+
+def test_orden_por_costo_esperado():
+    resolver = Resolver([
+        Estrategia("lento", None, latencia=10.0, exito=0.9),
+        Estrategia("poco_exito", None, latencia=1.0, exito=0.05),
+        Estrategia("rapido", None, latencia=1.0, exito=0.5),
+    ])
+
+    assert [e.nombre for e in resolver.orden()] == ["rapido", "lento", "poco_exito"]
+    assert [e.nombre for e in resolver.orden(["lento", "poco_exito"])] == ["lento", "poco_exito"]
+
+
+def test_corta_en_la_primera_respuesta_confiable():
+    llamadas = []
+    resolver = Resolver([
+        Estrategia("a", _backend("a", lambda: error("caído"), llamadas), latencia=1.0, exito=0.9),
+        Estrategia("b", _backend("b", _ok(), llamadas), latencia=2.0, exito=0.9),
+        Estrategia("c", _backend("c", _ok(), llamadas), latencia=3.0, exito=0.9),
+    ])
+
+    respuesta = asyncio.run(resolver.resolver("30123456"))
+
+    assert llamadas == ["a", "b"]
+    assert respuesta["ok"] and respuesta["fuente"] == "b"
+    assert respuesta["cuil"] == "20301234563"
+    assert [i["estado"] for i in respuesta["intentos"]] == [ERROR, OK]
+
+
+def test_sin_respuesta_confiable_devuelve_la_primera_advertencia():
+    no_coincide = lambda: Resultado(NO_MATCH, [Candidato("27301234568", "GOMEZ ANA")], filtro="zzz")
+    llamadas = []
+    resolver = Resolver([
+        Estrategia("a", _backend("a", lambda: Resultado(NO_ENCONTRADO), llamadas), latencia=1.0, exito=0.9),
+        Estrategia("b", _backend("b", no_coincide, llamadas), latencia=2.0, exito=0.9),
+        Estrategia("c", _backend("c", lambda: error("caído"), llamadas), latencia=3.0, exito=0.9),
+    ])
+
+    respuesta = asyncio.run(resolver.resolver("30123456", "zzz"))
+
+    assert llamadas == ["a", "b", "c"]
+    assert not respuesta["ok"]
+    assert (respuesta["estado"], respuesta["fuente"], respuesta["nombre"]) == (NO_MATCH, "b", "GOMEZ ANA")
+
+    vacio = Resolver([Estrategia("a", _backend("a", lambda: error("caído"), []), latencia=1.0, exito=0.9)])
+    assert asyncio.run(vacio.resolver("30123456"))["estado"] == NO_ENCONTRADO
+
+
+def test_estadisticas_solo_con_consultas_reales():
+    llamadas = []
+
+    @memo_async(clave=lambda a: clave_busqueda(a["dni"], a["nombre_filtro"]), bypass="usar_cache")
+    async def memorizado(dni, nombre_filtro=None, usar_cache=True):
+        return await _backend("m", _ok(), llamadas, demora=0.05)(dni, nombre_filtro, usar_cache)
+
+    def de_cache():
+        return Resultado(OK, [Candidato("20301234563", "PEREZ MARIA")], desde_cache=True)
+
+    memo = Estrategia("m", memorizado, latencia=1.0, exito=0.5)
+    cache = Estrategia("c", _backend("c", de_cache, llamadas), latencia=1.0, exito=0.5)
+    resolver = Resolver([memo, cache])
+
+    async def correr():
+        # Tres pedidos simultáneos: uno consulta, los otros dos se suman a ese
+        await asyncio.gather(*(resolver.resolver("30123456", fuentes=["m"]) for _ in range(3)))
+        await resolver.resolver("30123456", fuentes=["m"])  # acierto de la memo
+        await resolver.resolver("30123456", fuentes=["c"])  # cache de identidades
+
+    asyncio.run(correr())
+
+    assert llamadas == ["m", "c"]
+    assert memo.stats.llamadas == 1 and memo.stats.exitos == 1
+    assert cache.stats.llamadas == 0 and cache.stats.exito == 0.5